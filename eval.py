@@ -5,6 +5,15 @@ from clause import Ranking
 from clause import TripleSet
 
 import argparse
+import csv
+import ctypes
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
 
 # *** Example Evaluation ***
 
@@ -12,86 +21,259 @@ import argparse
 ## The ranking is evaluated on the fly before storing it on disc.
 ## The example shows also at the end how to use a few lines of code to create a
 ## structured results table that informs about relation and direction specific MRR and hits scores.
+## The functions are reused by eval_session.py to evaluate many rule files on data loaded once.
 
-argparser = argparse.ArgumentParser(description="Example for evaluation of a ranking")
-argparser.add_argument("--dataset", type=str, default="wnrr", help="dataset to use")
-argparser.add_argument("--rules", type=str, default="", help="rules to use")
-argparser.add_argument("--ranking_file", type=str, default="", help="rules to use")
-argparser.add_argument("--aggregation_function", type=str, default="maxplus", help="aggregation function to use")
-argparser.add_argument("--topk", type=int, default=100, help="topk to use")
-argparser.add_argument("--load_u_d_rules", action="store_true", help="whether to load u_d rules")
-argparser.add_argument("--load_u_xxc_rules", action="store_true", help="whether to load u_xxc rules")
-argparser.add_argument("--load_u_xxd_rules", action="store_true", help="whether to load u_xxd rules")
-
-
-args = argparser.parse_args()
-dataset = args.dataset
-train = f"data/{dataset}/train.txt"
-filter_set = f"data/{dataset}/valid.txt"
-target = f"data/{dataset}/test.txt"
-
-# rules = f"{get_base_dir()}/data/rules/{dataset}.txt"
-rules = args.rules if args.rules else f"data/rules/{dataset}.txt"
-ranking_file = args.ranking_file if args.ranking_file else f"local/ranking-{dataset}.txt"
-
-options = Options()
-options.set("ranking_handler.aggregation_function", args.aggregation_function)
-options.set("ranking_handler.topk", args.topk)
-options.set("loader.load_u_d_rules", args.load_u_d_rules)
-options.set("loader.load_u_xxc_rules", args.load_u_xxc_rules)
-options.set("loader.load_u_xxd_rules", args.load_u_xxd_rules)
-
-# *** 关键：设置线程数 ***
-options.set("ranking_handler.num_threads", -1)  # 指定20个线程
-options.set("loader.num_threads", 4)           # 指定4个线程用于规则加载
-
-
-#### Calculate a ranking
-loader = Loader(options=options.get("loader"))
-loader.load_data(data=train, filter=filter_set, target=target)
-loader.load_rules(rules=rules)
-
-ranker = RankingHandler(options=options.get("ranking_handler"))
-ranker.calculate_ranking(loader=loader)
-headRanking = ranker.get_ranking(direction="head", as_string=True)
-tailRanking = ranker.get_ranking(direction="tail", as_string=True)
-
-testset = TripleSet(target)
-ranking = Ranking(k=100)
-
-# process the handler ranking which is defined on queries and not
-# on triples, e.g. assign to every triple of 'testset' the corresponding query rankings
-ranking.convert_handler_ranking(headRanking, tailRanking, testset)
-ranking.compute_scores(testset.triples)
-
-print("*** EVALUATION RESULTS ****")
-print("Num triples: " + str(len(testset.triples)))
-print("MRR     " + '{0:.6f}'.format(ranking.hits.get_mrr()))
-print("hits@1  " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(1)))
-print("hits@3  " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(3)))
-print("hits@10 " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(10)))
-print()
-
-print("MRR " + '{0:.6f}'.format(ranking.hits.get_mrr()) + \
-      ", hits@1 " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(1)) + \
-      ", hits@3 " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(3)))
-# now some code to some nice overview on the different relations and directions
-# the loop interates over all relations in the test set
-print("relation".ljust(25) + "\t" + "MRR-h" + "\t" + "MRR-t" + "\t" + "Num triples")
-for rel in testset.rels:
-   rel_token = testset.index.id2to[rel]
-   # store all triples that use the current relation rel in rtriples
-   rtriples = list(filter(lambda x: x.rel == rel, testset.triples))
-
-   # compute scores in head direction ...
-   ranking.compute_scores(rtriples, True, False)
-   (mrr_head, h1_head) = (ranking.hits.get_mrr(), ranking.hits.get_hits_at_k(1))
-   # ... and in tail direction
-   ranking.compute_scores(rtriples, False, True)
-   (mrr_tail, h1_tail) = (ranking.hits.get_mrr(), ranking.hits.get_hits_at_k(1))
-   # print the resulting scores
-   print(rel_token.ljust(25) +  "\t" + '{0:.3f}'.format(mrr_head) + "\t" + '{0:.3f}'.format(mrr_tail) + "\t" + str(len(rtriples)))
-
-
-# finally, write the ranking to a file, there are two ways to to this, both reults into the same ranking
-ranker.write_ranking(path=ranking_file, loader=loader)
\ No newline at end of file
+
+def dataset_paths(dataset):
+    """train, filter (valid) and target (test) files of a dataset"""
+    return f"data/{dataset}/train.txt", f"data/{dataset}/valid.txt", f"data/{dataset}/test.txt"
+
+
+def build_options(aggregation_function="maxplus", topk=100, load_u_d_rules=False,
+                  load_u_xxc_rules=False, load_u_xxd_rules=False):
+    options = Options()
+    options.set("ranking_handler.aggregation_function", aggregation_function)
+    options.set("ranking_handler.topk", topk)
+    options.set("loader.load_u_d_rules", load_u_d_rules)
+    options.set("loader.load_u_xxc_rules", load_u_xxc_rules)
+    options.set("loader.load_u_xxd_rules", load_u_xxd_rules)
+
+    # *** 关键：设置线程数 ***
+    options.set("ranking_handler.num_threads", -1)  # 指定20个线程
+    options.set("loader.num_threads", 4)           # 指定4个线程用于规则加载
+    return options
+
+
+def load_data(dataset, options):
+    """Load train/valid/test into a PyClause loader and the test set; done once per dataset"""
+    train, filter_set, target = dataset_paths(dataset)
+    loader = Loader(options=options.get("loader"))
+    loader.load_data(data=train, filter=filter_set, target=target)
+    testset = TripleSet(target)
+    return loader, testset
+
+
+def _flush_c_stdout():
+    """Flush C stdio buffers, so output printed by PyClause's C++ code reaches the file descriptor"""
+    try:
+        ctypes.CDLL(None).fflush(None)
+    except (OSError, AttributeError, TypeError):
+        pass
+
+
+def load_rules(loader, rules, stats=None):
+    """
+    Load rules into the loader and return the number of rules it indexed.
+    That count ("Loaded and indexed N rules") is taken after the loader has dropped the rule
+    types it is configured to skip (u_d, u_xxc, ...) and is only printed by PyClause's C++ code,
+    so stdout is captured at the file descriptor level while loading and echoed afterwards.
+    Returns None when the message is missing.
+    """
+    sys.stdout.flush()
+    saved_fd = os.dup(1)
+    with tempfile.TemporaryFile() as captured:
+        os.dup2(captured.fileno(), 1)
+        try:
+            if stats is None:
+                loader.load_rules(rules=rules)
+            else:
+                loader.load_rules(rules=rules, stats=stats)
+        finally:
+            sys.stdout.flush()
+            _flush_c_stdout()
+            os.dup2(saved_fd, 1)
+            os.close(saved_fd)
+        captured.seek(0)
+        output = captured.read().decode("utf-8", errors="replace")
+    sys.stdout.write(output)
+    sys.stdout.flush()
+    match = re.search(r"Loaded and indexed (\d+) rules", output)
+    return int(match.group(1)) if match else None
+
+
+def calculate_ranking(loader, testset, options, k=100):
+    """
+    Rank all test queries with the rules currently loaded in the loader.
+    Returns the ranking handler (needed to write the ranking) and the evaluated Ranking.
+    """
+    ranker = RankingHandler(options=options.get("ranking_handler"))
+    ranker.calculate_ranking(loader=loader)
+    headRanking = ranker.get_ranking(direction="head", as_string=True)
+    tailRanking = ranker.get_ranking(direction="tail", as_string=True)
+
+    ranking = Ranking(k=k)
+
+    # process the handler ranking which is defined on queries and not
+    # on triples, e.g. assign to every triple of 'testset' the corresponding query rankings
+    ranking.convert_handler_ranking(headRanking, tailRanking, testset)
+    ranking.compute_scores(testset.triples)
+    return ranker, ranking
+
+
+def overall_scores(ranking, testset):
+    return {
+        "num_triples": len(testset.triples),
+        "MRR": ranking.hits.get_mrr(),
+        "hits@1": ranking.hits.get_hits_at_k(1),
+        "hits@3": ranking.hits.get_hits_at_k(3),
+        "hits@10": ranking.hits.get_hits_at_k(10),
+    }
+
+
+def print_results(scores):
+    print("*** EVALUATION RESULTS ****")
+    print("Num triples: " + str(scores["num_triples"]))
+    print("MRR     " + '{0:.6f}'.format(scores["MRR"]))
+    print("hits@1  " + '{0:.6f}'.format(scores["hits@1"]))
+    print("hits@3  " + '{0:.6f}'.format(scores["hits@3"]))
+    print("hits@10 " + '{0:.6f}'.format(scores["hits@10"]))
+    print()
+
+    print("MRR " + '{0:.6f}'.format(scores["MRR"]) + \
+          ", hits@1 " + '{0:.6f}'.format(scores["hits@1"]) + \
+          ", hits@3 " + '{0:.6f}'.format(scores["hits@3"]))
+
+
+def relation_scores(ranking, testset, triples=None):
+    """
+    Head and tail MRR/hits per relation of the test set.
+    The test triples are grouped by relation in one pass instead of filtering the whole test
+    set for every relation. Scoring is not a single sweep: the rank lookup lives in PyClause's
+    Ranking and its hits object only holds the last computed set, so compute_scores still runs
+    once per relation and direction (2 * |relations| calls), each on that relation's triples.
+    triples restricts the report to a subset (e.g. a sample).
+    """
+    triples_by_rel = defaultdict(list)
+    for triple in (testset.triples if triples is None else triples):
+        triples_by_rel[triple.rel].append(triple)
+
+    rows = []
+    for rel in testset.rels:
+        rtriples = triples_by_rel.get(rel)
+        if not rtriples:
+            continue
+        row = {"relation": testset.index.id2to[rel], "num_triples": len(rtriples)}
+        for direction, head, tail in (("head", True, False), ("tail", False, True)):
+            ranking.compute_scores(rtriples, head, tail)
+            row[f"MRR-{direction[0]}"] = ranking.hits.get_mrr()
+            for k in (1, 3, 10):
+                row[f"hits@{k}-{direction[0]}"] = ranking.hits.get_hits_at_k(k)
+        rows.append(row)
+    return rows
+
+
+def print_relation_report(rows):
+    # now some code to some nice overview on the different relations and directions
+    print("relation".ljust(25) + "\t" + "MRR-h" + "\t" + "MRR-t" + "\t" + "Num triples")
+    for row in rows:
+       print(row["relation"].ljust(25) +  "\t" + '{0:.3f}'.format(row["MRR-h"]) + "\t" + '{0:.3f}'.format(row["MRR-t"]) + "\t" + str(row["num_triples"]))
+
+
+def write_relation_report(rows, path):
+    """Write the per-relation scores as CSV, or as JSON if the path ends with .json"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.endswith(".json"):
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+        else:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["relation"])
+            writer.writeheader()
+            writer.writerows(rows)
+    print(f"Per-relation scores written to {path}")
+
+
+def count_rules(rules):
+    """Number of rule lines (bodySize\tsupport\tconfidence\trule) in a rule file"""
+    count = 0
+    with open(rules, "rb") as f:
+        for line in f:
+            if line.count(b"\t") >= 3:
+                count += 1
+    return count
+
+
+def write_eval_json(path, dataset, rules, scores, relations=None, seconds=None, options=None, loaded_rules=None,
+                    **extra):
+    """
+    Machine-readable evaluation result (eval.json) consumed by script/analyze_splits.py
+    instead of scraping the printed log.
+    rules_in_file counts the rule lines of the file, loaded_rules is the number of rules the
+    loader indexed (see load_rules).
+    """
+    result = {
+        "dataset": dataset,
+        "rules": rules,
+        "rules_in_file": count_rules(rules) if isinstance(rules, str) and os.path.isfile(rules) else None,
+        "loaded_rules": loaded_rules,
+        "metrics": scores,
+        "relations": relations or [],
+        "seconds": {k: round(v, 3) for k, v in (seconds or {}).items()},
+        "options": options or {},
+    }
+    result.update(extra)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    print(f"Evaluation results written to {path}")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Example for evaluation of a ranking")
+    argparser.add_argument("--dataset", type=str, default="wnrr", help="dataset to use")
+    argparser.add_argument("--rules", type=str, default="", help="rules to use")
+    argparser.add_argument("--ranking_file", type=str, default="", help="rules to use")
+    argparser.add_argument("--aggregation_function", type=str, default="maxplus", help="aggregation function to use")
+    argparser.add_argument("--topk", type=int, default=100, help="topk to use")
+    argparser.add_argument("--load_u_d_rules", action="store_true", help="whether to load u_d rules")
+    argparser.add_argument("--load_u_xxc_rules", action="store_true", help="whether to load u_xxc rules")
+    argparser.add_argument("--load_u_xxd_rules", action="store_true", help="whether to load u_xxd rules")
+    argparser.add_argument("--relation_report", type=str, default="", help="per-relation scores as .csv or .json")
+    argparser.add_argument("--eval_json", type=str, default="",
+                           help="structured results (default: ranking file with .json extension)")
+
+    args = argparser.parse_args()
+    dataset = args.dataset
+
+    # rules = f"{get_base_dir()}/data/rules/{dataset}.txt"
+    rules = args.rules if args.rules else f"data/rules/{dataset}.txt"
+    ranking_file = args.ranking_file if args.ranking_file else f"local/ranking-{dataset}.txt"
+
+    options = build_options(args.aggregation_function, args.topk, args.load_u_d_rules,
+                            args.load_u_xxc_rules, args.load_u_xxd_rules)
+
+    #### Calculate a ranking
+    seconds = {}
+    started = time.time()
+    loader, testset = load_data(dataset, options)
+    seconds["data_load"] = time.time() - started
+    started = time.time()
+    loaded_rules = load_rules(loader, rules)
+    seconds["rule_load"] = time.time() - started
+    started = time.time()
+    ranker, ranking = calculate_ranking(loader, testset, options)
+    seconds["rank"] = time.time() - started
+
+    started = time.time()
+    scores = overall_scores(ranking, testset)
+    print_results(scores)
+    rows = relation_scores(ranking, testset)
+    seconds["score"] = time.time() - started
+    print_relation_report(rows)
+    if args.relation_report:
+        write_relation_report(rows, args.relation_report)
+
+    # finally, write the ranking to a file, there are two ways to to this, both reults into the same ranking
+    started = time.time()
+    ranker.write_ranking(path=ranking_file, loader=loader)
+    seconds["write_ranking"] = time.time() - started
+
+    option_values = {key: getattr(args, key) for key in
+                     ("aggregation_function", "topk", "load_u_d_rules", "load_u_xxc_rules", "load_u_xxd_rules")}
+    eval_json = args.eval_json or os.path.splitext(ranking_file)[0] + ".json"
+    write_eval_json(eval_json, dataset, rules, scores, rows, seconds, option_values, loaded_rules,
+                    ranking_file=ranking_file)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -3,6 +3,10 @@ rule_file=preds-100-400
 supp_threshold=20
 conf_threshold=0
 
+# Filters an external rule file; for merged TLearn rules pass --min-support/--min-confidence
+# (and --top-k) to merge_rules.py instead, which prunes while merging
+# A whole (supp, conf) grid can be evaluated without filtered copies on disk:
+# python eval_session.py --dataset $dataset --rules out/${dataset}/${rule_file} --supp 2 5 20 --conf 0 0.01
 awk -v supp="$supp_threshold" -v conf="$conf_threshold" '$2 >= supp && $3+0 >= conf {print; count++} END {print "Total:", count > "/dev/stderr"}' "out/${dataset}/${rule_file}" \
     > "out/${dataset}/rules_${supp_threshold}_${conf_threshold}.txt"
 
@@ -19,4 +23,7 @@ python eval.py --dataset FB15k-237 --rules out/FB15k-237/rules-100-10 --ranking_
 python eval.py --dataset FB15k-237 --rules out/FB15k-237/rules-100-20 --ranking_file out/FB15k-237/eval-20.txt > out/FB15k-237/eval-20.log
 python eval.py --dataset FB15k-237 --rules out/FB15k-237/rules-100-40 --ranking_file out/FB15k-237/eval-40.txt > out/FB15k-237/eval-40.log
 python eval.py --dataset FB15k-237 --rules out/FB15k-237/rules-100-50 --ranking_file out/FB15k-237/eval-50.txt > out/FB15k-237/eval-50.log
-python eval.py --dataset FB15k-237 --rules out/FB15k-237/rules-100-filtered --ranking_file out/FB15k-237/eval-filtered.txt > out/FB15k-237/eval-filtered.log
\ No newline at end of file
+python eval.py --dataset FB15k-237 --rules out/FB15k-237/rules-100-filtered --ranking_file out/FB15k-237/eval-filtered.txt > out/FB15k-237/eval-filtered.log
+
+# The same rule files with a single data load, one JSON line per rule file in out/FB15k-237/eval_session.jsonl:
+# python eval_session.py --dataset FB15k-237 --rules out/FB15k-237/rules-100 out/FB15k-237/rules-100-10 out/FB15k-237/rules-100-20 out/FB15k-237/rules-100-40 out/FB15k-237/rules-100-50 out/FB15k-237/rules-100-filtered
\ No newline at end of file
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Evaluate many rule files against one dataset with a single data load.
+
+eval.py rebuilds the PyClause Loader and re-reads train/valid/test for every rule file.
+EvalSession loads the data and the test set once and then, for every configuration,
+only loads the rules into the same loader (which replaces the previously loaded rules and
+keeps the data and its index), ranks and scores. Every configuration is appended as one
+JSON line to the output file.
+
+With --supp/--conf every rule file is additionally swept over a (support, confidence) grid.
+The rule file is parsed once into columns (bodySize, support, confidence, line offsets) and
+the subset of each grid point is built in memory and handed to the loader as a list of rules
+with their stats, replacing the awk prefiltering in eval.sh and its filtered copies on disk.
+
+Example:
+    python eval_session.py --dataset FB15k-237 --output out/FB15k-237/eval_sweep.jsonl \
+        --rules out/FB15k-237/rules-100 out/FB15k-237/rules-100-10 out/FB15k-237/rules-100-20
+    python eval_session.py --dataset FB15k-237 --rules out/FB15k-237/rule.txt --supp 2 5 20 --conf 0 0.01
+"""
+
+import argparse
+import json
+import mmap
+import os
+import tempfile
+import time
+from array import array
+
+from eval import build_options, calculate_ranking, load_data, load_rules, overall_scores, print_results
+
+
+class RuleTable:
+    """
+    A rule file (bodySize\tsupport\tconfidence\trule per line) parsed once into compact
+    columns. Subsets for thresholds are selected on the columns; only the selected rule
+    strings are read back from the memory-mapped file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array("q")
+        self.body_size = array("q")
+        self.support = array("q")
+        self.confidence = array("d")
+        with open(path, "rb") as f:
+            offset = 0
+            for line in f:
+                fields = line.split(b"\t", 3)
+                if len(fields) == 4:
+                    self.offsets.append(offset)
+                    self.body_size.append(int(float(fields[0])))
+                    self.support.append(int(float(fields[1])))
+                    self.confidence.append(float(fields[2]))
+                offset += len(line)
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if offset else b""
+        print(f"Parsed {len(self)} rules from {path}")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def select(self, min_support=0, min_confidence=0.0):
+        """Indices of rules with support >= min_support and confidence >= min_confidence (like eval.sh's awk)"""
+        support, confidence = self.support, self.confidence
+        return [i for i in range(len(self)) if support[i] >= min_support and confidence[i] >= min_confidence]
+
+    def line(self, i):
+        end = self._data.find(b"\n", self.offsets[i])
+        return self._data[self.offsets[i]:end if end >= 0 else len(self._data)].decode("utf-8").rstrip("\r")
+
+    def rules_and_stats(self, indices):
+        """Rule strings and [num_predictions, num_true_predictions] stats for PyClause's load_rules"""
+        rules = [self.line(i).split("\t", 3)[3] for i in indices]
+        stats = [[self.body_size[i], self.support[i]] for i in indices]
+        return rules, stats
+
+    def write_subset(self, indices, path):
+        """Write the selected lines to a rule file (for loaders that only accept files)"""
+        with open(path, "w", encoding="utf-8") as f:
+            for i in indices:
+                f.write(self.line(i) + "\n")
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+class EvalSession:
+    """Holds the loaded dataset and evaluates rule sets against it"""
+
+    def __init__(self, dataset, options, k=100):
+        self.dataset = dataset
+        self.options = options
+        self.k = k
+        started = time.time()
+        self.loader, self.testset = load_data(dataset, options)
+        self.load_seconds = time.time() - started
+        print(f"Loaded {dataset} in {self.load_seconds:.1f}s ({len(self.testset.triples)} test triples)")
+
+    def evaluate(self, rules, name=None, ranking_file=None, stats=None):
+        """
+        Rank the test set with one rule set and return a result row.
+        rules is a rule file path or a list of rule strings with their stats.
+        """
+        row = {"dataset": self.dataset, "name": name or str(rules)}
+        started = time.time()
+        row["loaded_rules"] = load_rules(self.loader, rules, stats)
+        rules_loaded = time.time()
+        ranker, ranking = calculate_ranking(self.loader, self.testset, self.options, k=self.k)
+        ranked = time.time()
+        scores = overall_scores(ranking, self.testset)
+        print_results(scores)
+        if ranking_file:
+            ranker.write_ranking(path=ranking_file, loader=self.loader)
+        row.update(scores)
+        row["seconds"] = {
+            "data_load": round(self.load_seconds, 3),
+            "rule_load": round(rules_loaded - started, 3),
+            "rank": round(ranked - rules_loaded, 3),
+            "score": round(time.time() - ranked, 3),
+        }
+        return row
+
+    def sweep(self, rule_file, supports, confidences, via_tempfile=False):
+        """
+        Evaluate every (support, confidence) threshold pair on subsets of one rule file.
+        Yields one result row per grid point.
+        """
+        table = RuleTable(rule_file)
+        try:
+            for min_support in supports:
+                for min_confidence in confidences:
+                    indices = table.select(min_support, min_confidence)
+                    name = f"{rule_file}@supp={min_support},conf={min_confidence}"
+                    print("=" * 60)
+                    print(f"{name}: {len(indices)}/{len(table)} rules")
+                    print("=" * 60)
+                    if via_tempfile:
+                        fd, tmp_path = tempfile.mkstemp(suffix=".txt")
+                        os.close(fd)
+                        try:
+                            table.write_subset(indices, tmp_path)
+                            row = self.evaluate(tmp_path, name=name)
+                        finally:
+                            os.remove(tmp_path)
+                    else:
+                        rules, stats = table.rules_and_stats(indices)
+                        row = self.evaluate(rules, name=name, stats=stats)
+                    row.update({"rules": rule_file, "min_support": min_support,
+                                "min_confidence": min_confidence, "num_rules": len(indices)})
+                    yield row
+        finally:
+            table.close()
+
+
+def append_row(output_file, row):
+    """Append one result row as a JSON line (rows of earlier runs are kept)"""
+    with open(output_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Evaluate several rule files with one data load")
+    argparser.add_argument("--dataset", type=str, default="FB15k-237", help="dataset to use")
+    argparser.add_argument("--rules", type=str, nargs="+", required=True, help="rule files to evaluate")
+    argparser.add_argument("--output", type=str, default="", help="JSON lines result file")
+    argparser.add_argument("--ranking_dir", type=str, default="", help="write one ranking per rule file here")
+    argparser.add_argument("--supp", type=int, nargs="+", default=None, help="support thresholds of the sweep")
+    argparser.add_argument("--conf", type=float, nargs="+", default=None, help="confidence thresholds of the sweep")
+    argparser.add_argument("--via_tempfile", action="store_true",
+                           help="hand each subset to the loader as a temporary rule file instead of a list")
+    argparser.add_argument("--aggregation_function", type=str, default="maxplus", help="aggregation function to use")
+    argparser.add_argument("--topk", type=int, default=100, help="topk to use")
+    argparser.add_argument("--load_u_d_rules", action="store_true", help="whether to load u_d rules")
+    argparser.add_argument("--load_u_xxc_rules", action="store_true", help="whether to load u_xxc rules")
+    argparser.add_argument("--load_u_xxd_rules", action="store_true", help="whether to load u_xxd rules")
+    args = argparser.parse_args()
+
+    output = args.output or f"out/{args.dataset}/eval_session.jsonl"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    options = build_options(args.aggregation_function, args.topk, args.load_u_d_rules,
+                            args.load_u_xxc_rules, args.load_u_xxd_rules)
+    session = EvalSession(args.dataset, options)
+    option_values = {key: getattr(args, key) for key in
+                     ("aggregation_function", "topk", "load_u_d_rules", "load_u_xxc_rules", "load_u_xxd_rules")}
+
+    if args.supp or args.conf:
+        for rules in args.rules:
+            for row in session.sweep(rules, args.supp or [0], args.conf or [0.0], args.via_tempfile):
+                row["options"] = option_values
+                append_row(output, row)
+        print(f"Results appended to {output}")
+        return
+
+    for rules in args.rules:
+        print("=" * 60)
+        print(f"Rules: {rules}")
+        print("=" * 60)
+        ranking_file = None
+        if args.ranking_dir:
+            os.makedirs(args.ranking_dir, exist_ok=True)
+            ranking_file = os.path.join(args.ranking_dir, f"ranking-{os.path.basename(rules)}.txt")
+        row = session.evaluate(rules, ranking_file=ranking_file)
+        row["options"] = option_values
+        append_row(output, row)
+    print(f"Results appended to {output}")
+
+
+if __name__ == "__main__":
+    main()
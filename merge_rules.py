@@ -1,15 +1,38 @@
 #!/usr/bin/env python3
 """
 Merge multiple part_*.json files into a single atom2formula2metric.json and rule.txt
+
+With --workers N the merge runs in parallel: every worker streams a subset of the part files
+and hash-partitions the atoms into shards, each shard is reduced by its own process and written
+to <split_dir>/shards/, and --concat joins the shards into the usual two output files.
+
+With --incremental the aggregates are kept in <split_dir>/merge_state.pkl together with the
+list of part files already folded in, so re-running the merge while run.sh is still producing
+partitions only reads the new part files before rule.txt is rewritten. TLearn renames a part
+file into place before it writes the completion marker (and writes none if learning did not
+complete), so incremental mode only folds in part files with a valid marker; the others are
+picked up by a later run once their marker exists.
+
+With --rule-store the merged rules are also written as a memory-mappable columnar store
+(see rule_store.py) that downstream tools can filter without loading the JSON.
 """
 
+import argparse
 import json
+import math
 import os
+import pickle
+import shutil
 import sys
+import time
 import glob
+import heapq
 import re
+import zlib
+from functools import lru_cache
+from multiprocessing import Pool
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 
 def parse_atom_to_rule_string(atom_str):
@@ -80,77 +103,335 @@ def parse_formula_to_rule_string(formula_str):
     if not formula_str or formula_str.strip() == '':
         return ''
     
-    # Split by comma but handle nested commas in atom strings
+    # Convert each atom to rule string
+    rule_atoms = [parse_atom_to_rule_string(atom) for atom in split_formula_atoms(formula_str)]
+    return ', '.join(rule_atoms)
+
+
+def split_formula_atoms(formula_str):
+    """
+    Split a formula into its atoms, ignoring commas inside parentheses
+    """
+    # Fast path: atoms look like r1·r2(X,c) and are separated by ',', so '),' separates them
+    # as long as every piece is balanced and holds only the argument comma
+    pieces = formula_str.split('),')
+    atoms = [piece + ')' for piece in pieces[:-1]] + [pieces[-1]]
+    if all(atom.count(',') == 1 and atom.count('(') == atom.count(')') for atom in atoms):
+        return [atom.strip() for atom in atoms if atom.strip()]
+    
+    # Slow path: track the parenthesis depth
     atoms = []
-    current_atom = ''
+    start = 0
     paren_depth = 0
-    
-    for char in formula_str:
+    for i, char in enumerate(formula_str):
         if char == '(':
             paren_depth += 1
-            current_atom += char
         elif char == ')':
             paren_depth -= 1
-            current_atom += char
         elif char == ',' and paren_depth == 0:
-            if current_atom.strip():
-                atoms.append(current_atom.strip())
-            current_atom = ''
-        else:
-            current_atom += char
-    
-    if current_atom.strip():
-        atoms.append(current_atom.strip())
-    
-    # Convert each atom to rule string
-    rule_atoms = [parse_atom_to_rule_string(atom) for atom in atoms]
-    return ', '.join(rule_atoms)
+            atoms.append(formula_str[start:i])
+            start = i + 1
+    atoms.append(formula_str[start:])
+    return [atom.strip() for atom in atoms if atom.strip()]
+
+
+# Rendered strings are cached: the same atoms appear in thousands of formulas and the same
+# bodies under many heads. The caches are bounded so huge rule sets cannot exhaust memory.
+RULE_STRING_CACHE_SIZE = 1 << 18
+
+
+@lru_cache(maxsize=RULE_STRING_CACHE_SIZE)
+def atom_rule_string(atom_str):
+    """Cached parse_atom_to_rule_string"""
+    return parse_atom_to_rule_string(atom_str)
 
 
-def merge_metrics(metrics_list):
+@lru_cache(maxsize=RULE_STRING_CACHE_SIZE)
+def formula_rule_string(formula_str):
+    """Cached parse_formula_to_rule_string built from cached atom strings"""
+    if not formula_str or formula_str.strip() == '':
+        return ''
+    return ', '.join([atom_rule_string(atom) for atom in split_formula_atoms(formula_str)])
+
+
+def finalize_metrics(agg):
     """
-    Merge multiple metrics by:
+    Turn a running aggregate [support, headSize, bodySize, jaccard_sum, count]
+    into the merged metric dict:
     - support, headSize, bodySize: sum
     - jaccard: average
     - confidence: recalculate as support/bodySize
     - size: count of merged metrics
     """
-    total_support = 0
-    total_head_size = 0
-    total_body_size = 0
-    total_jaccard = 0
-    count = len(metrics_list)
-    
-    for metric in metrics_list:
-        total_support += metric['support']
-        total_head_size += metric['headSize']
-        total_body_size += metric['bodySize']
-        total_jaccard += metric['jaccard']
-    
-    # Calculate average jaccard
-    avg_jaccard = total_jaccard / count if count > 0 else 0
-    
-    # Recalculate confidence
-    confidence = total_support / total_body_size if total_body_size > 0 else 0
-    
+    total_support, total_head_size, total_body_size, total_jaccard, count = agg
     return {
-        'jaccard': avg_jaccard,
+        'jaccard': total_jaccard / count if count > 0 else 0,
         'support': total_support,
         'headSize': total_head_size,
         'bodySize': total_body_size,
-        'confidence': confidence,
+        'confidence': total_support / total_body_size if total_body_size > 0 else 0,
         'size': count
     }
 
 
-def merge_json_files(input_dirs):
+class SumPolicy:
     """
-    Merge all part_*.json files from multiple input directories
+    Default merge policy: support, headSize and bodySize are summed over partitions,
+    jaccard is averaged, confidence = support/bodySize (see finalize_metrics)
+    Aggregate: [support, headSize, bodySize, jaccard_sum, count]
+    """
+    name = 'sum'
     
-    Args:
-        input_dirs: list of directory paths
+    def prepare(self, input_dirs):
+        """Called once with the input directories before any file is folded"""
+    
+    def set_file(self, json_file):
+        """Called before the metrics of json_file are folded"""
+    
+    def new(self, metric):
+        return [metric['support'], metric['headSize'], metric['bodySize'], metric['jaccard'], 1]
+    
+    def fold(self, agg, metric):
+        agg[0] += metric['support']
+        agg[1] += metric['headSize']
+        agg[2] += metric['bodySize']
+        agg[3] += metric['jaccard']
+        agg[4] += 1
+    
+    def combine(self, agg, other):
+        for i in range(len(agg)):
+            agg[i] += other[i]
+    
+    def finalize(self, agg):
+        return finalize_metrics(agg)
+
+
+class WeightedJaccardPolicy(SumPolicy):
+    """
+    Sums like SumPolicy, but jaccard is averaged weighted by the union size
+    headSize + bodySize - support of each partition, so large partitions dominate
+    Aggregate: [support, headSize, bodySize, weighted_jaccard_sum, count, union_sum]
+    """
+    name = 'weighted'
+    
+    def new(self, metric):
+        union = max(metric['headSize'] + metric['bodySize'] - metric['support'], 0)
+        return [metric['support'], metric['headSize'], metric['bodySize'], metric['jaccard'] * union, 1, union]
+    
+    def fold(self, agg, metric):
+        union = max(metric['headSize'] + metric['bodySize'] - metric['support'], 0)
+        agg[0] += metric['support']
+        agg[1] += metric['headSize']
+        agg[2] += metric['bodySize']
+        agg[3] += metric['jaccard'] * union
+        agg[4] += 1
+        agg[5] += union
+    
+    def finalize(self, agg):
+        metric = finalize_metrics(agg[:5])
+        metric['jaccard'] = agg[3] / agg[5] if agg[5] > 0 else 0
+        return metric
+
+
+class ReplicationPolicy(SumPolicy):
+    """
+    Replication-corrected sums for overlapping splits (random_multi, hub_replication, ...):
+    every partition's counts are divided by the replication factor of its split, read from
+    the partition manifest <split>/metrics.json written by partition.py. When several splits
+    are merged (louvain+edge_cut), each split covers the graph once more, so counts are also
+    divided by the number of splits. The sums then estimate full-graph counts.
+    """
+    name = 'replication'
+    
+    def __init__(self):
+        self.dir_weights = {}
+        self.weight = 1.0
+    
+    def prepare(self, input_dirs):
+        for input_dir in input_dirs:
+            manifest = os.path.join(os.path.dirname(os.path.normpath(input_dir)), 'metrics.json')
+            try:
+                with open(manifest, 'r', encoding='utf-8') as f:
+                    factor = float(json.load(f).get('replication_factor') or 1.0)
+            except (OSError, ValueError):
+                print(f"Warning: no replication factor in {manifest}, assuming 1.0")
+                factor = 1.0
+            self.dir_weights[os.path.normpath(input_dir)] = 1.0 / (factor * len(input_dirs))
+            print(f"  {input_dir}: replication factor {factor}")
+    
+    def set_file(self, json_file):
+        self.weight = self.dir_weights.get(os.path.normpath(os.path.dirname(json_file)), 1.0)
+    
+    def new(self, metric):
+        w = self.weight
+        return [metric['support'] * w, metric['headSize'] * w, metric['bodySize'] * w, metric['jaccard'], 1]
+    
+    def fold(self, agg, metric):
+        w = self.weight
+        agg[0] += metric['support'] * w
+        agg[1] += metric['headSize'] * w
+        agg[2] += metric['bodySize'] * w
+        agg[3] += metric['jaccard']
+        agg[4] += 1
+    
+    def finalize(self, agg):
+        metric = finalize_metrics(agg)
+        # rule.txt expects integral counts (weighted float sums can land just below the integer,
+        # e.g. 342 * (1/19) = 17.999...); confidence keeps the unrounded ratio
+        metric['support'] = int(round(metric['support']))
+        metric['headSize'] = int(round(metric['headSize']))
+        metric['bodySize'] = int(round(metric['bodySize']))
+        return metric
+
+
+class MaxPolicy(SumPolicy):
+    """
+    Max-based merge: every count is the maximum over partitions instead of the sum, which
+    never over-counts replicated edges (a lower bound of the full-graph counts)
+    Aggregate: [max_support, max_headSize, max_bodySize, max_jaccard, count]
+    """
+    name = 'max'
+    
+    def fold(self, agg, metric):
+        agg[0] = max(agg[0], metric['support'])
+        agg[1] = max(agg[1], metric['headSize'])
+        agg[2] = max(agg[2], metric['bodySize'])
+        agg[3] = max(agg[3], metric['jaccard'])
+        agg[4] += 1
+    
+    def combine(self, agg, other):
+        for i in range(4):
+            agg[i] = max(agg[i], other[i])
+        agg[4] += other[4]
+    
+    def finalize(self, agg):
+        max_support, max_head_size, max_body_size, max_jaccard, count = agg
+        return {
+            'jaccard': max_jaccard,
+            'support': max_support,
+            'headSize': max_head_size,
+            'bodySize': max_body_size,
+            'confidence': max_support / max_body_size if max_body_size > 0 else 0,
+            'size': count
+        }
+
+
+MERGE_POLICIES = {policy.name: policy for policy in (SumPolicy, WeightedJaccardPolicy, ReplicationPolicy, MaxPolicy)}
+
+
+def make_policy(name, input_dirs):
+    """Create and prepare the merge policy selected on the command line"""
+    policy = MERGE_POLICIES[name]()
+    policy.prepare(input_dirs)
+    return policy
+
+
+# Layout written by TLearn.saveAtom2Formula2MetricToJson: one atom per block, one formula per line
+#   "atom": {
+#     "formula": {"jaccard": 0.1, "support":2.0, "headSize":5, "bodySize":7, "confidence":0.28},
+#   },
+ATOM_LINE = re.compile(r'^\s*("(?:[^"\\]|\\.)*"):\s*\{\s*$')
+FORMULA_LINE = re.compile(r'^\s*("(?:[^"\\]|\\.)*"):\s*(\{[^{}]*\}),?\s*$')
+BLOCK_END_LINE = re.compile(r'^\s*\},?\s*$')
+
+
+def _json_key(quoted):
+    # Keys only need a real JSON decode if they contain escapes
+    return json.loads(quoted) if '\\' in quoted else quoted[1:-1]
+
+
+def is_streamable(json_file):
+    """Check whether a file uses the line layout of TLearn (otherwise fall back to json.load)"""
+    with open(json_file, 'r', encoding='utf-8') as f:
+        lines = []
+        for line in f:
+            if line.strip():
+                lines.append(line)
+            if len(lines) == 3:
+                break
+    if not lines or lines[0].strip() != '{':
+        return False
+    if len(lines) == 1 or lines[1].strip() == '}':
+        return True  # empty object
+    return bool(ATOM_LINE.match(lines[1])) and len(lines) == 3 and \
+        bool(FORMULA_LINE.match(lines[2]) or BLOCK_END_LINE.match(lines[2]))
+
+
+def iter_part_file(json_file):
+    """
+    Yield (atom, formula, metric) for every rule of a part file without building the whole
+    JSON object. Files that do not follow the TLearn layout are read with json.load instead.
+    """
+    if not is_streamable(json_file):
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for atom, formulas in data.items():
+            for formula, metric in formulas.items():
+                yield atom, formula, metric
+        return
+
+    atom = None
+    with open(json_file, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if atom is not None:
+                match = FORMULA_LINE.match(line)
+                if match:
+                    yield atom, _json_key(match.group(1)), json.loads(match.group(2))
+                    continue
+                if BLOCK_END_LINE.match(line):
+                    atom = None
+                    continue
+            else:
+                match = ATOM_LINE.match(line)
+                if match:
+                    atom = _json_key(match.group(1))
+                    continue
+                stripped = line.strip()
+                if stripped in ('{', '}', ''):
+                    continue
+            raise ValueError(f"{json_file}:{line_no}: unexpected line {line.strip()[:80]!r}")
+    if atom is not None:
+        raise ValueError(f"{json_file}: truncated inside atom {atom!r}")
+
+
+def part_file_status(json_file):
+    """
+    Check the completion marker TLearn writes next to each part file (part_k.json.done).
+    Returns 'ok' if the marker matches the file size, 'stale' if the part file was truncated or
+    overwritten after it was completed (or the marker is unreadable), and 'missing' if there
+    is no marker: learning is still running or did not complete, or the file predates markers.
+    """
+    marker_file = json_file + '.done'
+    if not os.path.exists(marker_file):
+        return 'missing'
+    try:
+        with open(marker_file, 'r', encoding='utf-8') as f:
+            marker = json.load(f)
+        return 'ok' if os.path.getsize(json_file) == marker['json_bytes'] else 'stale'
+    except (OSError, ValueError, KeyError):
+        return 'stale'
+
+
+def markers_expected(input_dir):
+    """
+    True if the part files of input_dir come from a run that writes completion markers:
+    run_partitions.py left its status file or batch manifests in <split>/log, or some part
+    file already has a marker. Only directories from older runs have no markers at all.
+    """
+    split_dir = os.path.dirname(os.path.normpath(input_dir))
+    log_dir = os.path.join(split_dir, 'log')
+    return (os.path.exists(os.path.join(log_dir, 'run_status.json'))
+            or bool(glob.glob(os.path.join(log_dir, 'batch_*.tsv')))
+            or bool(glob.glob(os.path.join(input_dir, 'part_*.json.done'))))
+
+
+def collect_part_files(input_dirs, require_markers=False):
+    """
+    Collect all part_*.json files from all directories. Files that no longer match their
+    completion marker are skipped; files without a marker are skipped too when the directory
+    is expected to have markers (the partition is still being learned or was aborted) or
+    require_markers is set, and accepted with a warning otherwise
     """
-    # Collect all part_*.json files from all directories
     all_json_files = []
     for input_dir in input_dirs:
         json_files = sorted(glob.glob(os.path.join(input_dir, 'part_*.json')))
@@ -158,61 +439,494 @@ def merge_json_files(input_dirs):
             print(f"\nFound {len(json_files)} files in {input_dir}:")
             for f in json_files:
                 print(f"  - {os.path.basename(f)}")
-            all_json_files.extend(json_files)
+            markers_required = require_markers or markers_expected(input_dir)
+            unmarked = 0
+            for f in json_files:
+                status = part_file_status(f)
+                if status == 'stale':
+                    print(f"Warning: {f} does not match its completion marker, skipping it")
+                elif status == 'missing' and markers_required:
+                    print(f"Warning: {f} has no completion marker (learning incomplete), skipping it")
+                else:
+                    unmarked += status == 'missing'
+                    all_json_files.append(f)
+            if unmarked:
+                print(f"Warning: {unmarked} part files in {input_dir} have no completion marker "
+                      f"and no run status was found, merging them as they are")
         else:
             print(f"\nWarning: No part_*.json files found in {input_dir}")
     
     if not all_json_files:
-        print("Error: No part_*.json files found in any directory")
+        print("Error: No usable part_*.json files found in any directory")
+    return all_json_files
+
+
+def fold_metric(merged, atom, formula, metric, policy):
+    """Fold one metric dict into the running aggregate of its (atom, formula) pair"""
+    formulas = merged[atom]
+    agg = formulas.get(formula)
+    if agg is None:
+        formulas[formula] = policy.new(metric)
+    else:
+        policy.fold(agg, metric)
+
+
+def fold_aggregates(merged, partial, policy):
+    """Combine the aggregates of a partial merge (atom -> formula -> aggregate) into merged"""
+    for atom, partial_formulas in partial.items():
+        formulas = merged[atom]
+        for formula, partial_agg in partial_formulas.items():
+            agg = formulas.get(formula)
+            if agg is None:
+                formulas[formula] = partial_agg
+            else:
+                policy.combine(agg, partial_agg)
+
+
+@lru_cache(maxsize=RULE_STRING_CACHE_SIZE)
+def formula_body_length(formula_str):
+    """Number of atoms in a formula (0 for an empty body)"""
+    if not formula_str or formula_str.strip() == '':
+        return 0
+    return len(split_formula_atoms(formula_str))
+
+
+def log2_bucket(value):
+    """Histogram bucket k of a positive value, i.e. value in [2^k, 2^(k+1)); '<=0' otherwise"""
+    if value <= 0:
+        return '<=0'
+    return str(math.frexp(value)[1] - 1)
+
+
+class MergeStats:
+    """
+    Statistics of the merged rules, collected while finalize_merged walks the rules anyway:
+    rule counts by head type (unary/binary) and body length, and log2 histograms of
+    support, confidence and bodySize per head type. Written to merge_stats.json.
+    """
+    HISTOGRAM_METRICS = ('support', 'confidence', 'bodySize')
+    
+    def __init__(self):
+        self.total_rules = 0
+        self.atoms = 0
+        self.pruned_rules = 0
+        self.part_files = 0
+        self.body_length = {'unary': Counter(), 'binary': Counter()}
+        self.histograms = {name: {'unary': Counter(), 'binary': Counter()} for name in self.HISTOGRAM_METRICS}
+    
+    def add_atom(self, atom, kept, pruned):
+        """Record the kept (formula, metric) pairs of one head atom"""
+        rule_type = 'binary' if '(X,Y)' in atom else 'unary'
+        self.atoms += 1
+        self.pruned_rules += pruned
+        self.total_rules += len(kept)
+        body_length = self.body_length[rule_type]
+        for formula, metric in kept:
+            body_length[formula_body_length(formula)] += 1
+            for name in self.HISTOGRAM_METRICS:
+                self.histograms[name][rule_type][log2_bucket(metric[name])] += 1
+    
+    def update(self, other):
+        """Add the statistics of another (shard) merge"""
+        self.total_rules += other.total_rules
+        self.atoms += other.atoms
+        self.pruned_rules += other.pruned_rules
+        self.part_files += other.part_files
+        for rule_type in ('unary', 'binary'):
+            self.body_length[rule_type].update(other.body_length[rule_type])
+            for name in self.HISTOGRAM_METRICS:
+                self.histograms[name][rule_type].update(other.histograms[name][rule_type])
+    
+    def to_dict(self):
+        def bucket_order(key):
+            return float('-inf') if key == '<=0' else int(key)
+        return {
+            'total_rules': self.total_rules,
+            'atoms': self.atoms,
+            'pruned_rules': self.pruned_rules,
+            'part_files': self.part_files,
+            'body_length': {rule_type: {str(k): v for k, v in sorted(counts.items())}
+                            for rule_type, counts in self.body_length.items()},
+            'histogram_buckets': 'log2: key k counts values in [2^k, 2^(k+1))',
+            'histograms': {name: {rule_type: {k: counts[k] for k in sorted(counts, key=bucket_order)}
+                                  for rule_type, counts in by_type.items()}
+                           for name, by_type in self.histograms.items()},
+        }
+    
+    def write(self, output_file, **extra):
+        data = self.to_dict()
+        data.update(extra)
+        tmp_file = output_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, output_file)
+        print(f"Saved merge statistics to {output_file}")
+
+
+def finalize_merged(merged, policy, stats=None, min_support=None, min_confidence=None, top_k=None):
+    """
+    Finalize metrics for each atom-formula pair (in place to keep the peak low)
+    
+    Pruning is applied per atom right here: support and confidence are only known once
+    every partition has been folded in, so thresholds cannot be applied earlier without
+    dropping rules whose support is spread over several partitions. To bound the memory the
+    callers finalize one shard of atoms at a time (merge passes, or the parallel reduce), and
+    top_k keeps a bounded heap of k rules per atom instead of collecting all survivors.
+    
+    Args:
+        min_support: drop rules with merged support below this value
+        min_confidence: drop rules with merged confidence below this value
+        top_k: keep only the k rules with the highest confidence per head atom
+        stats: MergeStats that records the kept rules
+    """
+    pruned = 0
+    for atom in list(merged.keys()):
+        formulas = merged[atom]
+        kept = []
+        for i, (formula, agg) in enumerate(formulas.items()):
+            metric = policy.finalize(agg)
+            if min_support is not None and metric['support'] < min_support:
+                continue
+            if min_confidence is not None and metric['confidence'] < min_confidence:
+                continue
+            if top_k is None:
+                kept.append((formula, metric))
+                continue
+            # Min-heap of the k most confident rules; the negated index keeps earlier rules on ties
+            entry = (metric['confidence'], -i, formula, metric)
+            if len(kept) < top_k:
+                heapq.heappush(kept, entry)
+            elif entry > kept[0]:
+                heapq.heapreplace(kept, entry)
+        if top_k is not None:
+            kept = [(formula, metric) for _, _, formula, metric in sorted(kept, reverse=True)]
+        pruned += len(formulas) - len(kept)
+        if stats is not None:
+            stats.add_atom(atom, kept, len(formulas) - len(kept))
+        if kept:
+            merged[atom] = dict(kept)
+        else:
+            del merged[atom]
+    if pruned:
+        print(f"Pruned {pruned} rules (min_support={min_support}, min_confidence={min_confidence}, top_k={top_k})")
+    return dict(merged)
+
+
+MERGE_STATE_VERSION = 1
+
+
+def file_signature(path):
+    """(size, mtime) of a file, None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_merge_state(state_file, policy_name, input_dirs):
+    """
+    Load the aggregates of a previous incremental merge. Returns (merged, folded_files) or
+    None if there is no usable state: different policy or inputs, or a part file that was
+    already folded in has changed or vanished since (its old contribution cannot be undone).
+    """
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        print(f"Warning: cannot read {state_file} ({e}), merging from scratch")
+        return None
+    if state.get('version') != MERGE_STATE_VERSION or state.get('policy') != policy_name \
+            or state.get('input_dirs') != [os.path.abspath(d) for d in input_dirs]:
+        print(f"Merge state {state_file} was built with other settings, merging from scratch")
+        return None
+    changed = [path for path, signature in state['files'].items() if file_signature(path) != signature]
+    if changed:
+        print(f"{len(changed)} part files changed since the last merge (e.g. {changed[0]}), merging from scratch")
+        return None
+    merged = defaultdict(dict)
+    merged.update(state['merged'])
+    return merged, state['files']
+
+
+def save_merge_state(state_file, policy_name, input_dirs, merged, folded_files):
+    """Atomically store the (unfinalized) aggregates and the list of folded part files"""
+    state = {
+        'version': MERGE_STATE_VERSION,
+        'policy': policy_name,
+        'input_dirs': [os.path.abspath(d) for d in input_dirs],
+        'files': folded_files,
+        'merged': dict(merged),
+    }
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, state_file)
+    print(f"Saved merge state ({len(folded_files)} part files) to {state_file}")
+
+
+def fold_part_file(merged, json_file, policy, shard_id=None, num_shards=1):
+    """
+    Stream one part file into merged. With shard_id only the atoms of that shard are folded.
+    Returns the number of atoms and rules folded in.
+    """
+    atoms = 0
+    rules = 0
+    last_atom = None
+    keep = True
+    policy.set_file(json_file)
+    for atom, formula, metric in iter_part_file(json_file):
+        if atom != last_atom:
+            last_atom = atom
+            keep = shard_id is None or shard_of(atom, num_shards) == shard_id
+            atoms += keep
+        if keep:
+            fold_metric(merged, atom, formula, metric, policy)
+            rules += 1
+    return atoms, rules
+
+
+def merge_json_files(input_dirs, prune_options=None, policy_name='sum', state_file=None, stats=None,
+                     num_passes=1):
+    """
+    Merge all part_*.json files from multiple input directories
+    
+    Args:
+        input_dirs: list of directory paths
+        prune_options: keyword arguments for finalize_merged (min_support, min_confidence, top_k)
+        policy_name: merge policy, one of MERGE_POLICIES
+        state_file: if given, resume from / save to this incremental merge state
+        stats: MergeStats filled while the merged rules are finalized
+        num_passes: read the part files this many times, each pass folding and finalizing only
+            the atoms of one hash shard. With pruning options only 1/num_passes of the unpruned
+            aggregates plus the kept rules are in memory at any time (ignored with state_file,
+            which has to hold every aggregate)
+    """
+    # A folded file cannot be taken back, so incremental mode never folds a file without marker
+    all_json_files = collect_part_files(input_dirs, require_markers=bool(state_file))
+    if not all_json_files:
         return None
+    if stats is not None:
+        stats.part_files = len(all_json_files)
+    
+    print(f"\nTotal files to merge: {len(all_json_files)} (policy: {policy_name})")
+    policy = make_policy(policy_name, input_dirs)
     
-    print(f"\nTotal files to merge: {len(all_json_files)}")
+    if state_file:
+        num_passes = 1
+    elif num_passes > 1:
+        # Each pass only holds the aggregates of one shard and finalizes them before the next pass
+        final_merged = {}
+        for pass_id in range(num_passes):
+            print(f"\nPass {pass_id + 1}/{num_passes}...")
+            merged = defaultdict(dict)
+            rules = 0
+            for json_file in all_json_files:
+                rules += fold_part_file(merged, json_file, policy, pass_id, num_passes)[1]
+            print(f"  Folded {rules} rules of {len(merged)} atoms")
+            final_merged.update(finalize_merged(merged, policy, stats, **(prune_options or {})))
+            del merged
+        print(f"Merged result: {len(final_merged)} unique atoms")
+        return final_merged
     
-    # Merged structure: atom -> formula -> list of metrics
-    merged = defaultdict(lambda: defaultdict(list))
+    # Merged structure: atom -> formula -> aggregate of the policy (e.g. [support, headSize, bodySize, jaccard_sum, count])
+    # Metrics are folded while the files are streamed, so memory grows with the number of
+    # unique rules instead of rules x partitions
+    merged = defaultdict(dict)
+    folded_files = {}
+    if state_file:
+        state = load_merge_state(state_file, policy_name, input_dirs)
+        if state:
+            merged, folded_files = state
+        new_files = [f for f in all_json_files if os.path.abspath(f) not in folded_files]
+        print(f"Incremental merge: {len(folded_files)} part files already folded in, {len(new_files)} new")
+        all_json_files = new_files
     
     # Read and merge all JSON files
     for json_file in all_json_files:
         print(f"\nProcessing {json_file}...")
-        
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Iterate through atoms
-        for atom, formulas in data.items():
-            for formula, metric in formulas.items():
-                # Append metric to the list
-                merged[atom][formula].append(metric)
-        
-        print(f"  Loaded {len(data)} atoms")
+        atoms, rules = fold_part_file(merged, json_file, policy)
+        print(f"  Loaded {atoms} atoms, {rules} rules")
+        folded_files[os.path.abspath(json_file)] = file_signature(json_file)
     
-    # Merge metrics for each atom-formula pair
-    print("\nMerging metrics...")
-    final_merged = {}
+    # Save before finalize_merged, which replaces the aggregates in place
+    if state_file:
+        save_merge_state(state_file, policy_name, input_dirs, merged, folded_files)
     
-    for atom, formulas in merged.items():
-        final_merged[atom] = {}
-        for formula, metrics_list in formulas.items():
-            # Merge all metrics for this atom-formula pair
-            final_merged[atom][formula] = merge_metrics(metrics_list)
+    print("\nMerging metrics...")
+    final_merged = finalize_merged(merged, policy, stats, **(prune_options or {}))
     
     print(f"Merged result: {len(final_merged)} unique atoms")
     
     return final_merged
 
 
+def shard_of(atom, num_shards):
+    """
+    Stable shard id of an atom. All formulas of an atom land in the same shard, so every
+    shard file is a self-contained part of the final output (crc32 is stable across
+    processes, unlike the salted built-in hash).
+    """
+    return zlib.crc32(atom.encode('utf-8')) % num_shards
+
+
+def _map_files(task):
+    """Worker: stream a subset of part files and write one partial aggregate per shard"""
+    task_id, json_files, num_shards, tmp_dir, policy = task
+    shards = [defaultdict(dict) for _ in range(num_shards)]
+    rules = 0
+    for json_file in json_files:
+        policy.set_file(json_file)
+        for atom, formula, metric in iter_part_file(json_file):
+            fold_metric(shards[shard_of(atom, num_shards)], atom, formula, metric, policy)
+            rules += 1
+    for shard_id, partial in enumerate(shards):
+        with open(os.path.join(tmp_dir, f'map_{task_id}_shard_{shard_id}.pkl'), 'wb') as f:
+            pickle.dump(dict(partial), f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"  [map {task_id}] {len(json_files)} files, {rules} rules", flush=True)
+    return rules
+
+
+def _reduce_shard(task):
+    """Worker: fold all partial aggregates of one shard and write its JSON and rule file"""
+    shard_id, num_tasks, tmp_dir, shard_dir, rule_store, prune_options, policy = task
+    merged = defaultdict(dict)
+    for task_id in range(num_tasks):
+        partial_file = os.path.join(tmp_dir, f'map_{task_id}_shard_{shard_id}.pkl')
+        with open(partial_file, 'rb') as f:
+            fold_aggregates(merged, pickle.load(f), policy)
+        os.remove(partial_file)
+    stats = MergeStats()
+    merged_data = finalize_merged(merged, policy, stats, **(prune_options or {}))
+    write_json_lines(merged_data, os.path.join(shard_dir, f'atom2formula2metric_{shard_id}.json'))
+    write_rules_output(merged_data, os.path.join(shard_dir, f'rule_{shard_id}.txt'))
+    if rule_store:
+        from rule_store import write_rule_store
+        write_rule_store(merged_data, os.path.join(shard_dir, f'rule_store_{shard_id}'))
+    return stats
+
+
+def assign_files(json_files, num_tasks):
+    """Distribute the files over the map tasks, largest first onto the lightest task"""
+    tasks = [[] for _ in range(min(num_tasks, len(json_files)))]
+    loads = [0] * len(tasks)
+    for json_file in sorted(json_files, key=os.path.getsize, reverse=True):
+        i = loads.index(min(loads))
+        tasks[i].append(json_file)
+        loads[i] += os.path.getsize(json_file)
+    return tasks
+
+
+def merge_json_files_parallel(input_dirs, output_dir, workers, num_shards, rule_store=False, prune_options=None,
+                              policy_name='sum'):
+    """
+    Parallel map/reduce merge. Returns the written shard files and the MergeStats of all
+    shards, or None if there is nothing to merge.
+    """
+    all_json_files = collect_part_files(input_dirs)
+    if not all_json_files:
+        return None
+    
+    shard_dir = os.path.join(output_dir, 'shards')
+    tmp_dir = os.path.join(output_dir, 'merge_tmp')
+    os.makedirs(shard_dir, exist_ok=True)
+    os.makedirs(tmp_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(shard_dir, '*')):
+        if os.path.isdir(stale):
+            shutil.rmtree(stale)
+        else:
+            os.remove(stale)
+    
+    file_groups = assign_files(all_json_files, workers)
+    print(f"\nTotal files to merge: {len(all_json_files)} "
+          f"({len(file_groups)} map tasks, {num_shards} shards, policy: {policy_name})")
+    policy = make_policy(policy_name, input_dirs)
+    
+    with Pool(processes=workers) as pool:
+        pool.map(_map_files, [(i, files, num_shards, tmp_dir, policy) for i, files in enumerate(file_groups)])
+        print("\nReducing shards...")
+        results = pool.map(_reduce_shard, [(s, len(file_groups), tmp_dir, shard_dir, rule_store, prune_options, policy)
+                                              for s in range(num_shards)])
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    stats = MergeStats()
+    for shard_stats in results:
+        stats.update(shard_stats)
+    stats.part_files = len(all_json_files)
+    shard_files = [(os.path.join(shard_dir, f'atom2formula2metric_{s}.json'),
+                    os.path.join(shard_dir, f'rule_{s}.txt')) for s in range(num_shards)]
+    return shard_files, stats
+
+
+def concat_shards(shard_files, output_json, output_rules):
+    """
+    Join the shard outputs into a single JSON and rule file. Shards hold disjoint atoms,
+    so this is a plain concatenation (rules are sorted by atom within each shard).
+    """
+    print(f"\nConcatenating {len(shard_files)} shards...")
+    tmp_json = output_json + '.tmp'
+    with open(tmp_json, 'w', encoding='utf-8') as out:
+        out.write('{\n')
+        pending = None  # last block line of the previous shard, written once we know if a comma follows
+        for json_file, _ in shard_files:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                lines = f.readlines()[1:-1]  # strip the enclosing braces
+            if not lines:
+                continue
+            if pending is not None:
+                out.write(pending.rstrip('\n') + ',\n')
+            out.writelines(lines[:-1])
+            pending = lines[-1]
+        if pending is not None:
+            out.write(pending)
+        out.write('}\n')
+    os.replace(tmp_json, output_json)
+    
+    tmp_rules = output_rules + '.tmp'
+    with open(tmp_rules, 'wb') as out:
+        for _, rule_file in shard_files:
+            with open(rule_file, 'rb') as f:
+                shutil.copyfileobj(f, out)
+    os.replace(tmp_rules, output_rules)
+    print(f"Successfully saved to {output_json} and {output_rules}")
+
+
 def write_json_output(merged_data, output_file):
     """
     Write merged data to JSON file
     """
     print(f"\nWriting JSON to {output_file}...")
     
-    with open(output_file, 'w', encoding='utf-8') as f:
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
         json.dump(merged_data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, output_file)  # readers never see a partially written file
     
     print(f"Successfully saved to {output_file}")
 
 
+def write_json_lines(merged_data, output_file):
+    """
+    Write merged data in the layout of the TLearn part files (one atom per block,
+    one formula per line), which can be streamed and concatenated line by line
+    """
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        atoms = sorted(merged_data.keys())
+        for atom_index, atom in enumerate(atoms):
+            f.write(f'  {json.dumps(atom, ensure_ascii=False)}: {{\n')
+            sorted_formulas = sorted(merged_data[atom].items(), key=lambda x: x[1]['confidence'], reverse=True)
+            for formula_index, (formula, metric) in enumerate(sorted_formulas):
+                comma = ',' if formula_index < len(sorted_formulas) - 1 else ''
+                f.write(f'    {json.dumps(formula, ensure_ascii=False)}: {json.dumps(metric)}{comma}\n')
+            f.write('  },\n' if atom_index < len(atoms) - 1 else '  }\n')
+        f.write('}\n')
+    os.replace(tmp_file, output_file)
+
+
 def write_rules_output(merged_data, output_file):
     """
     Write rules to text file in format:
@@ -221,8 +935,9 @@ def write_rules_output(merged_data, output_file):
     print(f"\nWriting rules to {output_file}...")
     
     total_rules = 0
+    tmp_file = output_file + '.tmp'
     
-    with open(output_file, 'w', encoding='utf-8') as f:
+    with open(tmp_file, 'w', encoding='utf-8') as f:
         # Sort atoms for consistent output
         for atom in sorted(merged_data.keys()):
             formulas = merged_data[atom]
@@ -234,51 +949,28 @@ def write_rules_output(merged_data, output_file):
                 reverse=True
             )
             
-            for formula, metric in sorted_formulas:
-                body_size = metric['bodySize']
-                support = int(metric['support'])
-                confidence = metric['confidence']
-                
-                # Convert atom and formula to rule string format
-                atom_rule_string = parse_atom_to_rule_string(atom)
-                formula_rule_string = parse_formula_to_rule_string(formula)
-                
-                # Format: bodySize\tsupport\tconfidence\thead <= body
-                rule_line = f"{body_size}\t{support}\t{confidence}\t{atom_rule_string} <= {formula_rule_string}\n"
-                f.write(rule_line)
-                total_rules += 1
+            # Convert atom to rule string format (once per atom)
+            head_string = atom_rule_string(atom)
+            
+            # Format: bodySize\tsupport\tconfidence\thead <= body
+            f.writelines([
+                f"{metric['bodySize']}\t{metric['support']}\t{metric['confidence']}\t{head_string} <= {formula_rule_string(formula)}\n"
+                for formula, metric in sorted_formulas
+            ])
+            total_rules += len(sorted_formulas)
+    os.replace(tmp_file, output_file)
     
     print(f"Successfully saved {total_rules} rules to {output_file}")
     return total_rules
 
 
-def print_statistics(merged_data):
+def print_statistics(stats):
     """
-    Print statistics about the merged rules
+    Print statistics about the merged rules (collected in MergeStats during the merge)
     """
-    total_rules = 0
-    unary_stats = defaultdict(int)
-    binary_stats = defaultdict(int)
-    
-    for atom, formulas in merged_data.items():
-        # Check if atom is binary (contains "(X,Y)")
-        is_binary = "(X,Y)" in atom
-        
-        for formula, metric in formulas.items():
-            total_rules += 1
-            
-            # Count body length (number of atoms in formula)
-            # Need to properly count atoms considering nested parentheses
-            if not formula or formula.strip() == '':
-                body_length = 0
-            else:
-                # Count by splitting and handling nested structures
-                body_length = len([a for a in re.split(r',\s*(?![^()]*\))', formula) if a.strip()])
-            
-            if is_binary:
-                binary_stats[body_length] += 1
-            else:
-                unary_stats[body_length] += 1
+    total_rules = stats.total_rules
+    unary_stats = stats.body_length['unary']
+    binary_stats = stats.body_length['binary']
     
     print("\n" + "=" * 60)
     print(f"Total rules: {total_rules}")
@@ -302,13 +994,40 @@ def print_statistics(merged_data):
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python merge_rules.py <split_directory>")
-        print("Example 1: python merge_rules.py out/FB15k-237/louvain")
-        print("Example 2: python merge_rules.py out/FB15k-237/louvain+edge_cut")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description='Merge part_*.json files into atom2formula2metric.json and rule.txt',
+        epilog='Example 1: python merge_rules.py out/FB15k-237/louvain\n'
+               'Example 2: python merge_rules.py out/FB15k-237/louvain+edge_cut',
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('split_dir', help='Split directory (names joined by + merge several splits)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes for the parallel sharded merge (1 = sequential merge)')
+    parser.add_argument('--shards', type=int, default=None,
+                        help='Number of shards (default: workers). With --workers 1 the sequential merge makes '
+                             'this many passes over the part files, each folding and pruning one shard of atoms, '
+                             'so --min-support/--min-confidence/--top-k also bound the merge memory')
+    parser.add_argument('--concat', action='store_true',
+                        help='Concatenate the shards into atom2formula2metric.json and rule.txt')
+    parser.add_argument('--rule-store', action='store_true',
+                        help='Also write the columnar rule store (rule_store/, or one per shard)')
+    parser.add_argument('--policy', choices=sorted(MERGE_POLICIES), default='sum',
+                        help='How metrics of the same rule from different partitions are combined: '
+                             'sum (default), weighted (union-size weighted jaccard), '
+                             'replication (sums divided by the replication factor in metrics.json), max')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keep the aggregates in merge_state.pkl and only fold in new part files')
+    parser.add_argument('--min-support', type=float, default=None, help='Drop rules with merged support below this')
+    parser.add_argument('--min-confidence', type=float, default=None,
+                        help='Drop rules with merged confidence below this')
+    parser.add_argument('--top-k', type=int, default=None, help='Keep the k most confident rules per head atom')
+    args = parser.parse_args()
+    if args.incremental and args.workers > 1:
+        parser.error('--incremental is only supported by the sequential merge (--workers 1)')
+    if args.incremental and args.shards and args.shards > 1:
+        parser.error('--incremental keeps every aggregate in merge_state.pkl and cannot merge in passes (--shards)')
+    prune_options = {'min_support': args.min_support, 'min_confidence': args.min_confidence, 'top_k': args.top_k}
     
-    split_dir = sys.argv[1]
+    split_dir = args.split_dir
     
     if not os.path.isdir(split_dir):
         print(f"Error: {split_dir} is not a valid directory")
@@ -356,8 +1075,30 @@ def main():
     print(f"Output rules: {output_rules}")
     print("=" * 60)
     
+    started = time.time()
+    stats_file = os.path.join(output_dir, 'merge_stats.json')
+    stats_extra = {'policy': args.policy, 'prune': prune_options, 'input_dirs': input_dirs}
+    
+    if args.workers > 1:
+        result = merge_json_files_parallel(input_dirs, output_dir, args.workers, args.shards or args.workers,
+                                           rule_store=args.rule_store, prune_options=prune_options,
+                                           policy_name=args.policy)
+        if result is None:
+            sys.exit(1)
+        shard_files, stats = result
+        print(f"\nShards written to {os.path.join(output_dir, 'shards')}")
+        if args.concat:
+            concat_shards(shard_files, output_json, output_rules)
+        stats.write(stats_file, seconds=round(time.time() - started, 1), **stats_extra)
+        print_statistics(stats)
+        print("\nMerge completed successfully!")
+        return
+    
     # Merge JSON files
-    merged_data = merge_json_files(input_dirs)
+    state_file = os.path.join(output_dir, 'merge_state.pkl') if args.incremental else None
+    stats = MergeStats()
+    merged_data = merge_json_files(input_dirs, prune_options, args.policy, state_file, stats,
+                                   num_passes=args.shards or 1)
     
     if merged_data is None:
         sys.exit(1)
@@ -365,9 +1106,13 @@ def main():
     # Write outputs
     write_json_output(merged_data, output_json)
     write_rules_output(merged_data, output_rules)
+    if args.rule_store:
+        from rule_store import write_rule_store
+        write_rule_store(merged_data, os.path.join(output_dir, 'rule_store'))
     
     # Print statistics
-    print_statistics(merged_data)
+    stats.write(stats_file, seconds=round(time.time() - started, 1), **stats_extra)
+    print_statistics(stats)
     
     print("\nMerge completed successfully!")
 
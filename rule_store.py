@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Columnar on-disk store for merged rules (written by merge_rules.py --rule-store).
+
+Layout of a store directory:
+    meta.json                      counts and column names
+    atoms.bin / atoms_offsets.npy  interned head atom strings (utf-8, sorted), offsets[i]:offsets[i+1]
+    formulas.bin / formulas_offsets.npy
+    atom_rule_start.npy            rules are sorted by atom, rules of atom i are atom_rule_start[i]:atom_rule_start[i+1]
+    formula_id.npy                 formula of every rule
+    support.npy, headSize.npy, bodySize.npy, jaccard.npy, confidence.npy, size.npy
+
+Everything is opened with memory mapping, so a reader only touches the columns and rows it uses.
+
+Usage:
+    store = RuleStore('out/FB15k-237/louvain/rule_store')
+    ids = store.filter(min_support=5, min_confidence=0.1, atom='r1(X,Y)')
+    for atom, formula, metric in store.iter_rules(ids):
+        ...
+"""
+
+import json
+import mmap
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+STORE_VERSION = 1
+METRIC_COLUMNS = {
+    'support': np.float64,
+    'headSize': np.int64,
+    'bodySize': np.int64,
+    'jaccard': np.float64,
+    'confidence': np.float64,
+    'size': np.int32,
+}
+
+
+def _write_string_table(strings: List[str], store_dir: str, name: str):
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(os.path.join(store_dir, f'{name}.bin'), 'wb') as f:
+        position = 0
+        for i, s in enumerate(strings):
+            data = s.encode('utf-8')
+            f.write(data)
+            position += len(data)
+            offsets[i + 1] = position
+    np.save(os.path.join(store_dir, f'{name}_offsets.npy'), offsets)
+
+
+def write_rule_store(merged_data: Dict[str, Dict[str, Dict]], store_dir: str):
+    """
+    Write merged data (atom -> formula -> metric dict) as a columnar store.
+    Rules are grouped by atom (atoms sorted), formulas within an atom by confidence descending.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    atoms = sorted(merged_data.keys())
+    formula_ids: Dict[str, int] = {}
+    num_rules = sum(len(formulas) for formulas in merged_data.values())
+
+    atom_rule_start = np.zeros(len(atoms) + 1, dtype=np.int64)
+    formula_column = np.empty(num_rules, dtype=np.int32)
+    columns = {name: np.empty(num_rules, dtype=dtype) for name, dtype in METRIC_COLUMNS.items()}
+
+    row = 0
+    for atom_id, atom in enumerate(atoms):
+        sorted_formulas = sorted(merged_data[atom].items(), key=lambda x: x[1]['confidence'], reverse=True)
+        for formula, metric in sorted_formulas:
+            formula_column[row] = formula_ids.setdefault(formula, len(formula_ids))
+            for name, column in columns.items():
+                column[row] = metric.get(name, 0)
+            row += 1
+        atom_rule_start[atom_id + 1] = row
+
+    _write_string_table(atoms, store_dir, 'atoms')
+    _write_string_table(list(formula_ids.keys()), store_dir, 'formulas')
+    np.save(os.path.join(store_dir, 'atom_rule_start.npy'), atom_rule_start)
+    np.save(os.path.join(store_dir, 'formula_id.npy'), formula_column)
+    for name, column in columns.items():
+        np.save(os.path.join(store_dir, f'{name}.npy'), column)
+
+    meta = {
+        'version': STORE_VERSION,
+        'num_rules': num_rules,
+        'num_atoms': len(atoms),
+        'num_formulas': len(formula_ids),
+        'columns': list(METRIC_COLUMNS.keys()),
+    }
+    # meta.json is written last and marks the store as complete
+    tmp_meta = os.path.join(store_dir, 'meta.json.tmp')
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, os.path.join(store_dir, 'meta.json'))
+    print(f"Saved rule store with {num_rules} rules, {len(atoms)} atoms, "
+          f"{len(formula_ids)} formulas to {store_dir}")
+
+
+class _StringTable:
+    """Memory-mapped table of utf-8 strings addressed by id"""
+
+    def __init__(self, store_dir: str, name: str):
+        self.offsets = np.load(os.path.join(store_dir, f'{name}_offsets.npy'), mmap_mode='r')
+        self._file = open(os.path.join(store_dir, f'{name}.bin'), 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def raw(self, i: int) -> bytes:
+        return self._data[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw(i).decode('utf-8')
+
+    def find_sorted(self, s: str) -> Optional[int]:
+        """Binary search in a table whose strings are sorted (utf-8 byte order == str order)"""
+        key = s.encode('utf-8')
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self.raw(lo) == key else None
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+class RuleStore:
+    """Read-only, memory-mapped view of a rule store directory"""
+
+    def __init__(self, store_dir: str):
+        with open(os.path.join(store_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported rule store version {self.meta.get('version')} in {store_dir}")
+        self.store_dir = store_dir
+        self.atoms = _StringTable(store_dir, 'atoms')
+        self.formulas = _StringTable(store_dir, 'formulas')
+        self.atom_rule_start = np.load(os.path.join(store_dir, 'atom_rule_start.npy'), mmap_mode='r')
+        self.formula_id = np.load(os.path.join(store_dir, 'formula_id.npy'), mmap_mode='r')
+        self._columns = {}
+
+    def __len__(self) -> int:
+        return self.meta['num_rules']
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped metric column (support, headSize, bodySize, jaccard, confidence, size)"""
+        if name not in self._columns:
+            if name not in METRIC_COLUMNS:
+                raise KeyError(f"Unknown column {name}, expected one of {list(METRIC_COLUMNS)}")
+            self._columns[name] = np.load(os.path.join(self.store_dir, f'{name}.npy'), mmap_mode='r')
+        return self._columns[name]
+
+    def atom_id(self, atom: str) -> Optional[int]:
+        return self.atoms.find_sorted(atom)
+
+    def rule_atom_ids(self, ids: np.ndarray) -> np.ndarray:
+        """Atom id of each rule id"""
+        return np.searchsorted(self.atom_rule_start, ids, side='right') - 1
+
+    def rules_for_atom(self, atom: str) -> np.ndarray:
+        """Rule ids of one head atom (empty if the atom is unknown)"""
+        atom_id = self.atom_id(atom)
+        if atom_id is None:
+            return np.empty(0, dtype=np.int64)
+        return np.arange(self.atom_rule_start[atom_id], self.atom_rule_start[atom_id + 1], dtype=np.int64)
+
+    def filter(self, atom: Optional[str] = None, min_support: float = None, min_confidence: float = None,
+               min_body_size: int = None, min_head_size: int = None) -> np.ndarray:
+        """
+        Rule ids matching all given conditions. Restricting by atom first only touches
+        that atom's rows; thresholds are evaluated on the memory-mapped columns.
+        """
+        if atom is not None:
+            ids = self.rules_for_atom(atom)
+            rows = slice(ids[0], ids[-1] + 1) if len(ids) else slice(0, 0)
+        else:
+            ids = np.arange(len(self), dtype=np.int64)
+            rows = slice(None)
+        mask = np.ones(len(ids), dtype=bool)
+        for name, threshold in (('support', min_support), ('confidence', min_confidence),
+                                ('bodySize', min_body_size), ('headSize', min_head_size)):
+            if threshold is not None:
+                mask &= self.column(name)[rows] >= threshold
+        return ids[mask]
+
+    def metric(self, rule_id: int) -> Dict:
+        return {name: self.column(name)[rule_id].item() for name in METRIC_COLUMNS}
+
+    def rule(self, rule_id: int) -> Tuple[str, str, Dict]:
+        atom_id = int(self.rule_atom_ids(np.array([rule_id]))[0])
+        return self.atoms[atom_id], self.formulas[int(self.formula_id[rule_id])], self.metric(rule_id)
+
+    def iter_rules(self, ids: Optional[np.ndarray] = None) -> Iterator[Tuple[str, str, Dict]]:
+        """Yield (atom, formula, metric) for the given rule ids (all rules by default)"""
+        if ids is None:
+            ids = np.arange(len(self), dtype=np.int64)
+        atom_ids = self.rule_atom_ids(ids)
+        for rule_id, atom_id in zip(ids.tolist(), atom_ids.tolist()):
+            yield self.atoms[atom_id], self.formulas[int(self.formula_id[rule_id])], self.metric(rule_id)
+
+    def close(self):
+        self.atoms.close()
+        self.formulas.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python rule_store.py <store_dir> [atom]")
+        sys.exit(1)
+    with RuleStore(sys.argv[1]) as store:
+        print(json.dumps(store.meta, indent=2))
+        if len(sys.argv) > 2:
+            for atom, formula, metric in store.iter_rules(store.rules_for_atom(sys.argv[2])):
+                print(f"{atom} <= {formula}\t{metric}")
+
+
+if __name__ == '__main__':
+    main()
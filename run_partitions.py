@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Run TLearn on every partition of a split concurrently under a total memory budget.
+
+Replaces the serial loop in run.sh: each partition out/<dataset>/<split>/partitions/part_k.tsv
+is learned by its own JVM whose heap is sized from the partition's edge count. Up to
+--workers JVMs run at the same time as long as the sum of their heaps fits into --memory_gb.
+Logs are streamed to out/<dataset>/<split>/log/part_k.log and the state of every partition
+is written to out/<dataset>/<split>/log/run_status.json after each change.
+
+With --batch every worker starts a single JVM (`TLearn --batch <manifest>`) that learns its share
+of the partitions one after another, so Maven resolution and JVM warm-up are paid once per worker.
+
+TLearn writes its outputs to a temp file that is renamed into place, followed by a completion
+marker part_k.json.done with the sizes of both output files. A partition only counts as done when
+its marker matches the files on disk, so re-running after a crash skips finished partitions and
+relearns only missing or corrupted ones (--force relearns everything).
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+
+JAR_PATH = 'target/Tarmorn-1.0-SNAPSHOT-jar-with-dependencies.jar'
+MAIN_CLASS = 'tarmorn.TLearn'
+MARKER_SUFFIX = '.done'
+
+
+def count_edges(tsv_path: str) -> int:
+    """Count the non-empty lines (= triples) of a partition file."""
+    count = 0
+    with open(tsv_path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                count += 1
+    return count
+
+
+def partition_sort_key(path: str):
+    """Sort part_2.tsv before part_10.tsv."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    match = re.search(r'(\d+)$', name)
+    return (int(match.group(1)) if match else sys.maxsize, name)
+
+
+def estimate_heap_gb(edges: int, args) -> int:
+    """
+    Size the JVM heap linearly in the number of edges, clamped to [min_heap_gb, max_heap_gb].
+    With the defaults a full-size partition (100k edges) gets the fixed 48 GB heap of run.sh.
+    """
+    heap = args.base_heap_gb + edges / 100000.0 * args.gb_per_100k_edges
+    return int(min(args.max_heap_gb, max(args.min_heap_gb, round(heap))))
+
+
+class MemoryBudget:
+    """Counting semaphore over gigabytes of heap."""
+
+    def __init__(self, total_gb: int):
+        self.total_gb = total_gb
+        self.used_gb = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, gb: int):
+        # A single partition larger than the whole budget still runs, but alone
+        gb = min(gb, self.total_gb)
+        with self.cond:
+            while self.used_gb + gb > self.total_gb:
+                self.cond.wait()
+            self.used_gb += gb
+        return gb
+
+    def release(self, gb: int):
+        with self.cond:
+            self.used_gb -= gb
+            self.cond.notify_all()
+
+
+class StatusFile:
+    """Thread-safe machine-readable status of all partitions, rewritten atomically on every update."""
+
+    def __init__(self, path: str, meta: Dict):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {'meta': meta, 'partitions': {}}
+
+    def update(self, name: str, **fields):
+        with self.lock:
+            entry = self.data['partitions'].setdefault(name, {})
+            entry.update(fields)
+            self._write()
+
+    def _write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def summary(self) -> Dict[str, int]:
+        with self.lock:
+            counts = {}
+            for entry in self.data['partitions'].values():
+                counts[entry['state']] = counts.get(entry['state'], 0) + 1
+            return counts
+
+
+def read_completion_marker(part: Dict) -> Optional[Dict]:
+    """
+    Return the completion marker of a partition if it is consistent with the outputs on disk.
+    None means the partition has to be (re)learned: no marker, output sizes differ from the
+    recorded ones (truncated/overwritten) or the partition file is newer than the result.
+    """
+    try:
+        with open(part['rules_json'] + MARKER_SUFFIX, 'r', encoding='utf-8') as f:
+            marker = json.load(f)
+        if os.path.getsize(part['rules_json']) != marker['json_bytes']:
+            return None
+        if os.path.getsize(part['rules_txt']) != marker['txt_bytes']:
+            return None
+        if os.path.getmtime(part['training']) > marker['finished']:
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return marker
+
+
+def build_command(heap_gb: int, args, main_args: List[str] = ()) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Build the command line for one TLearn JVM.
+    The assembled jar is preferred because it skips Maven's dependency resolution;
+    without it we fall back to `mvn exec:java` exactly like run.sh.
+    """
+    env = os.environ.copy()
+    env['DATASET'] = args.dataset
+    jvm_opts = [f'-Xms{heap_gb}g', f'-Xmx{heap_gb}g', '-XX:MaxMetaspaceSize=2g']
+    if os.path.exists(args.jar):
+        return ['java'] + jvm_opts + ['-cp', args.jar, MAIN_CLASS] + list(main_args), env
+    env['MAVEN_OPTS'] = ' '.join(jvm_opts)
+    cmd = ['mvn', '-q', 'exec:java', f'-Dexec.mainClass={MAIN_CLASS}']
+    if main_args:
+        # exec:java splits exec.args itself and honours quotes, so paths with spaces stay whole
+        cmd.append(f"-Dexec.args={shlex.join(main_args)}")
+    return cmd, env
+
+
+def is_out_of_memory(log_path: str) -> bool:
+    """Check the tail of a log for a JVM OutOfMemoryError."""
+    try:
+        with open(log_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 65536))
+            return b'OutOfMemoryError' in f.read()
+    except OSError:
+        return False
+
+
+def run_partition(part: Dict, args, budget: MemoryBudget, status: StatusFile) -> bool:
+    """Learn one partition, retrying failed attempts (with a larger heap after an OOM)."""
+    name = part['name']
+    heap_gb = part['heap_gb']
+
+    for attempt in range(1, args.retries + 2):
+        reserved = budget.acquire(heap_gb)
+        cmd, env = build_command(heap_gb, args)
+        env['PATH_TRAINING'] = part['training']
+        env['PATH_RULES_JSON'] = part['rules_json']
+        env['PATH_RULES_TXT'] = part['rules_txt']
+
+        started = time.time()
+        status.update(name, state='running', attempt=attempt, heap_gb=heap_gb, started=started)
+        print(f"[{name}] attempt {attempt}: {part['edges']} edges, heap {heap_gb}g -> {part['log']}", flush=True)
+
+        try:
+            with open(part['log'], 'a' if attempt > 1 else 'w', encoding='utf-8') as log:
+                if attempt > 1:
+                    log.write(f"\n{'=' * 80}\nRetry attempt {attempt} with heap {heap_gb}g\n{'=' * 80}\n")
+                    log.flush()
+                returncode = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT, env=env)
+        except OSError as e:
+            print(f"[{name}] failed to start: {e}", flush=True)
+            returncode = -1
+        finally:
+            budget.release(reserved)
+
+        elapsed = round(time.time() - started, 1)
+        if returncode == 0 and read_completion_marker(part):
+            status.update(name, state='done', returncode=0, seconds=elapsed, finished=time.time())
+            print(f"[{name}] done in {elapsed}s", flush=True)
+            return True
+        if returncode == 0:
+            print(f"[{name}] exited without a valid completion marker", flush=True)
+
+        oom = is_out_of_memory(part['log'])
+        status.update(name, state='failed', returncode=returncode, seconds=elapsed,
+                      finished=time.time(), out_of_memory=oom)
+        print(f"[{name}] FAILED (exit {returncode}{', out of memory' if oom else ''}) after {elapsed}s", flush=True)
+        if oom:
+            heap_gb = min(args.max_heap_gb, int(heap_gb * args.oom_heap_factor) + 1)
+
+    return False
+
+
+def assign_batches(parts: List[Dict], workers: int) -> List[List[Dict]]:
+    """Greedily distribute partitions (largest first) over the worker with the fewest edges so far."""
+    batches = [[] for _ in range(min(workers, len(parts)))]
+    loads = [0] * len(batches)
+    for part in parts:
+        i = loads.index(min(loads))
+        batches[i].append(part)
+        loads[i] += part['edges']
+    return batches
+
+
+def run_batch(batch_id: int, batch: List[Dict], args, budget: MemoryBudget, status: StatusFile) -> List[Dict]:
+    """
+    Learn a list of partitions in one JVM via `TLearn --batch <manifest>`.
+    The JVM reports `[batch] OK|FAILED <training>` per partition on its stdout, which is
+    captured in log/batch_<id>.log; per-partition output still goes to log/<partition>.log.
+
+    Returns the partitions that did not finish successfully.
+    """
+    log_dir = os.path.dirname(batch[0]['log'])
+    manifest = os.path.join(log_dir, f'batch_{batch_id}.tsv')
+    batch_log = os.path.join(log_dir, f'batch_{batch_id}.log')
+    with open(manifest, 'w', encoding='utf-8') as f:
+        for part in batch:
+            f.write(f"{part['training']}\t{part['rules_json']}\t{part['rules_txt']}\t{part['log']}\n")
+
+    # The JVM keeps the heap of its largest partition for its whole lifetime
+    heap_gb = max(part['heap_gb'] for part in batch)
+    reserved = budget.acquire(heap_gb)
+    cmd, env = build_command(heap_gb, args, ['--batch', manifest])
+
+    started = time.time()
+    for part in batch:
+        status.update(part['name'], state='running', attempt=part.get('attempt', 0) + 1,
+                      heap_gb=heap_gb, started=started, batch=batch_id)
+    print(f"[batch {batch_id}] {len(batch)} partitions, heap {heap_gb}g -> {batch_log}", flush=True)
+
+    by_training = {part['training']: part for part in batch}
+    finished = set()
+    try:
+        with open(batch_log, 'w', encoding='utf-8') as log:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env,
+                                    universal_newlines=True, encoding='utf-8', errors='replace')
+            for line in proc.stdout:
+                log.write(line)
+                log.flush()
+                match = re.match(r'\[batch\] (OK|FAILED) (\S+)', line)
+                if match and match.group(2) in by_training:
+                    part = by_training[match.group(2)]
+                    now = time.time()
+                    if match.group(1) == 'OK' and read_completion_marker(part):
+                        finished.add(part['training'])
+                        status.update(part['name'], state='done', returncode=0, finished=now,
+                                      seconds=round(now - started, 1))
+                        print(f"[{part['name']}] done (batch {batch_id})", flush=True)
+                    else:
+                        status.update(part['name'], state='failed', finished=now,
+                                      out_of_memory=is_out_of_memory(part['log']))
+                        print(f"[{part['name']}] FAILED (batch {batch_id})", flush=True)
+                    started = now
+            returncode = proc.wait()
+    except OSError as e:
+        print(f"[batch {batch_id}] failed to start: {e}", flush=True)
+        returncode = -1
+    finally:
+        budget.release(reserved)
+
+    failed = [part for part in batch if part['training'] not in finished]
+    for part in failed:
+        part['attempt'] = part.get('attempt', 0) + 1
+        status.update(part['name'], state='failed', returncode=returncode,
+                      out_of_memory=is_out_of_memory(part['log']) or is_out_of_memory(batch_log))
+    print(f"[batch {batch_id}] exited with {returncode}, {len(batch) - len(failed)}/{len(batch)} partitions done", flush=True)
+    return failed
+
+
+def run_batches(parts: List[Dict], args, budget: MemoryBudget, status: StatusFile) -> bool:
+    """Run all partitions in per-worker JVMs; partitions that failed are retried in a new round."""
+    pending = parts
+    for attempt in range(args.retries + 1):
+        batches = assign_batches(pending, args.workers)
+        offset = attempt * args.workers
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            failed_lists = list(executor.map(
+                lambda ib: run_batch(offset + ib[0], ib[1], args, budget, status), enumerate(batches)))
+        pending = [part for failed in failed_lists for part in failed]
+        if not pending:
+            return True
+        if attempt == args.retries:
+            break
+        for part in pending:
+            if status.data['partitions'][part['name']].get('out_of_memory'):
+                part['heap_gb'] = min(args.max_heap_gb, int(part['heap_gb'] * args.oom_heap_factor) + 1)
+        print(f"Retrying {len(pending)} failed partitions...", flush=True)
+    return False
+
+
+def collect_partitions(split_dir: str, args) -> List[Dict]:
+    """Create one job description per partition file, largest partitions first."""
+    tsv_files = sorted(glob.glob(os.path.join(split_dir, 'partitions', '*.tsv')), key=partition_sort_key)
+    parts = []
+    for tsv in tsv_files:
+        name = os.path.splitext(os.path.basename(tsv))[0]
+        edges = count_edges(tsv)
+        parts.append({
+            'name': name,
+            'training': tsv,
+            'rules_json': os.path.join(split_dir, 'atom2formula2metric', f'{name}.json'),
+            'rules_txt': os.path.join(split_dir, 'rules', f'{name}.txt'),
+            'log': os.path.join(split_dir, 'log', f'{name}.log'),
+            'edges': edges,
+            'heap_gb': estimate_heap_gb(edges, args),
+        })
+    # Longest-processing-time-first keeps the tail of the schedule short
+    parts.sort(key=lambda p: p['edges'], reverse=True)
+    return parts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run TLearn on all partitions of a split in parallel')
+    parser.add_argument('--dataset', default='FB15k-237')
+    parser.add_argument('--split', default='louvain')
+    parser.add_argument('--workers', type=int, default=4, help='Maximal number of concurrent JVMs')
+    parser.add_argument('--memory_gb', type=int, default=192, help='Total heap budget shared by all JVMs')
+    parser.add_argument('--base_heap_gb', type=float, default=2.0, help='Heap independent of the partition size')
+    parser.add_argument('--gb_per_100k_edges', type=float, default=46.0, help='Additional heap per 100k edges')
+    parser.add_argument('--min_heap_gb', type=int, default=4)
+    parser.add_argument('--max_heap_gb', type=int, default=48)
+    parser.add_argument('--retries', type=int, default=1, help='Retries per failed partition')
+    parser.add_argument('--oom_heap_factor', type=float, default=1.5, help='Heap growth after an OutOfMemoryError')
+    parser.add_argument('--jar', default=JAR_PATH, help='Assembled jar; falls back to mvn exec:java if missing')
+    parser.add_argument('--batch', action='store_true', help='One JVM per worker that learns several partitions')
+    parser.add_argument('--force', action='store_true', help='Relearn partitions that already have a completion marker')
+    args = parser.parse_args()
+
+    split_dir = os.path.join('out', args.dataset, args.split)
+    for sub in ('atom2formula2metric', 'rules', 'log'):
+        os.makedirs(os.path.join(split_dir, sub), exist_ok=True)
+
+    parts = collect_partitions(split_dir, args)
+    if not parts:
+        print(f"Error: No partition files found in {os.path.join(split_dir, 'partitions')}")
+        sys.exit(1)
+
+    status_path = os.path.join(split_dir, 'log', 'run_status.json')
+    status = StatusFile(status_path, {
+        'dataset': args.dataset,
+        'split': args.split,
+        'workers': args.workers,
+        'memory_gb': args.memory_gb,
+        'started': time.time(),
+    })
+    todo = []
+    for part in parts:
+        marker = None if args.force else read_completion_marker(part)
+        if marker:
+            status.update(part['name'], state='skipped', edges=part['edges'], rules=marker.get('rules'))
+        else:
+            status.update(part['name'], state='pending', edges=part['edges'], heap_gb=part['heap_gb'], attempt=0)
+            todo.append(part)
+
+    print("=" * 80)
+    print(f"Split: {split_dir}")
+    print(f"Partitions: {len(parts)}, workers: {args.workers}, memory budget: {args.memory_gb}g"
+          f"{', batch mode' if args.batch else ''}")
+    if len(todo) < len(parts):
+        print(f"Skipping {len(parts) - len(todo)} partitions with a completion marker, {len(todo)} left")
+    print(f"Status file: {status_path}")
+    print("=" * 80, flush=True)
+
+    budget = MemoryBudget(args.memory_gb)
+    if not todo:
+        success = True
+    elif args.batch:
+        success = run_batches(todo, args, budget, status)
+    else:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            success = all(executor.map(lambda p: run_partition(p, args, budget, status), todo))
+
+    print("=" * 80)
+    print(f"All partitions processed: {status.summary()}")
+    print("=" * 80)
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -24,10 +24,13 @@
 """
 
 import os
+import sys
 import json
 import re
-from collections import defaultdict, Counter
-from typing import Set, Tuple, Dict, List, Optional
+import time
+from collections import defaultdict, Counter, OrderedDict
+from functools import partial
+from typing import Set, Tuple, Dict, List, Optional, Iterator
 from itertools import product
 
 # DEBUG控制开关
@@ -52,6 +55,10 @@ class KnowledgeGraph:
         self.relations = set()
         # 原始关系集合（用于区分基础关系和缓存的复合关系）
         self.base_relations = set()
+        # RuleSupportCalculator 的实例缓存和路径枚举器，在同一个知识图谱上的计算器之间共享
+        # （复合关系写入 r2h2t，属于整个知识图谱，字节预算也按知识图谱计）
+        self.instance_cache = None
+        self.path_enumerator = None
     
     def add_triple(self, head: str, relation: str, tail: str):
         """添加三元组到知识图谱"""
@@ -72,6 +79,9 @@ class KnowledgeGraph:
     
     def clear_cached_relations(self):
         """清除缓存的复合关系，保留基础关系"""
+        if self.instance_cache is not None:
+            self.instance_cache.clear()
+        
         # 找出所有非基础关系（即缓存的复合关系）
         cached_relations = [r for r in self.relations if r not in self.base_relations]
         
@@ -150,6 +160,101 @@ class KnowledgeGraph:
         debug(f"r2h2t索引已保存，包含 {len(serializable_r2h2t)} 个关系")
 
 
+class IntegerAdjacency:
+    """
+    实体ID化的邻接表，relation -> {head_id: (tail_id, ...)}，按需从 kg.r2h2t 构建
+    
+    on_load(relation, table, cost) 在每个关系的邻接表构建后调用，用于把它计入缓存预算
+    """
+    
+    def __init__(self, kg: KnowledgeGraph, on_load=None):
+        self.kg = kg
+        self.entities = sorted(kg.entities)
+        self.entity_ids = {entity: i for i, entity in enumerate(self.entities)}
+        self.on_load = on_load
+        self._adjacency = {}
+    
+    def __len__(self) -> int:
+        return len(self.entities)
+    
+    def get(self, relation: str) -> Dict[int, Tuple[int, ...]]:
+        """获取关系的整数邻接表（INVERSE_ 关系和已缓存的复合关系同样可用）"""
+        table = self._adjacency.get(relation)
+        if table is None:
+            start = time.perf_counter()
+            ids = self.entity_ids
+            table = self._adjacency[relation] = {
+                ids[head]: tuple(ids[tail] for tail in tails)
+                for head, tails in self.kg.r2h2t.get(relation, {}).items() if tails
+            }
+            if self.on_load is not None:
+                self.on_load(relation, table, time.perf_counter() - start)
+        return table
+    
+    def count(self, relation: str) -> int:
+        """关系的实例数量"""
+        return sum(len(tails) for tails in self.get(relation).values())
+    
+    def discard(self, relation: str):
+        """丢弃某个关系的邻接表（用于复合关系被清除后）"""
+        self._adjacency.pop(relation, None)
+
+
+class PathEnumerator:
+    """
+    关系路径实例枚举器
+    
+    对每个起点 X 沿路径只遍历一次，路径上的实体两两不同（X != A != B != ... != Y），
+    同一个 X 到达的 Y 用位图去重，位图在 X 之间复用，只重置被置位的部分
+    """
+    
+    def __init__(self, adjacency: IntegerAdjacency):
+        self.adjacency = adjacency
+        self._seen = bytearray(len(adjacency))
+    
+    def _walk(self, node: int, depth: int, visited: Tuple[int, ...], steps: List[Dict]) -> Iterator[int]:
+        """从 node 出发走完 steps[depth:]，产出终点（可能重复）"""
+        last = depth == len(steps) - 1
+        for nxt in steps[depth].get(node, ()):
+            if nxt in visited:
+                continue
+            if last:
+                yield nxt
+            else:
+                yield from self._walk(nxt, depth + 1, visited + (nxt,), steps)
+    
+    def tails_from(self, x: int, steps: List[Dict]) -> List[int]:
+        """起点 x 经过路径能到达的所有不同的 Y"""
+        seen = self._seen
+        tails = []
+        for y in self._walk(x, 0, (x,), steps):
+            if not seen[y]:
+                seen[y] = 1
+                tails.append(y)
+        for y in tails:
+            seen[y] = 0
+        return tails
+    
+    def iter_tails(self, relation_path: List[str]) -> Iterator[Tuple[int, List[int]]]:
+        """按起点流式产出 (X, [Y, ...])，内存只与单个 X 的扇出有关"""
+        steps = [self.adjacency.get(relation) for relation in relation_path]
+        if not steps or any(not step for step in steps):
+            return
+        for x in steps[0]:
+            tails = self.tails_from(x, steps)
+            if tails:
+                yield x, tails
+    
+    def path_instances(self, relation_path: List[str]) -> Set[Tuple[str, str]]:
+        """关系路径的全部 (X, Y) 实例"""
+        entities = self.adjacency.entities
+        result = set()
+        for x, tails in self.iter_tails(relation_path):
+            head = entities[x]
+            result.update((head, entities[y]) for y in tails)
+        return result
+
+
 class RuleParser:
     """规则解析器，支持多种规则格式和简写"""
     
@@ -165,6 +270,9 @@ class RuleParser:
         Args:
             rule_str: 规则字符串
             
+        二元规则的身体不是从 X 到 Y 的链（例如分叉或成环的变量模式）时无法写成简写，
+        按完整格式解析，rule_info 带有 body_atoms，由哈希连接求解
+        
         Returns:
             (head_relation, body_relations, variable_count, rule_info)
         """
@@ -189,6 +297,11 @@ class RuleParser:
         norm_head = norm_head.strip()
         norm_body = norm_body.strip()
         
+        if '(' in norm_head and ',' in norm_head.split('(')[1]:
+            # 无法转换为简写，保留完整格式
+            rule_info['is_simplified'] = False
+            return RuleParser._parse_full_rule(head_part, body_part, rule_info)
+        
         return RuleParser._parse_simplified_rule(norm_head, norm_body, rule_info)
     
     @staticmethod
@@ -493,8 +606,8 @@ class RuleParser:
         # 提取自由变量（头部中的单字母变量）
         free_vars = [arg for arg in head_args if len(arg) == 1]
         
-        if len(free_vars) != 2:
-            # 如果不是严格的二元规则，返回原始格式
+        if len(free_vars) != 2 or not RuleParser._is_chain_body(body_atoms, free_vars):
+            # 如果不是严格的二元规则，或身体不是从 X 到 Y 的链，返回原始格式
             return f"{head_relation}({','.join(head_args)}) <= {', '.join(body_atoms)}"
         
         # 构建body路径，传入有序的自由变量列表
@@ -504,6 +617,31 @@ class RuleParser:
         debug(f"[DEBUG] Binary simplified result: {result}")
         return result
     
+    @staticmethod
+    def _is_chain_body(body_atoms: List[str], free_vars: List[str]) -> bool:
+        """
+        身体原子是否构成从 X 到 Y 的链：每个原子恰好用一次，途经的变量互不相同，
+        例如 body1(X,A), body2(Y,A)；body1(X,A), body2(A,Y), body3(A,B) 有分叉，不是链
+        """
+        X, Y = free_vars
+        atoms = [RuleParser._extract_variables(atom) for atom in body_atoms]
+        if any(len(args) != 2 or any(len(arg) != 1 for arg in args) for args in atoms):
+            return False
+        
+        current, visited = X, {X}
+        remaining = list(range(len(atoms)))
+        while remaining:
+            nxt = [i for i in remaining if current in atoms[i]]
+            if len(nxt) != 1:
+                return False
+            args = atoms[nxt[0]]
+            current = args[1] if args[0] == current else args[0]
+            if current in visited:
+                return False
+            visited.add(current)
+            remaining.remove(nxt[0])
+        return current == Y
+    
     @staticmethod
     def _build_binary_body_path(body_atoms: List[str], free_vars: List[str]) -> str:
         """
@@ -777,8 +915,11 @@ class RuleParser:
         
         # 将body_relations存储到rule_info中
         rule_info['body_relations'] = body_relations
+        rule_info['head_relation'] = head_relation
         
-        if variable_count == 1:
+        if variable_count == 2:
+            rule_info.update({'is_unary': False, 'head_constant': None, 'body_constant': None})
+        elif variable_count == 1:
             rule_info['is_unary'] = True
             # 找到固定实体和变量位置
             for i, var in enumerate(head_variables):
@@ -941,13 +1082,146 @@ class RuleParser:
         return atoms
 
 
+class InstanceCache:
+    """
+    有字节预算的实例缓存
+    
+    缓存路径实例集合、复合关系及其 tail -> heads 索引、整数邻接表，按估算的内存大小计账，超出预算时淘汰：
+    - lru：淘汰最久未使用的项
+    - cost：淘汰重新计算代价（计算耗时）与大小之比最小的项
+    最近写入的一项总会保留，即使它本身超出预算，保证调用方马上可以使用
+    
+    淘汰时调用 on_evict(key, value)，用于把复合关系从 kg.r2h2t 中删除、把邻接表从 IntegerAdjacency 中丢弃
+    """
+    
+    POLICIES = ('lru', 'cost')
+    # 一个 (head, tail) 元组的大小，字符串本身与知识图谱共享，不重复计算
+    PAIR_BYTES = sys.getsizeof((None, None))
+    
+    def __init__(self, max_bytes: Optional[int] = None, policy: str = 'lru', on_evict=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的缓存淘汰策略: {policy}，可选: {self.POLICIES}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.on_evict = on_evict
+        # key -> (value, size, cost)
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @classmethod
+    def estimate_size(cls, value) -> int:
+        """估算缓存值占用的字节数：实例集合，或 head -> set(tails) / tuple(tails) 形式的索引"""
+        if isinstance(value, (set, frozenset)):
+            return sys.getsizeof(value) + len(value) * cls.PAIR_BYTES
+        if isinstance(value, dict):
+            return sys.getsizeof(value) + sum(sys.getsizeof(tails) for tails in value.values())
+        return sys.getsizeof(value)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+    
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+    
+    def put(self, key, value, cost: float = 0.0):
+        """写入缓存，cost 为重新计算的代价（秒）"""
+        if key in self._entries:
+            self._remove(key)
+        size = self.estimate_size(value)
+        self._entries[key] = (value, size, cost)
+        self.bytes += size
+        if self.max_bytes is not None:
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                self._evict_one()
+    
+    def configure(self, max_bytes: Optional[int], policy: str = 'lru'):
+        """重新设置预算和淘汰策略，超出新预算的部分立即淘汰"""
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的缓存淘汰策略: {policy}，可选: {self.POLICIES}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        if max_bytes is not None:
+            while self.bytes > max_bytes and len(self._entries) > 1:
+                self._evict_one()
+    
+    def discard(self, key):
+        """删除一项（不调用 on_evict，不计入淘汰次数）"""
+        if key in self._entries:
+            self._remove(key)
+    
+    def _victim(self):
+        if self.policy == 'lru':
+            return next(iter(self._entries))
+        # 不淘汰最近写入的一项
+        candidates = list(self._entries.items())[:-1]
+        return min(candidates, key=lambda item: item[1][2] / max(item[1][1], 1))[0]
+    
+    def _remove(self, key):
+        value, size, _ = self._entries.pop(key)
+        self.bytes -= size
+        return value
+    
+    def _evict_one(self):
+        key = self._victim()
+        value = self._remove(key)
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+    
+    def clear(self):
+        """清空缓存（对每一项调用 on_evict，但不计入淘汰次数）"""
+        while self._entries:
+            key, (value, size, _) = self._entries.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+        self.bytes = 0
+    
+    def stats(self) -> Dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'policy': self.policy,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
 class RuleSupportCalculator:
     """规则支持度计算器，基于r2h2t索引和逐级连接算法"""
     
-    def __init__(self, kg: KnowledgeGraph):
+    # 实例缓存中的键前缀，与路径实例的键区分：复合关系、复合关系的 tail -> heads 索引、整数邻接表
+    RELATION_KEY = 'r2h2t:'
+    INVERSE_KEY = 't2h:'
+    ADJACENCY_KEY = 'adjacency:'
+    
+    def __init__(self, kg: KnowledgeGraph, sparse_engine=None, cache_bytes: Optional[int] = None,
+                 cache_policy: str = 'lru'):
         self.kg = kg
-        # 实例缓存，存储每个路径的实例集合
-        self.instance_cache = {}
+        # 实例缓存，存储每个路径的实例集合、join_relations 写入 kg.r2h2t 的复合关系及其逆索引、整数邻接表；
+        # 缓存挂在知识图谱上，为每条规则新建计算器时仍然共用同一份预算。
+        # cache_bytes 为空时不限制大小（已有缓存时保留原来的预算）
+        if kg.instance_cache is None:
+            kg.instance_cache = InstanceCache(cache_bytes, cache_policy,
+                                              on_evict=partial(self._on_cache_evict, kg))
+        elif cache_bytes is not None:
+            kg.instance_cache.configure(cache_bytes, cache_policy)
+        self.instance_cache = kg.instance_cache
+        # 稀疏矩阵引擎（可选，见 sparse_engine.py），可在多个计算器之间共享
+        self.sparse_engine = sparse_engine
     
     def join_relations(self, r1: str, r2: str) -> str:
         """
@@ -964,9 +1238,11 @@ class RuleSupportCalculator:
         
         # 如果复合关系已经存在，直接返回
         if composite_name in self.kg.r2h2t:
+            self.instance_cache.get(self.RELATION_KEY + composite_name)
             return composite_name
         
         # 计算复合关系的实例
+        start = time.perf_counter()
         instances = self._join_two_relations(r1, r2)
         
         # 将复合关系添加到KG的r2h2t索引中
@@ -975,6 +1251,9 @@ class RuleSupportCalculator:
         
         # 添加到关系集合（但不添加到base_relations，因为这是缓存的复合关系）
         self.kg.relations.add(composite_name)
+        # 计入缓存预算，淘汰时从 r2h2t 中删除
+        self.instance_cache.put(self.RELATION_KEY + composite_name, self.kg.r2h2t[composite_name],
+                                cost=time.perf_counter() - start)
         
         debug(f"    [DEBUG] Created composite relation: {composite_name} with {len(instances)} instances")
         
@@ -1005,10 +1284,9 @@ class RuleSupportCalculator:
         """
         计算关系路径的实例集合，确保路径上所有实体都不相等
         
-        对于长度为3的路径 r1·r2·r3，同时考虑两种拆分：
-        1. (r1·r2)·r3：确保 A!=B!=D
-        2. r1·(r2·r3)：确保 A!=C!=D
-        两种拆分的交集才是最终结果，这样能确保 A!=B!=C!=D
+        长度为1、2的路径直接计算；长度 >= 3 的路径 r1·r2·r3 由 PathEnumerator
+        对每个起点只遍历一次，遍历时保证 A!=B!=C!=D，不再对 N-1 种拆分分别连接再求交
+        （拆分求交的旧实现见 compute_supp_by_splits）
         
         Args:
             relation_path: 关系路径列表
@@ -1019,23 +1297,47 @@ class RuleSupportCalculator:
         path_str = '·'.join(relation_path)
         
         # 如果已经计算过，直接返回
-        if path_str in self.instance_cache:
+        cached = self.instance_cache.get(path_str)
+        if cached is not None:
             debug(f"      [DEBUG] Using cached instances for {path_str}")
-            return self.instance_cache[path_str]
+            return cached
         
+        start = time.perf_counter()
         if len(relation_path) == 1:
             # 单个关系，直接返回其实例
             instances = self.kg.get_relation_pairs(relation_path[0])
-            self.instance_cache[path_str] = instances
+            self.instance_cache.put(path_str, instances, cost=time.perf_counter() - start)
             return instances
         
         if len(relation_path) == 2:
             # 两个关系，直接连接
             instances = self._join_two_relations(relation_path[0], relation_path[1])
-            self.instance_cache[path_str] = instances
+            self.instance_cache.put(path_str, instances, cost=time.perf_counter() - start)
             return instances
         
-        # 长度 >= 3 的路径，需要考虑所有 N-1 种拆分方式
+        # 长度 >= 3 的路径，单次遍历
+        debug(f"      [DEBUG] Computing {len(relation_path)}-path with single-pass enumeration")
+        result = self._get_path_enumerator().path_instances(relation_path)
+        debug(f"      [DEBUG] Final {len(relation_path)}-path result: {len(result)} instances")
+        
+        self.instance_cache.put(path_str, result, cost=time.perf_counter() - start)
+        return result
+    
+    def compute_supp_by_splits(self, relation_path: List[str]) -> Set[Tuple[str, str]]:
+        """
+        按 N-1 种拆分分别连接再求交的方式计算长度 >= 3 的路径（原实现，用于对照）
+        
+        对于长度为3的路径 r1·r2·r3，同时考虑两种拆分：
+        1. (r1·r2)·r3：确保 A!=B!=D
+        2. r1·(r2·r3)：确保 A!=C!=D
+        两种拆分的交集作为最终结果
+        
+        不同拆分可能由不同的路径满足，结果是 compute_supp 的超集；
+        SparseRuleEngine 用同样的交集作为候选，再检查路径上实体两两不同
+        """
+        if len(relation_path) < 3:
+            return self.compute_supp(relation_path)
+        
         n = len(relation_path)
         debug(f"      [DEBUG] Computing {n}-path with {n-1} split methods")
         
@@ -1050,14 +1352,14 @@ class RuleSupportCalculator:
             debug(f"      [DEBUG] Split {split_pos}: {' · '.join(left_path)} | {' · '.join(right_path)}")
             
             # 递归计算左右两部分
-            left_instances = self.compute_supp(left_path)
+            left_instances = self.compute_supp_by_splits(left_path)
             if not left_instances:
                 debug(f"      [DEBUG] Left part is empty, this split gives 0 instances")
                 # 如果某个拆分的左边为空，这个拆分的结果是空集
                 split_results.append(set())
                 continue
             
-            right_instances = self.compute_supp(right_path)
+            right_instances = self.compute_supp_by_splits(right_path)
             if not right_instances:
                 debug(f"      [DEBUG] Right part is empty, this split gives 0 instances")
                 split_results.append(set())
@@ -1078,10 +1380,64 @@ class RuleSupportCalculator:
                 result = result.intersection(split_result)
         
         debug(f"      [DEBUG] Final {n}-path result (intersection of {len(split_results)} splits): {len(result)} instances")
-        
-        self.instance_cache[path_str] = result
         return result
     
+    @classmethod
+    def _on_cache_evict(cls, kg: KnowledgeGraph, key: str, value):
+        """缓存淘汰回调：复合关系从知识图谱中删除，连同它的逆索引和整数邻接表；被淘汰的邻接表下次使用时重建"""
+        if key.startswith(cls.ADJACENCY_KEY):
+            if kg.path_enumerator is not None:
+                kg.path_enumerator.adjacency.discard(key[len(cls.ADJACENCY_KEY):])
+        elif key.startswith(cls.RELATION_KEY):
+            relation = key[len(cls.RELATION_KEY):]
+            if relation not in kg.base_relations:
+                kg.r2h2t.pop(relation, None)
+                kg.relations.discard(relation)
+                kg.instance_cache.discard(cls.INVERSE_KEY + relation)
+                kg.instance_cache.discard(cls.ADJACENCY_KEY + relation)
+                if kg.path_enumerator is not None:
+                    kg.path_enumerator.adjacency.discard(relation)
+    
+    def cache_stats(self) -> Dict:
+        """实例缓存的命中、未命中、淘汰次数和占用字节数"""
+        return self.instance_cache.stats()
+    
+    def _get_path_enumerator(self) -> PathEnumerator:
+        """知识图谱共享的路径枚举器，其整数邻接表计入实例缓存的预算"""
+        if self.kg.path_enumerator is None:
+            cache = self.instance_cache
+            prefix = self.ADJACENCY_KEY
+            
+            def on_load(relation: str, table: Dict, cost: float):
+                cache.put(prefix + relation, table, cost=cost)
+            
+            self.kg.path_enumerator = PathEnumerator(IntegerAdjacency(self.kg, on_load=on_load))
+        return self.kg.path_enumerator
+    
+    def _get_inverse_index(self, relation: str) -> Dict[str, Set[str]]:
+        """
+        关系的 tail -> heads 索引
+        
+        基础关系直接使用 INVERSE_ 关系；复合关系的逆关系只有在恰好被连接过时才在 r2h2t 中，
+        因此总是从正向索引构建，保证结果不依赖缓存中已有哪些复合关系。
+        构建的索引放入实例缓存，复合关系被淘汰时一起删除
+        """
+        inverse_relation = self.kg.get_inverse_relation(relation)
+        if '·' not in relation and inverse_relation in self.kg.r2h2t:
+            return self.kg.r2h2t[inverse_relation]
+        key = self.INVERSE_KEY + relation
+        cached = self.instance_cache.get(key)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        t2h = defaultdict(set)
+        for head, tails in self.kg.r2h2t.get(relation, {}).items():
+            for tail in tails:
+                t2h[tail].add(head)
+        t2h = dict(t2h)
+        self.instance_cache.put(key, t2h, cost=time.perf_counter() - start)
+        return t2h
+    
     def _join_two_relations(self, r1: str, r2: str) -> Set[Tuple[str, str]]:
         """连接两个关系，确保 X != A != Y"""
         debug(f"      [DEBUG] Joining two relations: {r1} · {r2}")
@@ -1090,8 +1446,8 @@ class RuleSupportCalculator:
         r2_h2t = self.kg.r2h2t.get(r2, {})
         
         # 获取连接节点
-        inverse_r1 = self.kg.get_inverse_relation(r1)
-        r1_tails = set(self.kg.r2h2t.get(inverse_r1, {}).keys())
+        r1_t2h = self._get_inverse_index(r1)
+        r1_tails = set(r1_t2h.keys())
         r2_heads = set(r2_h2t.keys())
         connection_nodes = r1_tails.intersection(r2_heads)
         
@@ -1099,7 +1455,7 @@ class RuleSupportCalculator:
         
         result = set()
         for node in connection_nodes:
-            r1_heads = self.kg.r2h2t.get(inverse_r1, {}).get(node, set())
+            r1_heads = r1_t2h.get(node, set())
             r2_tails = r2_h2t.get(node, set())
             
             for h in r1_heads:
@@ -1167,107 +1523,162 @@ class RuleSupportCalculator:
         
         return result
     
-    def get_unary_instances_bruteforce(self, rule_info: Dict) -> Set[str]:
+    def get_unary_instances_bruteforce(self, rule_info: Dict, distinct: bool = True) -> Set[str]:
         """
-        使用暴力算法获取一元规则的实例集合
+        参考验证器：获取一元规则身体的实例集合
+        
+        不经过连接路径代码（join_relations / compute_supp），而是对身体原子做回溯搜索，
+        每个原子通过 r2h2t 索引查找候选值，用来在完整数据集上核对连接算法的结果
         
         Args:
-            rule_info: 规则信息字典
+            rule_info: 规则信息字典（完整格式使用 body_atoms，简写格式由 body_relations 构造原子）
+            distinct: 身体有两个及以上原子时要求所有变量和常量取两两不同的实体，
+                      与 compute_supp 的路径语义一致
         
         Returns:
             变量的所有可能值的集合
         """
-        body_atoms = rule_info['body_atoms']
-        variable = rule_info['free_variables'][0]
-        
-        # 从所有实体开始
-        candidates = set(self.kg.entities)
-        
-        # 对每个body原子进行过滤
-        for atom in body_atoms:
-            relation = atom['relation']
-            args = atom['args']
-            
-            valid_values = set()
-            
-            # 获取该关系的所有实例
-            relation_instances = self.kg.get_relation_pairs(relation)
-            
-            for head, tail in relation_instances:
-                # 检查是否满足当前原子的约束
-                if self._matches_atom_pattern(head, tail, args, variable):
-                    # 提取变量的值
-                    if args[0] == variable:
-                        valid_values.add(head)
-                    elif args[1] == variable:
-                        valid_values.add(tail)
-            
-            candidates = candidates.intersection(valid_values)
-        
-        return candidates
+        atoms, output_vars = self._verification_atoms(rule_info)
+        return {values[0] for values in self._backtrack_body(atoms, output_vars[:1], distinct)}
     
-    def get_binary_instances_bruteforce(self, rule_info: Dict) -> Set[Tuple[str, str]]:
+    def get_binary_instances_bruteforce(self, rule_info: Dict, distinct: bool = True) -> Set[Tuple[str, str]]:
         """
-        使用暴力算法获取二元规则的实例集合
+        参考验证器：获取二元规则身体的实例集合（做法同 get_unary_instances_bruteforce）
         
         Args:
             rule_info: 规则信息字典
+            distinct: 身体有两个及以上原子时要求所有变量取两两不同的实体（因此 X != Y）
         
         Returns:
             (X, Y) 对的集合
         """
-        body_atoms = rule_info['body_atoms']
-        free_vars = rule_info['free_variables']
-        
-        if len(free_vars) != 2:
+        atoms, output_vars = self._verification_atoms(rule_info)
+        if len(output_vars) != 2:
             return set()
-        
-        var_x, var_y = free_vars
-        valid_pairs = set()
-        
-        # 暴力枚举所有可能的 (X, Y) 组合
-        for x in self.kg.entities:
-            for y in self.kg.entities:
-                if x == y:
-                    continue
-                
-                # 检查这个 (x, y) 是否满足所有body原子
-                satisfies_all = True
-                
-                for atom in body_atoms:
-                    if not self._satisfies_atom(atom, {var_x: x, var_y: y}):
-                        satisfies_all = False
-                        break
-                
-                if satisfies_all:
-                    valid_pairs.add((x, y))
-        
-        return valid_pairs
+        return self._backtrack_body(atoms, output_vars, distinct)
     
-    def _matches_atom_pattern(self, head: str, tail: str, args: List[str], variable: str) -> bool:
-        """检查三元组是否匹配原子模式"""
-        for i, arg in enumerate(args):
-            if arg != variable and not arg.startswith('/m/'):  # 不是变量也不是常量
-                continue
-            
-            if i == 0 and arg != variable and arg != head:
-                return False
-            elif i == 1 and arg != variable and arg != tail:
-                return False
+    @staticmethod
+    def _verification_atoms(rule_info: Dict) -> Tuple[List[Tuple[str, str, str]], List[str]]:
+        """
+        验证用的身体原子 (relation, arg1, arg2) 和输出变量
         
-        return True
+        没有 body_atoms 时按简写格式把 body_relations 展开为链：
+        二元规则 r1(X,A), r2(A,B), ..., rn(.,Y)；
+        一元规则以 body_constant 结尾，没有常量时以一个新变量结尾
+        """
+        body_atoms = rule_info.get('body_atoms')
+        if body_atoms:
+            atoms = [(atom['relation'], atom['args'][0], atom['args'][1]) for atom in body_atoms]
+            return atoms, list(rule_info['free_variables'])
+        
+        body_relations = rule_info.get('body_relations', [])
+        n = len(body_relations)
+        chain = ['X'] + [chr(ord('A') + i) for i in range(n - 1)]
+        if rule_info.get('variable_count') == 1:
+            chain.append(rule_info.get('body_constant') or chr(ord('A') + n - 1))
+            output_vars = ['X']
+        else:
+            chain.append('Y')
+            output_vars = ['X', 'Y']
+        atoms = [(relation, chain[i], chain[i + 1]) for i, relation in enumerate(body_relations)]
+        return atoms, output_vars
     
-    def _satisfies_atom(self, atom: Dict, variable_assignment: Dict[str, str]) -> bool:
-        """检查变量赋值是否满足原子"""
-        relation = atom['relation']
-        args = atom['args']
+    def _backtrack_body(self, atoms: List[Tuple[str, str, str]], output_vars: List[str],
+                        distinct: bool) -> Set[Tuple[str, ...]]:
+        """
+        对身体原子回溯搜索变量绑定，返回输出变量取值的元组集合
         
-        # 替换变量
-        head_val = variable_assignment.get(args[0], args[0])
-        tail_val = variable_assignment.get(args[1], args[1])
+        每一步选已绑定参数最多的原子：两个参数都已绑定时查索引做检查，
+        一个已绑定时按 head -> tails 或 tail -> heads 索引展开，都未绑定时扫描关系；
+        输出变量都已绑定后只需要判断剩余原子是否可满足，找到一个绑定即停止
+        """
+        if not atoms or any(len(var) == 1 and all(var not in atom[1:] for atom in atoms) for var in output_vars):
+            return set()
+        distinct = distinct and len(atoms) >= 2
         
-        # 检查这个三元组是否存在
-        return (head_val, relation, tail_val) in self.kg.triples
+        forward, backward = {}, {}
+        for relation, _, _ in atoms:
+            if relation in forward:
+                continue
+            forward[relation] = self.kg.r2h2t.get(relation, {})
+            inverse_relation = self.kg.get_inverse_relation(relation)
+            if relation in self.kg.base_relations and inverse_relation in self.kg.r2h2t:
+                backward[relation] = self.kg.r2h2t[inverse_relation]
+            else:
+                index = defaultdict(set)
+                for head, tails in forward[relation].items():
+                    for tail in tails:
+                        index[tail].add(head)
+                backward[relation] = index
+        
+        constants = {arg for atom in atoms for arg in atom[1:] if len(arg) > 1}
+        results = set()
+        binding = {}
+        used = set(constants)
+        
+        def value(arg: str) -> Optional[str]:
+            return arg if len(arg) > 1 else binding.get(arg)
+        
+        def assign(var: str, entity: str) -> bool:
+            if distinct and entity in used:
+                return False
+            binding[var] = entity
+            used.add(entity)
+            return True
+        
+        def release(var: str):
+            used.discard(binding.pop(var))
+        
+        def search(remaining: List[int]) -> bool:
+            outputs_bound = all(var in binding for var in output_vars)
+            if outputs_bound and tuple(binding[var] for var in output_vars) in results:
+                return True
+            if not remaining:
+                results.add(tuple(binding[var] for var in output_vars))
+                return True
+            
+            # 已绑定参数最多的原子优先
+            k = max(remaining, key=lambda i: (value(atoms[i][1]) is not None) + (value(atoms[i][2]) is not None))
+            rest = [i for i in remaining if i != k]
+            relation, head_arg, tail_arg = atoms[k]
+            head, tail = value(head_arg), value(tail_arg)
+            
+            if head is not None and tail is not None:
+                return tail in forward[relation].get(head, ()) and search(rest)
+            
+            if head is not None:
+                candidates = ((head, t) for t in forward[relation].get(head, ()))
+            elif tail is not None:
+                candidates = ((h, tail) for h in backward[relation].get(tail, ()))
+            else:
+                candidates = ((h, t) for h, tails in forward[relation].items() for t in tails)
+            
+            found = False
+            for h, t in candidates:
+                assigned = []
+                ok = True
+                for arg, entity in ((head_arg, h), (tail_arg, t)):
+                    if len(arg) > 1:
+                        continue
+                    if arg in binding:
+                        # r(A, A) 这样同一变量出现两次
+                        ok = binding[arg] == entity
+                    elif assign(arg, entity):
+                        assigned.append(arg)
+                    else:
+                        ok = False
+                    if not ok:
+                        break
+                if ok and search(rest):
+                    found = True
+                for arg in assigned:
+                    release(arg)
+                if found and outputs_bound:
+                    return True
+            return found
+        
+        search(list(range(len(atoms))))
+        return results
     
     def calculate_rule_support_join(self, rule_info: Dict) -> Dict:
         """
@@ -1315,6 +1726,102 @@ class RuleSupportCalculator:
             'confidence': confidence
         }
     
+    def calculate_rule_support_count(self, rule_info: Dict) -> Dict:
+        """
+        只计数、不构造实例集合的规则支持度计算
+        
+        按起点（二元规则的 X，或一元规则的常量）流式枚举身体实例，
+        边枚举边在头部索引中检查，只保留单个起点的去重状态，
+        内存与最大扇出成正比，而不是与 bodySize 成正比
+        
+        路径语义与 compute_supp 相同：长度为1时允许自环，长度 >= 2 时路径上实体两两不同。
+        身体不是关系路径的完整格式规则（带 body_atoms）交给 calculate_rule_support_join
+        
+        Returns:
+            包含 headSize, bodySize, support, confidence 的字典
+        """
+        if rule_info.get('body_atoms'):
+            return self.calculate_rule_support_join(rule_info)
+        
+        enumerator = self._get_path_enumerator()
+        adjacency = enumerator.adjacency
+        head_relation = rule_info.get('head_relation')
+        body_relations = rule_info.get('body_relations', [])
+        
+        def path_tails(x: int, relation_path: List[str]):
+            steps = [adjacency.get(relation) for relation in relation_path]
+            if len(steps) == 1:
+                return steps[0].get(x, ())
+            return enumerator.tails_from(x, steps)
+        
+        def stream_path(relation_path: List[str]):
+            if len(relation_path) == 1:
+                return iter(adjacency.get(relation_path[0]).items())
+            return enumerator.iter_tails(relation_path)
+        
+        head_size = 0
+        body_size = 0
+        support = 0
+        
+        if not body_relations:
+            pass
+        elif rule_info.get('variable_count', 0) == 1:
+            # 一元规则：头部是 head_relation(X, constant) 的所有 X
+            head_constant = rule_info.get('head_constant')
+            inverse_head = self.kg.get_inverse_relation(head_relation)
+            head_set = {adjacency.entity_ids[x] for x in self.kg.r2h2t.get(inverse_head, {}).get(head_constant, ())}
+            head_size = len(head_set)
+            
+            body_constant = rule_info.get('body_constant')
+            if body_constant is not None:
+                # 从常量出发沿逆路径遍历，到达的实体就是身体实例 X
+                if body_constant in adjacency.entity_ids:
+                    inverse_path = [self.kg.get_inverse_relation(r) for r in reversed(body_relations)]
+                    for x in path_tails(adjacency.entity_ids[body_constant], inverse_path):
+                        body_size += 1
+                        support += x in head_set
+            else:
+                # 没有常量：路径上有实例的所有 X
+                for x, tails in stream_path(body_relations):
+                    if tails:
+                        body_size += 1
+                        support += x in head_set
+        else:
+            # 二元规则：逐个 X 检查 (X, Y) 是否在头部关系中
+            head_size = self.kg.get_relation_instances_count(head_relation)
+            head_adjacency = adjacency.get(head_relation)
+            for x, tails in stream_path(body_relations):
+                body_size += len(tails)
+                head_tails = head_adjacency.get(x)
+                if head_tails:
+                    head_tails = set(head_tails)
+                    support += sum(1 for y in tails if y in head_tails)
+        
+        confidence = support / body_size if body_size > 0 else 0
+        debug(f"  [DEBUG] Count-only: headSize={head_size}, bodySize={body_size}, support={support}")
+        
+        return {
+            'headSize': head_size,
+            'bodySize': body_size,
+            'support': support,
+            'confidence': confidence
+        }
+    
+    def calculate_rule_support_sparse(self, rule_info: Dict) -> Dict:
+        """
+        使用稀疏矩阵引擎计算规则支持度（需要scipy）
+        
+        关系和路径表示为实体ID上的稀疏布尔矩阵，不再构造实例元组集合；
+        引擎在第一次调用时创建，关系矩阵和路径矩阵在多条规则之间复用
+        
+        Returns:
+            包含 headSize, bodySize, support, confidence 的字典
+        """
+        if self.sparse_engine is None:
+            from sparse_engine import SparseRuleEngine
+            self.sparse_engine = SparseRuleEngine(self.kg)
+        return self.sparse_engine.calculate_rule_support(rule_info)
+    
     def _get_head_instances(self, rule_info: Dict) -> Set:
         """获取头部实例集合 - 使用统一的简写格式处理"""
         head_relation = rule_info.get('head_relation')
@@ -1355,9 +1862,12 @@ class RuleSupportCalculator:
             return self.kg.get_relation_pairs(head_relation)
     
     def _get_body_instances(self, rule_info: Dict) -> Set:
-        """获取身体实例集合 - 使用统一的简写格式处理"""
+        """获取身体实例集合 - 使用统一的简写格式处理，不是关系路径的身体（body_atoms）用哈希连接求解"""
         variable_count = rule_info.get('variable_count', 0)
         
+        if rule_info.get('body_atoms') and variable_count == 2:
+            return self._find_body_instances_by_variables(rule_info)
+        
         if variable_count == 1:
             # 一元规则
             body_relations = rule_info.get('body_relations', [])
@@ -1367,41 +1877,36 @@ class RuleSupportCalculator:
                 debug(f"  [ERROR] No body relations found!")
                 return set()
             
-            # 连接所有body关系
-            if len(body_relations) == 1:
-                connected_relation = body_relations[0]
-            else:
-                connected_relation = body_relations[0]
-                for i in range(1, len(body_relations)):
-                    connected_relation = self.join_relations(connected_relation, body_relations[i])
-            
-            debug(f"  [DEBUG] Connected relation: {connected_relation}")
             debug(f"  [DEBUG] Body constant: {body_constant}")
             
-            # 获取实例
-            if body_constant is not None:
-                # 有常量的情况：查询特定的实例
-                # 对于简写格式，body_constant通常在tail位置
-                # 所以需要使用逆关系来查询：INVERSE_connected_relation[body_constant]
-                inverse_connected_relation = self.kg.get_inverse_relation(connected_relation)
-                debug(f"  [DEBUG] Using inverse relation: {inverse_connected_relation}")
-                
-                if inverse_connected_relation in self.kg.r2h2t and body_constant in self.kg.r2h2t[inverse_connected_relation]:
-                    result = set(self.kg.r2h2t[inverse_connected_relation][body_constant])
-                    debug(f"  [DEBUG] Body instances from {inverse_connected_relation}[{body_constant}]: {len(result)}")
-                    return result
-                else:
-                    debug(f"  [DEBUG] No instances found for {inverse_connected_relation}[{body_constant}]")
-                    return set()
-            else:
-                # 没有常量的情况：获取整个关系的所有head实体
-                if connected_relation in self.kg.r2h2t:
-                    result = set(self.kg.r2h2t[connected_relation].keys())
-                    debug(f"  [DEBUG] Body instances from {connected_relation} (all heads): {len(result)}")
-                    return result
+            if len(body_relations) >= 2:
+                # 多跳路径与 compute_supp 语义相同：路径上实体两两不同（包括常量）。
+                # 逐对连接的复合关系只在每次两两连接内部保证不同，因此不使用 join_relations
+                enumerator = self._get_path_enumerator()
+                adjacency = enumerator.adjacency
+                entities = adjacency.entities
+                if body_constant is not None:
+                    if body_constant not in adjacency.entity_ids:
+                        return set()
+                    inverse_path = [self.kg.get_inverse_relation(r) for r in reversed(body_relations)]
+                    steps = [adjacency.get(relation) for relation in inverse_path]
+                    result = {entities[x] for x in enumerator.tails_from(adjacency.entity_ids[body_constant], steps)}
                 else:
-                    debug(f"  [DEBUG] No instances found for relation {connected_relation}")
-                    return set()
+                    result = {entities[x] for x, _ in enumerator.iter_tails(body_relations)}
+                debug(f"  [DEBUG] Body instances from path {' · '.join(body_relations)}: {len(result)}")
+                return result
+            
+            relation = body_relations[0]
+            if body_constant is not None:
+                # 有常量的情况：body_constant 在 tail 位置，用 tail -> heads 索引查询
+                inverse_index = self._get_inverse_index(relation)
+                result = set(inverse_index.get(body_constant, ()))
+                debug(f"  [DEBUG] Body instances from {self.kg.get_inverse_relation(relation)}[{body_constant}]: {len(result)}")
+                return result
+            # 没有常量的情况：获取整个关系的所有head实体
+            result = set(self.kg.r2h2t[relation].keys()) if relation in self.kg.r2h2t else set()
+            debug(f"  [DEBUG] Body instances from {relation} (all heads): {len(result)}")
+            return result
         else:
             # 二元规则
             body_relations = rule_info.get('body_relations', [])
@@ -1645,7 +2150,8 @@ class RuleSupportCalculator:
     
     def _find_binary_body_instances_simple(self, body_relations: List[str]) -> Set[Tuple[str, str]]:
         """
-        处理二元规则的身体实例（简化版本）
+        简化的二元规则身体实例计算（用于简写格式）
+        假设是链式连接模式 r1(X,V1), r2(V1,V2), ..., rn(Vn-1,Y)，交给哈希连接求解
         """
         if not body_relations:
             return set()
@@ -1653,22 +2159,10 @@ class RuleSupportCalculator:
         if len(body_relations) == 1:
             return self.kg.get_relation_pairs(body_relations[0])
         
-        # 多个关系的连接
-        current_pairs = self.kg.get_relation_pairs(body_relations[0])
-        
-        for relation in body_relations[1:]:
-            next_pairs = self.kg.get_relation_pairs(relation)
-            new_pairs = set()
-            
-            # 简化的连接：找到能连接的对
-            for (h1, t1) in current_pairs:
-                for (h2, t2) in next_pairs:
-                    if t1 == h2:  # 可以连接
-                        new_pairs.add((h1, t2))
-            
-            current_pairs = new_pairs
-        
-        return current_pairs
+        # 链上的中间变量依次命名为 A, B, C, ...（单字母即变量）
+        chain = ['X'] + [chr(ord('A') + i) for i in range(len(body_relations) - 1)] + ['Y']
+        atoms = [(relation, [chain[i], chain[i + 1]]) for i, relation in enumerate(body_relations)]
+        return self._hash_join_atoms(atoms, ['X', 'Y'])
     
     def _find_body_instances_by_variables(self, rule_info: Dict) -> Set[Tuple[str, str]]:
         """
@@ -1681,22 +2175,21 @@ class RuleSupportCalculator:
         二元规则示例：
         head(X,Y) <= body1(X,A), body2(Y,A)
         head(X,Y) <= body1(X,A), body2(A,B), body3(Y,B)
+        
+        与 compute_supp 的路径语义一致，身体有两个及以上原子时不同变量取两两不同的实体
         """
-        body_atoms = rule_info['body_atoms']
-        free_vars = rule_info['free_variables']
+        body_atoms = rule_info.get('body_atoms', [])
+        free_vars = rule_info.get('free_variables', [])
         
         if not body_atoms:
             return set()
         
-        # 为每个身体原子获取实例
+        # 身体原子只记录关系和变量，实例在连接时通过索引查找
         atom_instances = {}
         for i, atom in enumerate(body_atoms):
-            relation = RuleParser._extract_relation_from_atom(atom)
-            variables = RuleParser._extract_variables(atom)
             atom_instances[i] = {
-                'relation': relation,
-                'variables': variables,
-                'instances': self.kg.get_relation_pairs(relation)
+                'relation': atom['relation'],
+                'variables': atom['args'],
             }
         
         debug(f"  身体原子数量: {len(atom_instances)}")
@@ -1748,147 +2241,159 @@ class RuleSupportCalculator:
         
         返回：满足条件的自由变量值的集合
         """
-        # 这里需要根据具体的原子模式来实现
-        # 对于一元规则，我们需要找到所有可能的自由变量值
-        result_values = set()
-        
-        if not atom_instances:
-            return result_values
-        
-        # 从第一个原子开始，收集自由变量的可能值
-        first_atom = atom_instances[0]
-        first_instances = first_atom['instances']
-        first_vars = first_atom['variables']
-        
-        # 找到自由变量在第一个原子中的位置
-        free_var_position = None
-        for i, var in enumerate(first_vars):
-            if var == free_var:
-                free_var_position = i
-                break
-        
-        if free_var_position is not None:
-            # 收集自由变量的所有可能值
-            for head, tail in first_instances:
-                if free_var_position == 0:
-                    result_values.add(head)
-                elif free_var_position == 1:
-                    result_values.add(tail)
-        
-        # 如果有多个原子，需要进行交集操作
-        for i in range(1, len(atom_instances)):
-            atom = atom_instances[i]
-            atom_instances_set = atom['instances']
-            atom_vars = atom['variables']
-            
-            # 找到自由变量在当前原子中的位置
-            free_var_position = None
-            for j, var in enumerate(atom_vars):
-                if var == free_var:
-                    free_var_position = j
-                    break
-            
-            if free_var_position is not None:
-                # 收集当前原子中自由变量的可能值
-                current_values = set()
-                for head, tail in atom_instances_set:
-                    if free_var_position == 0:
-                        current_values.add(head)
-                    elif free_var_position == 1:
-                        current_values.add(tail)
-                
-                # 与之前的结果求交集
-                result_values = result_values.intersection(current_values)
-        
-        return result_values
+        atoms = [(atom['relation'], atom['variables']) for atom in atom_instances.values()]
+        return {values[0] for values in self._hash_join_atoms(atoms, [free_var], distinct=True)}
     
-    def _solve_binary_rule(self, atom_instances: Dict, free_vars: Set[str]) -> Set[Tuple[str, str]]:
+    def _solve_binary_rule(self, atom_instances: Dict, free_vars: List[str]) -> Set[Tuple[str, str]]:
         """
         求解二元规则
         
         例如：head(X,Y) <= body1(X,A), body2(Y,A)
-        需要找到所有满足连接条件的(X,Y)对
+        需要找到所有满足连接条件的(X,Y)对，任意变量模式都交给哈希连接求解
         """
-        if len(atom_instances) == 1:
-            # 只有一个身体原子
-            atom = atom_instances[0]
-            return atom['instances']
-        
-        # 多个身体原子：需要通过约束变量连接
-        result = set()
-        
-        # 简化实现：假设是两个原子的连接
-        if len(atom_instances) == 2:
-            atom1 = atom_instances[0]
-            atom2 = atom_instances[1]
-            
-            instances1 = atom1['instances']
-            instances2 = atom2['instances']
-            vars1 = atom1['variables']
-            vars2 = atom2['variables']
-            
-            # 找到连接变量（共同的约束变量）
-            common_vars = set(vars1) & set(vars2) - free_vars
-            
-            if common_vars:
-                # 有连接变量：通过连接变量匹配
-                for h1, t1 in instances1:
-                    for h2, t2 in instances2:
-                        # 简化的连接逻辑
-                        if self._can_join(vars1, vars2, h1, t1, h2, t2, common_vars):
-                            # 构造结果对（需要根据自由变量的位置确定）
-                            x_val, y_val = self._extract_free_variable_values(
-                                vars1, vars2, h1, t1, h2, t2, free_vars
-                            )
-                            if x_val and y_val:
-                                result.add((x_val, y_val))
-        
-        return result
+        atoms = [(atom['relation'], atom['variables']) for atom in atom_instances.values()]
+        return self._hash_join_atoms(atoms, list(free_vars), distinct=True)
     
-    def _can_join(self, vars1: List[str], vars2: List[str], h1: str, t1: str, 
-                  h2: str, t2: str, common_vars: Set[str]) -> bool:
-        """检查两个原子实例是否可以通过约束变量连接"""
-        # 简化实现：检查尾部是否匹配
-        return t1 == h2 or t1 == t2 or h1 == h2 or h1 == t2
-    
-    def _extract_free_variable_values(self, vars1: List[str], vars2: List[str], 
-                                    h1: str, t1: str, h2: str, t2: str, 
-                                    free_vars: Set[str]) -> Tuple[str, str]:
-        """从连接的原子实例中提取自由变量的值"""
-        # 简化实现：假设X在第一个原子的第一位，Y在第二个原子的第一位或第二位
-        x_val = h1 if len(vars1) > 0 and vars1[0] in free_vars else None
-        y_val = h2 if len(vars2) > 0 and vars2[0] in free_vars else (
-            t2 if len(vars2) > 1 and vars2[1] in free_vars else None
-        )
-        return x_val, y_val
+    @staticmethod
+    def _is_variable(arg: str) -> bool:
+        """单字母参数是变量（X, Y, A, B, ...），其余是常量实体"""
+        return len(arg) == 1
     
-    def _find_binary_body_instances_simple(self, body_relations: List[str]) -> Set[Tuple[str, str]]:
+    def _plan_join(self, atoms: List[Tuple[str, List[str]]], indexes: Dict) -> List[int]:
         """
-        简化的二元规则身体实例计算（用于简写格式）
-        假设是链式连接模式
-        """
-        if not body_relations:
-            return set()
+        连接计划：贪心地按选择性排列原子
         
-        if len(body_relations) == 1:
-            return self.kg.get_relation_pairs(body_relations[0])
+        每一步在与已绑定变量相连的原子中选估计扩展行数最小的一个：
+        两个参数都已绑定（或是常量）时只做过滤，代价为0；
+        一个参数已绑定时按该侧索引的平均扇出估计（常量直接用其精确扇出）；
+        都未绑定时为关系的实例数。没有相连的原子时（笛卡尔积）选实例数最小的原子
+        """
+        bound = set()
+        remaining = list(range(len(atoms)))
+        order = []
+        
+        def cost(i: int) -> Tuple[bool, float]:
+            relation, args = atoms[i]
+            known = [not self._is_variable(arg) or arg in bound for arg in args]
+            if all(known):
+                return True, 0
+            size = indexes[relation, 2]
+            for position in (0, 1):
+                if known[position]:
+                    index = indexes[relation, position]
+                    if not self._is_variable(args[position]):
+                        return True, len(index.get(args[position], ()))
+                    return True, size / max(1, len(index))
+            return False, size
+        
+        while remaining:
+            costs = {i: cost(i) for i in remaining}
+            connected = [i for i in remaining if costs[i][0]]
+            candidates = connected if connected else remaining
+            best = min(candidates, key=lambda i: costs[i][1])
+            order.append(best)
+            remaining.remove(best)
+            bound.update(arg for arg in atoms[best][1] if self._is_variable(arg))
+        return order
+    
+    def _hash_join_atoms(self, atoms: List[Tuple[str, List[str]]], output_vars: List[str],
+                         distinct: bool = False) -> Set[Tuple[str, ...]]:
+        """
+        用哈希索引连接任意变量模式的身体原子，返回输出变量取值的元组集合
         
-        # 对于多个关系，进行链式连接
-        current_pairs = self.kg.get_relation_pairs(body_relations[0])
+        每个原子通过 head -> tails（r2h2t）或 tail -> heads（_get_inverse_index）索引扩展绑定，
+        已绑定的变量只做成员检查，不再对两个关系的实例做嵌套循环；
+        之后不再用到的变量立即投影掉并去重，链式路径的中间结果因此保持为 (X, 当前端点) 对
         
-        for relation in body_relations[1:]:
-            next_pairs = self.kg.get_relation_pairs(relation)
-            new_pairs = set()
-            
-            # 简化的连接：找到能连接的对
-            for (h1, t1) in current_pairs:
-                for (h2, t2) in next_pairs:
-                    if t1 == h2:  # 可以连接
-                        new_pairs.add((h1, t2))
+        distinct 为 True 且有两个及以上原子时，不同变量和身体常量取两两不同的实体
+        （与 get_binary_instances_bruteforce 相同）；检查需要全部已绑定的值，因此不做投影
+        """
+        if not atoms:
+            return set()
+        distinct = distinct and len(atoms) >= 2
+        constants = {arg for _, args in atoms for arg in args if not self._is_variable(arg)}
+        
+        def fresh(row: Tuple[str, ...], entity: str) -> bool:
+            return not distinct or (entity not in constants and entity not in row)
+        
+        indexes = {}
+        for relation, _ in atoms:
+            if (relation, 2) not in indexes:
+                indexes[relation, 0] = self.kg.r2h2t.get(relation, {})
+                indexes[relation, 1] = self._get_inverse_index(relation)
+                indexes[relation, 2] = self.kg.get_relation_instances_count(relation)
+        
+        def value(row: Tuple[str, ...], arg: str) -> str:
+            return row[slots[arg]] if arg in slots else arg
+        
+        # 绑定行是元组，slots 记录变量在元组中的位置
+        slots = {}
+        rows = [()]
+        order = self._plan_join(atoms, indexes)
+        for step, i in enumerate(order):
+            relation, args = atoms[i]
+            if len(args) != 2:
+                return set()
+            head_arg, tail_arg = args
+            h2t, t2h = indexes[relation, 0], indexes[relation, 1]
+            head_known = not self._is_variable(head_arg) or head_arg in slots
+            tail_known = not self._is_variable(tail_arg) or tail_arg in slots
+            
+            new_rows = []
+            if head_known and tail_known:
+                for row in rows:
+                    if value(row, tail_arg) in h2t.get(value(row, head_arg), ()):
+                        new_rows.append(row)
+            elif head_known:
+                for row in rows:
+                    for tail in h2t.get(value(row, head_arg), ()):
+                        if fresh(row, tail):
+                            new_rows.append(row + (tail,))
+                slots[tail_arg] = len(slots)
+            elif tail_known:
+                for row in rows:
+                    for head in t2h.get(value(row, tail_arg), ()):
+                        if fresh(row, head):
+                            new_rows.append(row + (head,))
+                slots[head_arg] = len(slots)
+            elif head_arg == tail_arg:
+                # r(A, A)：只保留自环
+                loops = [head for head, tails in h2t.items() if head in tails]
+                for row in rows:
+                    for head in loops:
+                        if fresh(row, head):
+                            new_rows.append(row + (head,))
+                slots[head_arg] = len(slots)
+            else:
+                pairs = [(head, tail) for head, tails in h2t.items() for tail in tails
+                         if not distinct or head != tail]
+                for row in rows:
+                    for pair in pairs:
+                        if fresh(row, pair[0]) and fresh(row, pair[1]):
+                            new_rows.append(row + pair)
+                slots[head_arg] = len(slots)
+                slots[tail_arg] = len(slots)
+            
+            rows = new_rows
+            if not rows:
+                return set()
             
-            current_pairs = new_pairs
-        
-        return current_pairs
+            if distinct:
+                continue
+            # 投影掉后续原子和输出都不再需要的变量
+            needed = set(output_vars)
+            for j in order[step + 1:]:
+                needed.update(atoms[j][1])
+            if any(var not in needed for var in slots):
+                kept = [var for var in slots if var in needed]
+                positions = [slots[var] for var in kept]
+                rows = list({tuple(row[p] for p in positions) for row in rows})
+                slots = {var: k for k, var in enumerate(kept)}
+        
+        if any(var not in slots for var in output_vars):
+            return set()
+        positions = [slots[var] for var in output_vars]
+        return {tuple(row[p] for p in positions) for row in rows}
     
     def get_path_instances(self, relation_path: List[str]) -> Set[Tuple[str, str]]:
         """获取路径的实际实例集合（用于计算交集）"""
@@ -1915,6 +2420,173 @@ class RuleSupportCalculator:
             return self.kg.get_relation_pairs(current_relation)
 
 
+class _PathTrieNode:
+    """身体关系路径前缀树的节点，rules 是以该节点为完整身体路径的规则下标"""
+    __slots__ = ('relation', 'children', 'rules')
+    
+    def __init__(self, relation: str):
+        self.relation = relation
+        self.children = {}
+        self.rules = []
+
+
+class BatchRuleScorer:
+    """
+    批量规则评分器
+    
+    解析全部规则后，把身体关系路径放进前缀树；对每个起点 X 沿前缀树遍历一次，
+    共享前缀的规则只计算一次公共部分。路径语义与 compute_supp 相同
+    （长度为1时允许自环，长度 >= 2 时路径上实体两两不同），
+    结果与 RuleSupportCalculator.calculate_rule_support_count 一致
+    
+    只通过整数邻接表访问图，因此也可以用其他实现了 get/count/entity_ids 的邻接表
+    （例如 verify_rules.py 中基于内存映射数组的 CSRAdjacency），此时 kg 可以为 None
+    
+    用法：
+        scorer = BatchRuleScorer(kg)
+        rows = scorer.score(rule_strs)
+    """
+    
+    METRIC_KEYS = ('headSize', 'bodySize', 'support', 'confidence')
+    
+    def __init__(self, kg: Optional[KnowledgeGraph], adjacency: Optional[IntegerAdjacency] = None):
+        self.kg = kg
+        self.adjacency = adjacency if adjacency is not None else IntegerAdjacency(kg)
+    
+    def _parse(self, rule_strs: List[str]) -> List[Dict]:
+        rows = []
+        for rule_str in rule_strs:
+            row = {'rule': rule_str}
+            try:
+                head_relation, body_relations, variable_count, rule_info = RuleParser.parse_rule(rule_str)
+                if rule_info.get('body_atoms'):
+                    raise ValueError("身体不是关系路径，使用 RuleSupportCalculator.calculate_rule_support_join")
+                row.update({
+                    'head_relation': head_relation,
+                    'body_relations': body_relations,
+                    'variable_count': variable_count,
+                    'rule_info': rule_info,
+                    'headSize': 0, 'bodySize': 0, 'support': 0, 'confidence': 0.0,
+                })
+            except Exception as e:
+                debug(f"规则解析失败: {rule_str}: {e}")
+                row['error'] = str(e)
+            rows.append(row)
+        return rows
+    
+    def _prepare(self, row: Dict):
+        """预先计算头部信息：一元规则的头部实体集合和身体常量ID"""
+        rule_info = row['rule_info']
+        entity_ids = self.adjacency.entity_ids
+        if row['variable_count'] == 1:
+            inverse_head = KnowledgeGraph.get_inverse_relation(row['head_relation'])
+            head_constant = entity_ids.get(rule_info.get('head_constant'))
+            row['_head_set'] = set(self.adjacency.get(inverse_head).get(head_constant, ()))
+            row['headSize'] = len(row['_head_set'])
+            body_constant = rule_info.get('body_constant')
+            # 常量不在图中时用 -1，不会匹配任何实体
+            row['_body_constant'] = None if body_constant is None else entity_ids.get(body_constant, -1)
+        else:
+            row['_head_adjacency'] = self.adjacency.get(row['head_relation'])
+            row['headSize'] = self.adjacency.count(row['head_relation'])
+    
+    def _build_trie(self, rows: List[Dict]) -> Dict[str, _PathTrieNode]:
+        roots = {}
+        for index, row in enumerate(rows):
+            if 'error' in row or not row['body_relations']:
+                continue
+            relations = row['body_relations']
+            node = roots.setdefault(relations[0], _PathTrieNode(relations[0]))
+            for relation in relations[1:]:
+                node = node.children.setdefault(relation, _PathTrieNode(relation))
+            node.rules.append(index)
+        return roots
+    
+    def _walk(self, node: _PathTrieNode, current: int, visited: Tuple[int, ...], tails_by_node: Dict):
+        """从 current 沿 node 的关系走一步，记录完整路径的终点并继续展开子节点"""
+        for nxt in self.adjacency.get(node.relation).get(current, ()):
+            if node.rules and (len(visited) == 1 or nxt not in visited):
+                tails_by_node[node].add(nxt)
+            if node.children and nxt not in visited:
+                next_visited = visited + (nxt,)
+                for child in node.children.values():
+                    self._walk(child, nxt, next_visited, tails_by_node)
+    
+    @staticmethod
+    def _update(row: Dict, x: int, tails: Set[int]):
+        if row['variable_count'] == 1:
+            body_constant = row['_body_constant']
+            if body_constant is None or body_constant in tails:
+                row['bodySize'] += 1
+                row['support'] += x in row['_head_set']
+        else:
+            row['bodySize'] += len(tails)
+            head_tails = row['_head_adjacency'].get(x)
+            if head_tails:
+                row['support'] += len(tails.intersection(head_tails))
+    
+    def score(self, rule_strs: List[str]) -> List[Dict]:
+        """
+        计算一批规则的指标
+        
+        Returns:
+            与输入顺序一致的指标表，每行包含 rule, head_relation, body_relations, variable_count,
+            headSize, bodySize, support, confidence；解析失败的行只有 rule 和 error
+        """
+        rows = self._parse(rule_strs)
+        for row in rows:
+            if 'error' not in row:
+                self._prepare(row)
+        roots = self._build_trie(rows)
+        debug(f"批量评分: {len(rows)} 条规则, {len(roots)} 个起始关系")
+        
+        for root in roots.values():
+            for x in self.adjacency.get(root.relation):
+                tails_by_node = defaultdict(set)
+                self._walk(root, x, (x,), tails_by_node)
+                for node, tails in tails_by_node.items():
+                    for index in node.rules:
+                        self._update(rows[index], x, tails)
+        
+        for row in rows:
+            for key in ('rule_info', '_head_set', '_head_adjacency', '_body_constant'):
+                row.pop(key, None)
+            if 'error' not in row:
+                row['confidence'] = row['support'] / row['bodySize'] if row['bodySize'] > 0 else 0.0
+        return rows
+    
+    def score_dict(self, rule_strs: List[str]) -> Dict[str, Dict]:
+        """rule -> {headSize, bodySize, support, confidence}，解析失败的规则不在结果中"""
+        return {row['rule']: {key: row[key] for key in self.METRIC_KEYS}
+                for row in self.score(rule_strs) if 'error' not in row}
+
+
+METRICS_TABLE_HEADER = "bodySize\tsupport\tconfidence\theadSize\trule\n"
+
+
+def format_metrics_row(row: Dict) -> str:
+    """指标表的一行（TSV）"""
+    return f"{row['bodySize']}\t{row['support']}\t{row['confidence']}\t{row['headSize']}\t{row['rule']}\n"
+
+
+def write_metrics_table(rows: List[Dict], filepath: str):
+    """把 BatchRuleScorer 的指标表写成 TSV：bodySize, support, confidence, headSize, rule"""
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(METRICS_TABLE_HEADER)
+        f.writelines(format_metrics_row(row) for row in rows if 'error' not in row)
+
+
+def load_rule_strings(filepath: str) -> List[str]:
+    """读取规则文件（rule.txt 格式：bodySize\tsupport\tconfidence\trule，也接受每行一条规则）"""
+    rules = []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if '<=' in line:
+                rules.append(line.split('\t')[-1])
+    return rules
+
+
 def load_dataset(filepath: str) -> KnowledgeGraph:
     """加载数据集到知识图谱"""
     kg = KnowledgeGraph()
@@ -1950,13 +2622,20 @@ def load_dataset(filepath: str) -> KnowledgeGraph:
     return kg
 
 
-def analyze_rule_from_string(rule_str: str, kg: KnowledgeGraph) -> Dict:
+def analyze_rule_from_string(rule_str: str, kg: KnowledgeGraph, sparse_engine=None, count_only: bool = False,
+                             sampler=None, cache_bytes: Optional[int] = None, cache_policy: str = 'lru') -> Dict:
     """
     从规则字符串分析规则支持度
     
     Args:
         rule_str: 规则字符串
         kg: 知识图谱
+        sparse_engine: 可选的 SparseRuleEngine，提供时用稀疏矩阵引擎代替连接算法
+        count_only: 只计数、不构造实例集合（calculate_rule_support_count）
+        sampler: 可选的 ConfidenceSampler，提供时用随机游走采样估计 confidence（快速模式，
+                 bodySize 和 support 为估计值，另外返回置信区间 ci_low, ci_high）
+        cache_bytes: 实例缓存的字节预算（见 InstanceCache），缓存挂在 kg 上，逐条调用时共用同一份预算
+        cache_policy: 缓存淘汰策略，'lru' 或 'cost'
         
     Returns:
         包含两种算法结果的字典
@@ -1972,7 +2651,7 @@ def analyze_rule_from_string(rule_str: str, kg: KnowledgeGraph) -> Dict:
         debug(f"身体关系: {body_relations}")
         
         # 创建计算器
-        calculator = RuleSupportCalculator(kg)
+        calculator = RuleSupportCalculator(kg, sparse_engine, cache_bytes, cache_policy)
         
         # 连接算法和暴力算法
         join_result = None
@@ -1980,8 +2659,18 @@ def analyze_rule_from_string(rule_str: str, kg: KnowledgeGraph) -> Dict:
         
         try:
             # 调用连接算法
-            debug("=== 连接算法 ===")
-            join_result = calculator.calculate_rule_support_join(rule_info)
+            if sampler is not None:
+                debug("=== 采样估计 ===")
+                join_result = sampler.estimate(rule_info)
+            elif sparse_engine is not None:
+                debug("=== 稀疏矩阵引擎 ===")
+                join_result = calculator.calculate_rule_support_sparse(rule_info)
+            elif count_only:
+                debug("=== 计数模式 ===")
+                join_result = calculator.calculate_rule_support_count(rule_info)
+            else:
+                debug("=== 连接算法 ===")
+                join_result = calculator.calculate_rule_support_join(rule_info)
             
             # 调用暴力算法
             # debug("=== 暴力算法 ===")
@@ -2014,8 +2703,25 @@ def analyze_rule_from_string(rule_str: str, kg: KnowledgeGraph) -> Dict:
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='规则支持度计算')
+    parser.add_argument('--dataset', type=str, default="data/FB15k-237/train.txt",
+                        help='数据集路径 (默认: data/FB15k-237/train.txt)')
+    parser.add_argument('--rules', type=str, default=None,
+                        help='规则文件（如 rule.txt），不指定时分析内置的示例规则')
+    parser.add_argument('--output', type=str, default=None,
+                        help='指标表输出路径（TSV）')
+    parser.add_argument('--mode', choices=['batch', 'join', 'count'], default='batch',
+                        help='batch: BatchRuleScorer 批量评分；join/count: 逐条规则用连接算法/计数模式 (默认: batch)')
+    parser.add_argument('--cache-mb', type=float, default=None,
+                        help='join/count 模式下实例缓存的内存预算（MB），不指定时不限制')
+    parser.add_argument('--cache-policy', choices=InstanceCache.POLICIES, default='lru',
+                        help='实例缓存的淘汰策略 (默认: lru)')
+    args = parser.parse_args()
+    
     # 数据集路径（相对于当前脚本的路径）
-    dataset_path = "data/FB15k-237/train.txt"
+    dataset_path = args.dataset
     
     # 要分析的规则示例
     test_rules = [
@@ -2076,26 +2782,46 @@ if __name__ == "__main__":
         # 加载数据集
         kg = load_dataset(dataset_path)
         
-        # 分析每个规则
-        results = []
-        for rule_str in test_rules:
-            result = analyze_rule_from_string(rule_str, kg)
-            if result:
-                results.append(result)
+        rule_strs = load_rule_strings(args.rules) if args.rules else list(test_rules)
+        debug(f"共 {len(rule_strs):,} 条规则")
+        
+        if args.mode == 'batch':
+            # 批量评分，共享身体路径前缀
+            rows = BatchRuleScorer(kg).score(rule_strs)
+        else:
+            # 逐条计算，所有规则共用知识图谱上的实例缓存及其预算
+            cache_bytes = None if args.cache_mb is None else int(args.cache_mb * 1024 * 1024)
+            rows = []
+            for rule_str in rule_strs:
+                result = analyze_rule_from_string(rule_str, kg, count_only=args.mode == 'count',
+                                                  cache_bytes=cache_bytes, cache_policy=args.cache_policy)
+                if result is None:
+                    rows.append({'rule': rule_str, 'error': '规则分析失败'})
+                    continue
+                row = {key: result[key] for key in ('rule', 'head_relation', 'body_relations', 'variable_count')}
+                row.update(result['join_result'])
+                rows.append(row)
+            if kg.instance_cache is not None:
+                debug(f"实例缓存: {kg.instance_cache.stats()}")
+        if args.output:
+            write_metrics_table(rows, args.output)
+            debug(f"指标表已保存到: {args.output}")
         
         # 输出综合结果
         debug(f"\n{'='*100}")
         debug("综合分析结果")
         debug(f"{'='*100}")
         
-        for i, result in enumerate(results, 1):
-            debug(f"\n规则 {i}: {result['rule']}")
-            
-            if result['join_result']:
-                debug(f"  连接算法: {result['join_result']}")
-            
-            if result['bruteforce_result']:
-                debug(f"  暴力算法: {result['bruteforce_result']}")
+        if args.rules is None:
+            for i, row in enumerate(rows, 1):
+                debug(f"\n规则 {i}: {row['rule']}")
+                if 'error' in row:
+                    debug(f"  解析失败: {row['error']}")
+                else:
+                    debug(f"  {args.mode}: {dict((key, row[key]) for key in BatchRuleScorer.METRIC_KEYS)}")
+        else:
+            failed = sum(1 for row in rows if 'error' in row)
+            debug(f"已评分 {len(rows) - failed:,} 条规则，解析失败 {failed:,} 条")
         
         debug(f"\n{'='*100}")
         
@@ -3,6 +3,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 from collections import defaultdict
 import os
+import sys
 
 def is_unary_rule(rule_str):
     """
@@ -22,8 +23,50 @@ def is_binary_rule(rule_str):
     # 简单判断：如果不包含常量标记，则为二元规则
     return '·' not in args and '/m/' not in args
 
+def analyze_store(store_dir):
+    """
+    分析 merge_rules.py --rule-store 生成的列式规则库
+    每个formula只判断一次类型，指标列通过内存映射按掩码取出，无需加载整个JSON
+    """
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from rule_store import RuleStore
+
+    print(f"正在打开规则库: {store_dir}")
+    with RuleStore(store_dir) as store:
+        formula_type = np.zeros(len(store.formulas), dtype=np.int8)  # 0: 其他, 1: 一元, 2: 二元
+        for i in range(len(store.formulas)):
+            body_rule = store.formulas[i]
+            if is_unary_rule(body_rule):
+                formula_type[i] = 1
+            elif is_binary_rule(body_rule):
+                formula_type[i] = 2
+        rule_type = formula_type[np.asarray(store.formula_id)]
+
+        unary_mask = rule_type == 1
+        binary_mask = rule_type == 2
+        unary_metrics = {}
+        binary_metrics = {}
+        for name in ('support', 'headSize', 'bodySize', 'confidence'):
+            column = np.asarray(store.column(name))
+            unary_metrics[name] = column[unary_mask].tolist()
+            binary_metrics[name] = column[binary_mask].tolist()
+
+    unary_count = int(unary_mask.sum())
+    binary_count = int(binary_mask.sum())
+    other_count = len(rule_type) - unary_count - binary_count
+    print(f"\n规则统计:")
+    print(f"  一元规则数量: {unary_count}")
+    print(f"  二元规则数量: {binary_count}")
+    print(f"  其他规则数量: {other_count}")
+    print(f"  总规则数量: {len(rule_type)}")
+
+    return unary_metrics, binary_metrics
+
 def analyze_file(file_path):
-    """分析JSON文件中的规则分布"""
+    """分析JSON文件中的规则分布（file_path为目录时按列式规则库读取）"""
+    if os.path.isdir(file_path):
+        return analyze_store(file_path)
+
     print(f"正在加载文件: {file_path}")
     
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 """
 Analyze and visualize split methods comparison.
-Reads eval.log and merge_rules.log from each split directory and generates a heatmap.
+Reads eval.json (or eval.log) and merge_stats.json (or merge_rules.log) from each split directory
+and generates a heatmap.
 """
 
+import json
 import os
 import re
 import pandas as pd
@@ -62,6 +64,28 @@ def extract_eval_metrics(eval_log_path: Path) -> dict:
     return metrics
 
 
+def load_eval_json(eval_json_path: Path) -> dict:
+    """
+    Read the structured results written by eval.py (eval.json).
+    Returns the same keys as extract_eval_metrics.
+    """
+    if not eval_json_path.exists():
+        return {}
+    
+    try:
+        with open(eval_json_path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading {eval_json_path}: {e}")
+        return {}
+    
+    metrics = {key: result['metrics'][key] for key in ('MRR', 'hits@1', 'hits@3') if key in result.get('metrics', {})}
+    # loaded_rules is the loader's indexed rule count, not the number of lines in the rule file
+    if result.get('loaded_rules') is not None:
+        metrics['loaded_rules'] = result['loaded_rules']
+    return metrics
+
+
 def extract_merge_metrics(merge_log_path: Path) -> dict:
     """
     Extract metrics from merge_rules.log file.
@@ -88,6 +112,28 @@ def extract_merge_metrics(merge_log_path: Path) -> dict:
     return metrics
 
 
+def load_merge_stats(merge_stats_path: Path) -> dict:
+    """
+    Read the structured statistics written by merge_rules.py (merge_stats.json).
+    Returns the same keys as extract_merge_metrics plus the rule counts per head type.
+    """
+    if not merge_stats_path.exists():
+        return {}
+    
+    try:
+        with open(merge_stats_path, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading {merge_stats_path}: {e}")
+        return {}
+    
+    return {
+        'total_rules': stats.get('total_rules', 0),
+        'unary_rules': sum(stats.get('body_length', {}).get('unary', {}).values()),
+        'binary_rules': sum(stats.get('body_length', {}).get('binary', {}).values()),
+    }
+
+
 def get_split_order():
     """Define the order of split methods from simple to complex."""
     return [
@@ -122,8 +168,8 @@ def read_split_metrics(base_dir: str, split_names: list) -> pd.DataFrame:
         merge_log = split_dir / 'merge_rules.log'
         
         # Extract metrics from both log files
-        eval_metrics = extract_eval_metrics(eval_log)
-        merge_metrics = extract_merge_metrics(merge_log)
+        eval_metrics = load_eval_json(split_dir / 'eval.json') or extract_eval_metrics(eval_log)
+        merge_metrics = load_merge_stats(split_dir / 'merge_stats.json') or extract_merge_metrics(merge_log)
         
         if not eval_metrics and not merge_metrics:
             print(f"Warning: No metrics found for {split_name}")
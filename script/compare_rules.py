@@ -13,7 +13,7 @@ from typing import Set, List, Tuple, Dict, Optional
 from collections import defaultdict
 
 # 导入analysis_rule模块
-from analysis_rule import load_dataset, analyze_rule_from_string, RuleParser
+from analysis_rule import load_dataset, RuleParser, BatchRuleScorer, IntegerAdjacency
 
 def parse_rule_line(line: str) -> Tuple[str, Dict, str]:
     """
@@ -441,7 +441,7 @@ def analyze_rule_statistics(rules_dict: Dict[str, List]) -> Dict:
         # print(stats)
     return stats
 
-def write_rule_section(writer, rules_set: Set, rules_dict: Dict, section_title: str, kg=None):
+def write_rule_section(writer, rules_set: Set, rules_dict: Dict, section_title: str, scorer=None):
     """
     写入规则示例部分（辅助函数）
     
@@ -450,7 +450,7 @@ def write_rule_section(writer, rules_set: Set, rules_dict: Dict, section_title:
         rules_set: 规则集合
         rules_dict: 规则字典
         section_title: 部分标题
-        kg: 知识图谱（可选）
+        scorer: BatchRuleScorer 或 ConfidenceSampler（可选），提供时计算真实结果
     """
     if not rules_set:
         return
@@ -487,13 +487,14 @@ def write_rule_section(writer, rules_set: Set, rules_dict: Dict, section_title:
     writer.writerow([f'{section_title} (共{len(rules_set)}条，展示前{len(selected_rules)}条: 前10条Binary(至少3个L1+3个L2), 后10条Unary)'])
     
     # 写入表头和数据
-    if kg is not None:
+    if scorer is not None:
         writer.writerow(['转换后规则', '指标', '真实结果'])
+        real_results = scorer.score_dict(selected_rules)
         for rule in selected_rules:
             simplified_rule = convert_to_simplified_format(rule)
             metrics = rules_dict[rule][0][1] if rules_dict[rule] else {}
-            real_result = analyze_rule_from_string(rule, kg) if kg else None
-            real_result_str = str(real_result['join_result']) if real_result else 'N/A'
+            real_result = real_results.get(rule)
+            real_result_str = str(real_result) if real_result else 'N/A'
             writer.writerow([simplified_rule, str(metrics), real_result_str])
     else:
         writer.writerow(['转换后规则', '指标'])
@@ -504,10 +505,22 @@ def write_rule_section(writer, rules_set: Set, rules_dict: Dict, section_title:
     writer.writerow([])
 
 def save_statistics_to_csv(stats1: Dict, stats2: Dict, file1_name: str, file2_name: str, 
-                           set1: Set, set2: Set, rules1: Dict, rules2: Dict, output_file: str, kg=None):
+                           set1: Set, set2: Set, rules1: Dict, rules2: Dict, output_file: str, kg=None,
+                           fast: bool = False):
     """
     将统计结果保存到CSV文件
+    
+    fast 为 True 时真实结果用随机游走采样估计（ConfidenceSampler），适合长路径规则
     """
+    # 所有示例规则共用一个批量评分器，身体路径和整数邻接表在各部分之间复用
+    scorer = None
+    if kg is not None:
+        if fast:
+            from confidence_sampler import ConfidenceSampler
+            scorer = ConfidenceSampler(IntegerAdjacency(kg), seed=0)
+        else:
+            scorer = BatchRuleScorer(kg)
+    
     with open(output_file, 'w', newline='', encoding='utf-8-sig') as csvfile:
         writer = csv.writer(csvfile)
         
@@ -660,14 +673,15 @@ def save_statistics_to_csv(stats1: Dict, stats2: Dict, file1_name: str, file2_na
             selected_rules = binary_rules[:half_n] + unary_rules[:half_n]
             
             writer.writerow([f'共同规则示例 (共{len(common_rules)}条，展示前{topN}条: 前{half_n}条Binary, 后{half_n}条Unary)'])
-            if kg is not None:
+            if scorer is not None:
                 writer.writerow(['转换后规则', f'{file1_name}指标', f'{file2_name}指标', '真实结果'])
+                real_results = scorer.score_dict(selected_rules)
                 for rule in selected_rules:
                     simplified_rule = convert_to_simplified_format(rule)
                     metrics1 = rules1[rule][0][1] if rules1[rule] else {}
                     metrics2 = rules2[rule][0][1] if rules2[rule] else {}
-                    real_result = analyze_rule_from_string(rule, kg) if kg else None
-                    real_result_str = str(real_result['join_result']) if real_result else 'N/A'
+                    real_result = real_results.get(rule)
+                    real_result_str = str(real_result) if real_result else 'N/A'
                     writer.writerow([simplified_rule, str(metrics1), str(metrics2), real_result_str])
             else:
                 writer.writerow(['转换后规则', f'{file1_name}指标', f'{file2_name}指标'])
@@ -680,12 +694,12 @@ def save_statistics_to_csv(stats1: Dict, stats2: Dict, file1_name: str, file2_na
         
         # ========== 仅在某个文件中的规则 ==========
         # 使用辅助函数处理两个部分
-        write_rule_section(writer, only_in_1, rules1, f'仅在{file1_name}中的规则', kg)
-        write_rule_section(writer, only_in_2, rules2, f'仅在{file2_name}中的规则', kg)
+        write_rule_section(writer, only_in_1, rules1, f'仅在{file1_name}中的规则', scorer)
+        write_rule_section(writer, only_in_2, rules2, f'仅在{file2_name}中的规则', scorer)
 
     print(f"\n统计结果已保存到: {output_file}")
 
-def main(file1="rules-100-10", file2="rule.txt", dataset="FB15k-237", target_relation=None):
+def main(file1="rules-100-10", file2="rule.txt", dataset="FB15k-237", target_relation=None, fast=False):
     """
     主函数
     
@@ -694,6 +708,7 @@ def main(file1="rules-100-10", file2="rule.txt", dataset="FB15k-237", target_rel
         file2: 第二个规则文件名（相对于out/{dataset}/的文件名），默认为"rule.txt"
         dataset: 数据集名称，默认为"FB15k-237"
         target_relation: 目标关系，如果为None则分析所有规则
+        fast: 真实结果使用采样估计的 confidence（带置信区间），而不是精确计算
     """
     # 文件路径
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -764,7 +779,7 @@ def main(file1="rules-100-10", file2="rule.txt", dataset="FB15k-237", target_rel
     # 导出到CSV
     output_suffix = "all_rule" if target_relation is None else "rule_" + target_relation.split('/')[-1]
     csv_output_path = os.path.join(base_dir, "out", dataset, f"{output_suffix}_comparison.csv")
-    save_statistics_to_csv(stats1, stats2, file1_name, file2_name, set1, set2, rules1, rules2, csv_output_path, kg)
+    save_statistics_to_csv(stats1, stats2, file1_name, file2_name, set1, set2, rules1, rules2, csv_output_path, kg, fast)
 
 if __name__ == "__main__":
     # 命令行参数解析
@@ -786,8 +801,11 @@ if __name__ == "__main__":
                         help='第二个规则文件名，相对于out/{dataset}/的文件名 (默认: rule.txt)')
     parser.add_argument('--target-relation', type=str, default=None,
                         help='目标关系，如果不指定则分析所有规则')
+    parser.add_argument('--fast', action='store_true',
+                        help='真实结果使用随机游走采样估计 confidence 及置信区间，适合长路径规则')
     
     args = parser.parse_args()
     
     # 调用主函数
-    main(file1=args.file1, file2=args.file2, dataset=args.dataset, target_relation=args.target_relation)
\ No newline at end of file
+    main(file1=args.file1, file2=args.file2, dataset=args.dataset, target_relation=args.target_relation,
+         fast=args.fast)
\ No newline at end of file
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+基于随机游走采样的规则置信度估计
+
+长路径规则的身体实例集合计算代价最高，而筛选规则时只需要在一定误差内知道 confidence。
+这里不枚举身体实例，而是在整数邻接表（IntegerAdjacency 或 verify_rules.CSRAdjacency）上随机游走采样身体路径：
+
+- 二元规则：起点 X 在第一个关系的 head 中均匀选取，之后每一步在当前实体的邻居中均匀选取，
+  路径概率 q(p) = 1/|heads| * Π 1/deg；长度 >= 2 时路径上实体两两不同，否则该次游走失败
+- 一元规则有常量：从常量出发沿逆路径游走，终点就是身体实例 X
+- 一元规则无常量：均匀选取起点 X，检查 X 是否存在一条路径
+
+同一个 (X, Y) 可能由 m(X, Y) 条路径到达，权重 w = 1 / (q(p) * m(X, Y)) 使
+E[w] = bodySize、E[w * 1{(X, Y) ∈ head}] = support（失败的游走权重为0），
+m 用从两端各走一半的中间相遇法计数，同一条规则内按端点缓存半路径、按 (X, Y) 缓存计数。confidence 用自归一化的比值估计，
+置信区间用 delta 方法；成功的游走全部命中或全部未命中时 delta 方法的方差为0，
+因此再与按有效样本量 (Σw)²/Σw² 计算的 Wilson 区间取并集作为下限。
+按批采样，区间半宽不超过 tolerance 时提前停止。
+
+用法：
+    sampler = ConfidenceSampler(IntegerAdjacency(kg), seed=0)
+    result = sampler.estimate(rule_info, tolerance=0.02)
+"""
+
+import math
+import random
+from collections import defaultdict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from analysis_rule import IntegerAdjacency, KnowledgeGraph, RuleParser
+
+
+class ConfidenceSampler:
+    """随机游走 + 重要性加权的 confidence 估计器"""
+
+    def __init__(self, adjacency: IntegerAdjacency, seed: Optional[int] = None):
+        self.adjacency = adjacency
+        self.random = random.Random(seed)
+        self._starts = {}
+        self._head_sets = {}
+
+    def _start_nodes(self, relation: str) -> List[int]:
+        if relation not in self._starts:
+            self._starts[relation] = list(self.adjacency.get(relation))
+        return self._starts[relation]
+
+    def _head_tails(self, relation: str, x: int) -> frozenset:
+        """头部关系中 x 的 tail 集合（按需缓存）"""
+        heads = self._head_sets.setdefault(relation, {})
+        if x not in heads:
+            heads[x] = frozenset(self.adjacency.get(relation).get(x, ()))
+        return heads[x]
+
+    def _walk(self, start: int, steps: List[Dict], distinct: bool) -> Tuple[Optional[int], float]:
+        """
+        从 start 沿 steps 随机走一条路径
+
+        Returns:
+            (终点, 路径概率中各步 1/deg 的乘积的倒数)，走不通或违反两两不同时终点为 None
+        """
+        node = start
+        visited = {start}
+        inverse_probability = 1.0
+        for step in steps:
+            neighbors = step.get(node)
+            if not neighbors:
+                return None, 0.0
+            inverse_probability *= len(neighbors)
+            node = neighbors[self.random.randrange(len(neighbors))]
+            if distinct:
+                if node in visited:
+                    return None, 0.0
+                visited.add(node)
+        return node, inverse_probability
+
+    @staticmethod
+    def _partial_paths(start: int, steps: List[Dict]) -> Dict[int, List[Tuple[int, ...]]]:
+        """从 start 出发走完 steps 的所有实体两两不同的路径，按终点分组"""
+        paths = defaultdict(list)
+        frontier = [(start, (start,))]
+        for step in steps:
+            next_frontier = []
+            for node, visited in frontier:
+                for nxt in step.get(node, ()):
+                    if nxt not in visited:
+                        next_frontier.append((nxt, visited + (nxt,)))
+            frontier = next_frontier
+        for node, visited in frontier:
+            paths[node].append(visited)
+        return paths
+
+    def _multiplicity_counter(self, steps: List[Dict], inverse_steps: List[Dict],
+                              max_endpoints: int = 4096) -> Callable[[int, int], int]:
+        """
+        返回 m(x, y)：x 到 y 的实体两两不同的路径数，前一半从 x 正向走，后一半从 y 沿逆关系走，在中间实体相遇
+
+        采样反复落在相同的端点（尤其是枢纽实体）上，因此每条规则一个计数器：
+        半路径按端点缓存（最多 max_endpoints 个端点，LRU），计数按 (x, y) 缓存
+        """
+        if len(steps) == 1:
+            return lambda x, y: 1
+        k = len(steps) // 2
+        left_steps, right_steps = steps[:k], inverse_steps[:len(steps) - k]
+        left_paths_from = lru_cache(maxsize=max_endpoints)(lambda x: self._partial_paths(x, left_steps))
+        right_paths_from = lru_cache(maxsize=max_endpoints)(lambda y: self._partial_paths(y, right_steps))
+        counts = {}
+
+        def multiplicity(x: int, y: int) -> int:
+            count = counts.get((x, y))
+            if count is not None:
+                return count
+            right = right_paths_from(y)
+            count = 0
+            for middle, left_paths in left_paths_from(x).items():
+                right_paths = right.get(middle)
+                if not right_paths:
+                    continue
+                for left_path in left_paths:
+                    left_nodes = set(left_path)
+                    for right_path in right_paths:
+                        # 只在中间实体处重合
+                        if len(left_nodes.intersection(right_path)) == 1:
+                            count += 1
+            counts[x, y] = count
+            return count
+        return multiplicity
+
+    def _has_path(self, x: int, steps: List[Dict], distinct: bool) -> bool:
+        """x 是否存在一条路径（找到即停）"""
+        stack = [(x, 0, (x,))]
+        while stack:
+            node, depth, visited = stack.pop()
+            for nxt in steps[depth].get(node, ()):
+                if distinct and nxt in visited:
+                    continue
+                if depth == len(steps) - 1:
+                    return True
+                stack.append((nxt, depth + 1, visited + (nxt,)))
+        return False
+
+    def _sampler(self, rule_info: Dict):
+        """
+        根据规则类型返回 (采样函数, headSize)；采样函数返回 (w, w * 1{实例在头部中})
+        """
+        head_relation = rule_info.get('head_relation')
+        body_relations = rule_info.get('body_relations', [])
+        distinct = len(body_relations) >= 2
+        adjacency = self.adjacency
+        steps = [adjacency.get(r) for r in body_relations]
+        inverse_relations = [KnowledgeGraph.get_inverse_relation(r) for r in reversed(body_relations)]
+        inverse_steps = [adjacency.get(r) for r in inverse_relations]
+
+        if rule_info.get('variable_count', 0) == 1:
+            inverse_head = KnowledgeGraph.get_inverse_relation(head_relation)
+            head_constant = adjacency.entity_ids.get(rule_info.get('head_constant'))
+            head_set = frozenset(adjacency.get(inverse_head).get(head_constant, ()))
+            body_constant = rule_info.get('body_constant')
+
+            if body_constant is None:
+                starts = self._start_nodes(body_relations[0])
+
+                def sample():
+                    if not starts:
+                        return 0.0, 0.0
+                    x = starts[self.random.randrange(len(starts))]
+                    if not self._has_path(x, steps, distinct):
+                        return 0.0, 0.0
+                    w = float(len(starts))
+                    return w, w if x in head_set else 0.0
+                return sample, len(head_set)
+
+            anchor = adjacency.entity_ids.get(body_constant)
+            multiplicity = self._multiplicity_counter(inverse_steps, steps)
+
+            def sample():
+                if anchor is None:
+                    return 0.0, 0.0
+                x, inverse_probability = self._walk(anchor, inverse_steps, distinct)
+                if x is None:
+                    return 0.0, 0.0
+                w = inverse_probability / multiplicity(anchor, x)
+                return w, w if x in head_set else 0.0
+            return sample, len(head_set)
+
+        starts = self._start_nodes(body_relations[0])
+        head_size = adjacency.count(head_relation)
+        multiplicity = self._multiplicity_counter(steps, inverse_steps)
+
+        def sample():
+            if not starts:
+                return 0.0, 0.0
+            x = starts[self.random.randrange(len(starts))]
+            y, inverse_probability = self._walk(x, steps, distinct)
+            if y is None:
+                return 0.0, 0.0
+            w = len(starts) * inverse_probability / multiplicity(x, y)
+            return w, w if y in self._head_tails(head_relation, x) else 0.0
+        return sample, head_size
+
+    def estimate(self, rule_info: Dict, tolerance: float = 0.02, z: float = 1.96, batch_size: int = 500,
+                 min_samples: int = 1000, max_samples: int = 200000) -> Dict:
+        """
+        估计规则的 confidence 及其置信区间
+
+        Args:
+            rule_info: RuleParser.parse_rule 返回的规则信息
+            tolerance: 置信区间半宽达到该值后停止采样
+            z: 置信区间的分位数（1.96 对应 95%）
+            batch_size: 每批采样次数，每批结束后检查是否停止
+            min_samples / max_samples: 采样次数的下限和上限
+
+        Returns:
+            包含 headSize（精确值）, bodySize, support（估计值）, confidence, ci_low, ci_high, samples 的字典
+        """
+        if not rule_info.get('body_relations'):
+            return {'headSize': 0, 'bodySize': 0, 'support': 0, 'confidence': 0.0,
+                    'ci_low': 0.0, 'ci_high': 0.0, 'samples': 0}
+
+        sample, head_size = self._sampler(rule_info)
+        n = 0
+        sum_w = sum_y = 0.0
+        sum_ww = sum_yy = sum_wy = 0.0
+        confidence = 0.0
+        ci_low = ci_high = 0.0
+
+        while n < max_samples:
+            for _ in range(min(batch_size, max_samples - n)):
+                w, y = sample()
+                sum_w += w
+                sum_y += y
+                sum_ww += w * w
+                sum_yy += y * y
+                sum_wy += w * y
+            n = min(n + batch_size, max_samples)
+
+            if sum_w == 0:
+                # 采满 min_samples 仍没有一条成功的游走，按身体为空处理
+                if n >= min_samples:
+                    break
+                continue
+            # 自归一化比值估计与 delta 方法：Var(conf) ≈ Var(y - conf * w) / (n * mean(w)^2)
+            confidence = sum_y / sum_w
+            mean_w = sum_w / n
+            residual = (sum_yy - 2 * confidence * sum_wy + confidence * confidence * sum_ww) / n
+            variance = max(residual, 0.0) / (n * mean_w * mean_w)
+            half_width = z * math.sqrt(variance)
+            wilson_low, wilson_high = self._wilson_interval(confidence, sum_w * sum_w / sum_ww, z)
+            ci_low = max(0.0, min(confidence - half_width, wilson_low))
+            ci_high = min(1.0, max(confidence + half_width, wilson_high))
+            if n >= min_samples and max(confidence - ci_low, ci_high - confidence) <= tolerance:
+                break
+
+        body_size = sum_w / n if n else 0.0
+        support = sum_y / n if n else 0.0
+        return {
+            'headSize': head_size,
+            'bodySize': body_size,
+            'support': support,
+            'confidence': confidence,
+            'ci_low': ci_low,
+            'ci_high': ci_high,
+            'samples': n,
+        }
+
+    @staticmethod
+    def _wilson_interval(p: float, n: float, z: float) -> Tuple[float, float]:
+        """比例 p 在样本量 n 下的 Wilson 区间；p 为0或1时仍有非零宽度（如 0 次命中时上界约为 z²/(n+z²)）"""
+        denominator = 1 + z * z / n
+        center = (p + z * z / (2 * n)) / denominator
+        half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+        return center - half, center + half
+
+    def score_dict(self, rule_strs: List[str], **options) -> Dict[str, Dict]:
+        """rule -> 估计结果，接口与 BatchRuleScorer.score_dict 相同，解析失败的规则不在结果中"""
+        results = {}
+        for rule_str in rule_strs:
+            try:
+                rule_info = RuleParser.parse_rule(rule_str)[3]
+            except Exception:
+                continue
+            results[rule_str] = self.estimate(rule_info, **options)
+        return results
@@ -5,12 +5,19 @@ from clause import Ranking
 from clause import TripleSet
 
 import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from eval import load_rules, overall_scores, relation_scores, write_eval_json
 
 # *** 轻量级快速评估脚本 ***
 
 argparser = argparse.ArgumentParser(description="Fast lightweight evaluation")
 argparser.add_argument("--dataset", type=str, default="wnrr", help="dataset to use")
 argparser.add_argument("--rules", type=str, default="", help="rules to use")
+argparser.add_argument("--eval_json", type=str, default="", help="structured results file")
 argparser.add_argument("--sample_size", type=int, default=1000, help="sample size for testing")
 
 args = argparser.parse_args()
@@ -23,44 +30,55 @@ rules = args.rules if args.rules else f"data/rules/{dataset}.txt"
 
 print(f"使用采样评估: sample_size={args.sample_size}")
 
-options = Options()
+# *** 极速配置 - 用于快速测试 ***，同时原样写入 eval.json
+fast_options = {
+    "ranking_handler.topk": 20,  # 极小的topk
+    "ranking_handler.aggregation_function": "maxplus",
+    "ranking_handler.disc_at_least": 3,  # 很早停止
+    "ranking_handler.hard_stop_at": 20,  # 立即停止
+    "ranking_handler.num_threads": 4,  # 少量线程
+    "loader.num_threads": 2,
+
+    # 关闭所有非必要规则类型
+    "loader.load_u_d_rules": False,
+    "loader.load_u_xxc_rules": False,
+    "loader.load_u_xxd_rules": False,
+    "loader.load_zero_rules": False,
+
+    # 高过滤阈值 - 只保留高质量规则
+    "loader.b_min_support": 10,
+    "loader.c_min_support": 10,
+    "loader.b_min_conf": 0.01,
+    "loader.c_min_conf": 0.01,
+    "loader.b_max_length": 3,  # 限制规则长度
+    "loader.c_max_length": 3,
+
+    "ranking_handler.adapt_topk": False,
+    "ranking_handler.collect_rules": False,
+}
 
-# *** 极速配置 - 用于快速测试 ***
-options.set("ranking_handler.topk", 20)  # 极小的topk
-options.set("ranking_handler.aggregation_function", "maxplus")
-options.set("ranking_handler.disc_at_least", 3)  # 很早停止
-options.set("ranking_handler.hard_stop_at", 20)  # 立即停止
-options.set("ranking_handler.num_threads", 4)  # 少量线程
-options.set("loader.num_threads", 2)
-
-# 关闭所有非必要规则类型
-options.set("loader.load_u_d_rules", False)
-options.set("loader.load_u_xxc_rules", False)
-options.set("loader.load_u_xxd_rules", False)
-options.set("loader.load_zero_rules", False)
-
-# 高过滤阈值 - 只保留高质量规则
-options.set("loader.b_min_support", 10)
-options.set("loader.c_min_support", 10)
-options.set("loader.b_min_conf", 0.01)
-options.set("loader.c_min_conf", 0.01)
-options.set("loader.b_max_length", 3)  # 限制规则长度
-options.set("loader.c_max_length", 3)
-
-options.set("ranking_handler.adapt_topk", False)
-options.set("ranking_handler.collect_rules", False)
+options = Options()
+for key, value in fast_options.items():
+    options.set(key, value)
 
 print("正在加载数据和规则...")
 
 #### Calculate a ranking with sampling
+seconds = {}
+started = time.time()
 loader = Loader(options=options.get("loader"))
 loader.load_data(data=train, filter=filter_set, target=target)
-loader.load_rules(rules=rules)
+seconds["data_load"] = time.time() - started
+started = time.time()
+loaded_rules = load_rules(loader, rules)
+seconds["rule_load"] = time.time() - started
 
 print("开始快速计算排名...")
 
+started = time.time()
 ranker = RankingHandler(options=options.get("ranking_handler"))
 ranker.calculate_ranking(loader=loader)
+seconds["rank"] = time.time() - started
 
 print("获取排名结果...")
 headRanking = ranker.get_ranking(direction="head", as_string=True)
@@ -77,7 +95,7 @@ if args.sample_size > 0 and len(testset.triples) > args.sample_size:
 else:
     sampled_triples = testset.triples
 
-ranking = Ranking(k=20)
+ranking = Ranking(k=fast_options["ranking_handler.topk"])
 
 # process the handler ranking
 ranking.convert_handler_ranking(headRanking, tailRanking, testset)
@@ -89,4 +107,13 @@ print("MRR     " + '{0:.6f}'.format(ranking.hits.get_mrr()))
 print("hits@1  " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(1)))
 print("hits@3  " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(3)))
 print("hits@10 " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(10)))
-print("注意: 这是快速评估结果，用于调试和参数调优")
\ No newline at end of file
+print("注意: 这是快速评估结果，用于调试和参数调优")
+
+# 结构化结果（eval.json格式），供分析脚本直接读取
+scores = overall_scores(ranking, testset)
+scores["num_triples"] = len(sampled_triples)
+started = time.time()
+relations = relation_scores(ranking, testset, sampled_triples)
+seconds["score"] = time.time() - started
+write_eval_json(args.eval_json or f"out/{dataset}/eval_fast.json", dataset, rules, scores, relations, seconds,
+                fast_options, loaded_rules, sample_size=len(sampled_triples))
\ No newline at end of file
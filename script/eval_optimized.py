@@ -5,12 +5,19 @@ from clause import Ranking
 from clause import TripleSet
 
 import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from eval import overall_scores, relation_scores, write_eval_json
 
 # *** 优化版本的评估脚本 ***
 
 argparser = argparse.ArgumentParser(description="Optimized evaluation of a ranking")
 argparser.add_argument("--dataset", type=str, default="wnrr", help="dataset to use")
 argparser.add_argument("--rules", type=str, default="", help="rules to use")
+argparser.add_argument("--eval_json", type=str, default="", help="structured results file")
 argparser.add_argument("--ranking_file", type=str, default="", help="rules to use")
 argparser.add_argument("--topk", type=int, default=50, help="top-k candidates")
 argparser.add_argument("--threads", type=int, default=8, help="number of threads")
@@ -60,14 +67,21 @@ options.set("ranking_handler.collect_rules", False)  # 不收集规则信息
 print("正在加载数据和规则...")
 
 #### Calculate a ranking
+seconds = {}
+started = time.time()
 loader = Loader(options=options.get("loader"))
 loader.load_data(data=train, filter=filter_set, target=target)
+seconds["data_load"] = time.time() - started
+started = time.time()
 loader.load_rules(rules=rules)
+seconds["rule_load"] = time.time() - started
 
 print("开始计算排名...")
 
+started = time.time()
 ranker = RankingHandler(options=options.get("ranking_handler"))
 ranker.calculate_ranking(loader=loader)
+seconds["rank"] = time.time() - started
 
 print("获取排名结果...")
 headRanking = ranker.get_ranking(direction="head", as_string=True)
@@ -88,6 +102,15 @@ print("hits@3  " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(3)))
 print("hits@10 " + '{0:.6f}'.format(ranking.hits.get_hits_at_k(10)))
 print()
 
+# 结构化结果（eval.json格式），供分析脚本直接读取
+scores = overall_scores(ranking, testset)
+started = time.time()
+relations = relation_scores(ranking, testset)
+seconds["score"] = time.time() - started
+write_eval_json(args.eval_json or os.path.splitext(ranking_file)[0] + ".json", dataset, rules, scores, relations,
+                seconds, {"topk": args.topk, "threads": args.threads, "min_support": 5, "min_conf": 0.001},
+                ranking_file=ranking_file)
+
 # 写入排名文件
 ranker.write_ranking(path=ranking_file, loader=loader)
 print(f"排名已保存到: {ranking_file}")
\ No newline at end of file
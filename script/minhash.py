@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+MinHash/LSH 规则指标估计
+
+与 TLearn.kt 使用相同的哈希函数和参数，在 Python 中为关系路径的实例集合构建 MinHash 签名，
+并用签名估计 jaccard / support / confidence：
+- 实体ID与 TLearn 的 IdManager 一致：按训练集中首次出现的顺序（先头后尾）从1开始编号
+- 一元原子的实例是实体ID，二元原子的实例是 pairHash32(head, tail)，二元签名取负，与一元签名不会碰撞
+- computeMinHash：MH_DIM 个种子（java.util.Random(42) 生成），每个种子取 computeUnaryHash 的最小值
+- computeMinHashDOPH：一次置换哈希（OPH）分桶 + DOPH 致密化空桶（TLearn.performLSH 使用这一种）
+- jaccard = 相同位置的签名值个数 / MH_DIM（R=1 时即 TLearn 的 bucketCount / BANDS），
+  交集大小 = J * (|A| + |B|) / (1 + J)，与 estimateIntersectionSize 相同
+
+哈希计算全部用 NumPy 向量化完成（32/64位整数运算与 Kotlin 的溢出语义一致）。
+
+用法：
+    # 估计规则文件中每条规则的指标，并与文件中的 support/confidence 对比
+    python script/minhash.py --dataset data/FB15k-237/train.txt --rules out/FB15k-237/rule.txt --output est.tsv
+    # 用LSH分桶为每个关系提出候选规则
+    python script/minhash.py --dataset data/FB15k-237/train.txt --propose --output candidates.tsv
+"""
+
+import time
+import argparse
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from analysis_rule import (IntegerAdjacency, KnowledgeGraph, PathEnumerator, RuleParser,
+                           load_dataset, load_rule_strings)
+
+
+# 与 TLearn.kt 相同的参数
+MH_DIM = 256
+R = 1
+BANDS = MH_DIM // R
+MASTER_SEED = 42
+INT_MAX = 0x7FFFFFFF
+
+OPH_SEED_BIN = np.int32(np.uint32(0x9e3779b9).view(np.int32))
+OPH_SEED_RANK = np.int32(np.uint32(0x85ebca6b).view(np.int32))
+DOPH_SALT = 0x165667b1
+
+_U32 = np.uint64(0xFFFFFFFF)
+_MIX64_ADD = np.uint64(0x9E3779B97F4A7C15)
+_MIX64_MUL1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX64_MUL2 = np.uint64(0x94D049BB133111EB)
+_PAIR_H = np.uint64(0x9E3779B9)
+_PAIR_T = np.uint64(0x85ebca6b)
+
+
+class JavaRandom:
+    """java.util.Random 的线性同余生成器，用于复现 TLearn 的全局哈希种子"""
+
+    MULTIPLIER = 0x5DEECE66D
+    MASK = (1 << 48) - 1
+
+    def __init__(self, seed: int):
+        self.seed = (seed ^ self.MULTIPLIER) & self.MASK
+
+    def next(self, bits: int) -> int:
+        self.seed = (self.seed * self.MULTIPLIER + 0xB) & self.MASK
+        value = self.seed >> (48 - bits)
+        # (int) 强制转换：只有取满32位时才可能为负
+        if bits == 32 and value > INT_MAX:
+            value -= 1 << 32
+        return value
+
+    def next_int(self, bound: int) -> int:
+        m = bound - 1
+        r = self.next(31)
+        if bound & m == 0:
+            return (bound * r) >> 31
+        u = r
+        r = u % bound
+        while u - r + m > INT_MAX:
+            u = self.next(31)
+            r = u % bound
+        return r
+
+
+def global_hash_seeds(count: int = MH_DIM, master_seed: int = MASTER_SEED) -> np.ndarray:
+    """TLearn.initializeGlobalHashSeeds：Random(42).nextInt(Int.MAX_VALUE) 生成的前 count 个不重复种子"""
+    random = JavaRandom(master_seed)
+    seeds = {}
+    while len(seeds) < count:
+        seeds.setdefault(random.next_int(INT_MAX), None)
+    return np.array(list(seeds), dtype=np.int32)
+
+
+def _to_int32(values: np.ndarray) -> np.ndarray:
+    """把 uint64/int64 数组的低32位解释为 int32"""
+    return (values.astype(np.uint64) & _U32).astype(np.uint32).view(np.int32)
+
+
+def mix64(z: np.ndarray) -> np.ndarray:
+    z = z + _MIX64_ADD
+    z = (z ^ (z >> np.uint64(30))) * _MIX64_MUL1
+    z = (z ^ (z >> np.uint64(27))) * _MIX64_MUL2
+    return z ^ (z >> np.uint64(31))
+
+
+def mix32(z0: np.ndarray) -> np.ndarray:
+    """TLearn.mix32：按无符号32位扩展后做 mix64，取高32位"""
+    z = np.asarray(z0, dtype=np.int32).view(np.uint32).astype(np.uint64)
+    return _to_int32(mix64(z) >> np.uint64(32))
+
+
+def pair_hash32(heads: np.ndarray, tails: np.ndarray) -> np.ndarray:
+    """TLearn.pairHash32：h * 0x9E3779B9 xor rotateLeft(t * 0x85ebca6b, 16)"""
+    h = np.asarray(heads, dtype=np.int64).astype(np.uint64)
+    t = np.asarray(tails, dtype=np.int64).astype(np.uint64)
+    u_h = (h * _PAIR_H) & _U32
+    u_t = (t * _PAIR_T) & _U32
+    rotated = ((u_t << np.uint64(16)) | (u_t >> np.uint64(16))) & _U32
+    return _to_int32(u_h ^ rotated)
+
+
+def unary_hash(entities: np.ndarray, seed) -> np.ndarray:
+    """TLearn.computeUnaryHash：abs(mix32(entity xor seed))，abs(Int.MIN_VALUE) 保持为负数"""
+    hashed = mix32(np.bitwise_xor(np.asarray(entities, dtype=np.int32), np.asarray(seed, dtype=np.int32)))
+    return np.abs(hashed)
+
+
+def compute_minhash(instances: np.ndarray, is_binary: bool = False, seeds: Optional[np.ndarray] = None,
+                    chunk_size: int = 4096) -> np.ndarray:
+    """TLearn.computeMinHash：每个种子一个哈希函数，分块计算以限制内存"""
+    instances = np.asarray(instances, dtype=np.int32)
+    if len(instances) == 0:
+        raise ValueError("Cannot compute MinHash for empty instance set")
+    seeds = global_hash_seeds() if seeds is None else seeds
+    signature = np.full(len(seeds), INT_MAX, dtype=np.int32)
+    for start in range(0, len(instances), chunk_size):
+        chunk = instances[start:start + chunk_size]
+        hashes = unary_hash(chunk[:, None], seeds[None, :])
+        np.minimum(signature, hashes.min(axis=0), out=signature)
+    return -signature if is_binary else signature
+
+
+def compute_minhash_doph(instances: np.ndarray, is_binary: bool = False, k: int = MH_DIM) -> np.ndarray:
+    """TLearn.computeMinHashDOPH：一次哈希分桶（OPH），再用 DOPH 致密化空桶"""
+    instances = np.asarray(instances, dtype=np.int32)
+    if len(instances) == 0:
+        raise ValueError("Cannot compute MinHash for empty instance set")
+    if k & (k - 1):
+        raise ValueError("MH_DIM must be a power of 2")
+    mask = k - 1
+
+    bin_ids = (unary_hash(instances, OPH_SEED_BIN) & INT_MAX) & mask
+    salted = _to_int32(bin_ids.astype(np.int64) * DOPH_SALT)
+    h_rank = np.bitwise_xor(unary_hash(instances, OPH_SEED_RANK), salted)
+    ranks = mix32(h_rank) & INT_MAX
+
+    signature = np.full(k, INT_MAX, dtype=np.int32)
+    np.minimum.at(signature, bin_ids, ranks)
+
+    # 与 Kotlin 实现相同的原地致密化：空桶取右侧最近非空桶的值异或偏移
+    if (signature == INT_MAX).any():
+        sig = signature.tolist()
+        for i in range(k):
+            if sig[i] != INT_MAX:
+                continue
+            j = 1
+            while j < k and sig[(i + j) % k] == INT_MAX:
+                j += 1
+            if j == k:
+                sig[i] = _mix32_int(i * DOPH_SALT + 1) & INT_MAX
+            else:
+                offset = _mix32_int(i * DOPH_SALT + j) & INT_MAX
+                sig[i] = sig[(i + j) % k] ^ offset
+        signature = np.array(sig, dtype=np.int32)
+
+    return -signature if is_binary else signature
+
+
+def _wrap32(value: int) -> int:
+    """Python 整数按 Kotlin Int 溢出语义截断为有符号32位"""
+    value &= 0xFFFFFFFF
+    return value - (1 << 32) if value > INT_MAX else value
+
+
+def _mix32_int(value: int) -> int:
+    """单个 Python 整数的 mix32（先按 Int 截断）"""
+    return int(mix32(np.array([_wrap32(value)], dtype=np.int32))[0])
+
+
+def estimate_jaccard(signature1: np.ndarray, signature2: np.ndarray) -> float:
+    """相同位置签名值的比例（R=1 时等于 LSH 碰撞次数 / BANDS）"""
+    return float(np.count_nonzero(signature1 == signature2)) / len(signature1)
+
+
+def estimate_intersection(jaccard: float, size1: int, size2: int) -> float:
+    """TLearn.estimateIntersectionSize"""
+    return jaccard * (size1 + size2) / (1 + jaccard)
+
+
+def estimate_metrics(head_signature: Optional[np.ndarray], head_size: int,
+                     body_signature: Optional[np.ndarray], body_size: int) -> Dict:
+    """由头部和身体的签名估计规则指标（空集合的签名为 None）"""
+    if head_signature is None or body_signature is None:
+        jaccard = 0.0
+    else:
+        jaccard = estimate_jaccard(head_signature, body_signature)
+    support = estimate_intersection(jaccard, head_size, body_size)
+    return {
+        'jaccard': jaccard,
+        'headSize': head_size,
+        'bodySize': body_size,
+        'support': support,
+        'confidence': support / body_size if body_size > 0 else 0.0,
+    }
+
+
+class LSHIndex:
+    """
+    LSH 分桶索引：签名切成 BANDS 个 band，每个 band R 行，
+    同一 band 内签名相同的键落进同一个桶；查询时按碰撞的 band 数给出候选及其 jaccard 估计
+    """
+
+    def __init__(self, bands: int = BANDS, rows: int = R):
+        self.bands = bands
+        self.rows = rows
+        self.buckets = defaultdict(list)
+
+    def _band_keys(self, signature: np.ndarray) -> Iterator[Tuple]:
+        values = signature.tolist()
+        for band in range(self.bands):
+            yield (band, *values[band * self.rows:(band + 1) * self.rows])
+
+    def add(self, key, signature: np.ndarray):
+        for band_key in self._band_keys(signature):
+            self.buckets[band_key].append(key)
+
+    def query(self, signature: np.ndarray, min_collisions: int = 1) -> List[Tuple[object, float]]:
+        """返回 (key, 碰撞次数 / bands)，按估计的 jaccard 从大到小排列"""
+        collisions = Counter()
+        for band_key in self._band_keys(signature):
+            bucket = self.buckets.get(band_key)
+            if bucket:
+                collisions.update(bucket)
+        return [(key, count / self.bands) for key, count in collisions.most_common() if count >= min_collisions]
+
+
+def tlearn_entity_ids(dataset_path: str) -> Dict[str, int]:
+    """与 TLearn 的 IdManager 相同的实体编号：按训练集中首次出现的顺序（先头后尾），从1开始"""
+    entity_ids = {}
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if len(line.rstrip('\n')) <= 2:
+                continue
+            parts = line.strip().split('\t')
+            if len(parts) < 3:
+                parts = line.strip().split(' ')
+            if len(parts) < 3:
+                continue
+            for entity in (parts[0], parts[2]):
+                if entity not in entity_ids:
+                    entity_ids[entity] = len(entity_ids) + 1
+    return entity_ids
+
+
+class RuleSketcher:
+    """
+    为规则的头部和身体构建 MinHash 签名并估计指标
+
+    路径实例的语义与 RuleSupportCalculator.compute_supp 相同，签名按 (一元/二元, 路径, 常量) 缓存
+    """
+
+    def __init__(self, kg: KnowledgeGraph, dataset_path: str, method: str = 'doph'):
+        if method not in ('doph', 'minhash'):
+            raise ValueError(f"未知的签名方法: {method}")
+        self.kg = kg
+        self.method = method
+        self.adjacency = IntegerAdjacency(kg)
+        self.enumerator = PathEnumerator(self.adjacency)
+        tlearn_ids = tlearn_entity_ids(dataset_path)
+        # IntegerAdjacency 的实体ID -> TLearn 实体ID
+        self.tlearn_ids = np.array([tlearn_ids[e] for e in self.adjacency.entities], dtype=np.int32)
+        self.seeds = global_hash_seeds() if method == 'minhash' else None
+        self._signatures = {}
+
+    def signature(self, instances: np.ndarray, is_binary: bool) -> Optional[np.ndarray]:
+        if len(instances) == 0:
+            return None
+        if self.method == 'doph':
+            return compute_minhash_doph(instances, is_binary)
+        return compute_minhash(instances, is_binary, self.seeds)
+
+    def _binary_instances(self, relation_path: List[str]) -> np.ndarray:
+        """二元路径的实例：pairHash32(head, tail) 去重（TLearn 中实例集合就是哈希值的集合）"""
+        xs, ys = [], []
+        if len(relation_path) == 1:
+            stream = self.adjacency.get(relation_path[0]).items()
+        else:
+            stream = self.enumerator.iter_tails(relation_path)
+        for x, tails in stream:
+            xs.extend([x] * len(tails))
+            ys.extend(tails)
+        if not xs:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(pair_hash32(self.tlearn_ids[xs], self.tlearn_ids[ys]))
+
+    def _unary_instances(self, relation_path: List[str], constant: Optional[str]) -> np.ndarray:
+        """一元路径 path(X, constant) 的实例 X；constant 为 None 时是路径上有实例的所有 X"""
+        if constant is None:
+            if len(relation_path) == 1:
+                xs = list(self.adjacency.get(relation_path[0]))
+            else:
+                xs = [x for x, _ in self.enumerator.iter_tails(relation_path)]
+        else:
+            anchor = self.adjacency.entity_ids.get(constant)
+            if anchor is None:
+                return np.empty(0, dtype=np.int32)
+            inverse_path = [KnowledgeGraph.get_inverse_relation(r) for r in reversed(relation_path)]
+            steps = [self.adjacency.get(r) for r in inverse_path]
+            if len(steps) == 1:
+                xs = list(steps[0].get(anchor, ()))
+            else:
+                xs = self.enumerator.tails_from(anchor, steps) if all(steps) else []
+        return self.tlearn_ids[np.array(xs, dtype=np.int64)] if xs else np.empty(0, dtype=np.int32)
+
+    def sketch(self, relation_path: List[str], is_binary: bool,
+               constant: Optional[str] = None) -> Tuple[Optional[np.ndarray], int]:
+        """(签名, 实例数)，空集合的签名为 None"""
+        key = (is_binary, tuple(relation_path), constant)
+        if key not in self._signatures:
+            if is_binary:
+                instances = self._binary_instances(relation_path)
+            else:
+                instances = self._unary_instances(relation_path, constant)
+            self._signatures[key] = (self.signature(instances, is_binary), len(instances))
+        return self._signatures[key]
+
+    def estimate_rule(self, rule_str: str) -> Dict:
+        """估计一条规则的 jaccard, headSize, bodySize, support, confidence"""
+        head_relation, body_relations, variable_count, rule_info = RuleParser.parse_rule(rule_str)
+        if variable_count == 1:
+            head = self.sketch([head_relation], False, rule_info.get('head_constant'))
+            body = self.sketch(body_relations, False, rule_info.get('body_constant'))
+        else:
+            head = self.sketch([head_relation], True)
+            body = self.sketch(body_relations, True)
+        return estimate_metrics(head[0], head[1], body[0], body[1])
+
+    def propose_rules(self, max_length: int = 1, min_jaccard: float = 0.1,
+                      min_support: float = 1.0) -> Iterator[Tuple[str, Dict]]:
+        """
+        用 LSH 分桶为二元规则提出候选：所有关系（含 INVERSE_）的签名作为头部入桶，
+        长度不超过 max_length 的身体路径查询桶，碰撞比例不低于 min_jaccard 的组合作为候选
+        """
+        relations = sorted(r for r in self.kg.relations if '·' not in r)
+        index = LSHIndex()
+        for relation in relations:
+            signature, _ = self.sketch([relation], True)
+            if signature is not None:
+                index.add(relation, signature)
+
+        min_collisions = max(1, int(np.ceil(min_jaccard * index.bands)))
+        paths = [[r] for r in relations]
+        if max_length >= 2:
+            paths += [[r1, r2] for r1 in relations for r2 in relations
+                      if r2 != KnowledgeGraph.get_inverse_relation(r1)]
+        for path in paths:
+            body_signature, body_size = self.sketch(path, True)
+            if body_signature is None:
+                continue
+            for head_relation, _ in index.query(body_signature, min_collisions):
+                if path == [head_relation]:
+                    continue
+                head_signature, head_size = self.sketch([head_relation], True)
+                metrics = estimate_metrics(head_signature, head_size, body_signature, body_size)
+                if metrics['support'] >= min_support:
+                    yield f"{head_relation} <= {'·'.join(path)}", metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MinHash/LSH 规则指标估计')
+    parser.add_argument('--dataset', type=str, default='data/FB15k-237/train.txt',
+                        help='数据集路径 (默认: data/FB15k-237/train.txt)')
+    parser.add_argument('--rules', type=str, default=None,
+                        help='规则文件（rule.txt 格式），估计每条规则的指标')
+    parser.add_argument('--propose', action='store_true',
+                        help='用LSH分桶提出二元候选规则')
+    parser.add_argument('--max-length', type=int, default=1,
+                        help='候选规则身体路径的最大长度 (默认: 1)')
+    parser.add_argument('--min-jaccard', type=float, default=0.1,
+                        help='候选规则的最小估计jaccard (默认: 0.1)')
+    parser.add_argument('--method', choices=['doph', 'minhash'], default='doph',
+                        help='签名方法，与 TLearn 的 computeMinHashDOPH / computeMinHash 对应 (默认: doph)')
+    parser.add_argument('--output', type=str, required=True, help='输出路径（TSV）')
+    args = parser.parse_args()
+
+    if not args.rules and not args.propose:
+        parser.error('需要 --rules 或 --propose')
+
+    kg = load_dataset(args.dataset)
+    sketcher = RuleSketcher(kg, args.dataset, args.method)
+    start = time.time()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write("bodySize\tsupport\tconfidence\tjaccard\theadSize\trule\n")
+        if args.propose:
+            count = 0
+            for rule, m in sketcher.propose_rules(args.max_length, args.min_jaccard):
+                f.write(f"{m['bodySize']}\t{m['support']:.1f}\t{m['confidence']:.6f}\t{m['jaccard']:.6f}\t"
+                        f"{m['headSize']}\t{rule}\n")
+                count += 1
+            print(f"提出 {count:,} 条候选规则，耗时 {time.time() - start:.1f}s")
+        else:
+            # rule.txt 中记录的 confidence 用于对比估计误差
+            recorded = {}
+            with open(args.rules, 'r', encoding='utf-8') as rule_file:
+                for line in rule_file:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) >= 4:
+                        try:
+                            recorded[parts[-1]] = float(parts[2])
+                        except ValueError:
+                            pass
+            errors = []
+            rules = load_rule_strings(args.rules)
+            for rule in rules:
+                try:
+                    m = sketcher.estimate_rule(rule)
+                except Exception as e:
+                    print(f"规则估计失败: {rule}: {e}")
+                    continue
+                f.write(f"{m['bodySize']}\t{m['support']:.1f}\t{m['confidence']:.6f}\t{m['jaccard']:.6f}\t"
+                        f"{m['headSize']}\t{rule}\n")
+                if rule in recorded:
+                    errors.append(abs(m['confidence'] - recorded[rule]))
+            print(f"估计 {len(rules):,} 条规则，耗时 {time.time() - start:.1f}s")
+            if errors:
+                print(f"与规则文件中 confidence 的平均绝对误差: {np.mean(errors):.4f} (中位数 {np.median(errors):.4f})")
+    print(f"结果已保存到: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
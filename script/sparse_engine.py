@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+基于稀疏矩阵的规则支持度计算引擎
+
+把每个关系（包括 INVERSE_ 关系）表示为实体ID上的稀疏布尔矩阵 M[h, t]，
+路径的实例集合通过稀疏矩阵乘法计算，不再构造 (str, str) 元组集合。
+
+路径语义（与 RuleSupportCalculator 相同的约束）：
+1. 长度为1的路径：关系本身的所有 (h, t)，允许自环
+2. 长度为2的路径 r1·r2：存在中间节点 A，满足 X != A != Y 且 X != Y
+   计数矩阵 R1 @ R2 中减去 A == X 的路径 diag(R1) @ R2 和 A == Y 的路径 R1 @ diag(R2)，
+   再去掉对角线（X == Y）
+3. 长度为3的路径 r1·r2·r3：X, A, B, Y 两两不同，与 compute_supp 一致。
+   同样用矩阵项做容斥：从 R1 @ R2 @ R3 中减去有实体重复的路径（A == X、B == X、A == B、
+   A == Y、B == Y 五项），加回被重复减去的组合（A == B == X、A == B == Y 各两倍，
+   A == X 且 B == Y、A == Y 且 B == X），得到两两不同的 (A, B) 个数，再去掉对角线
+4. 长度 >= 4 的路径：容斥的项数随长度急剧增长，因此回退到逐行搜索。
+   先对 N-1 种拆分分别计算 left @ right 并去掉对角线（X != Y），所有拆分结果逐元素相交；
+   不同拆分可能由不同的路径满足，交集只是候选的超集（即 compute_supp_by_splits 的结果），
+   再从每个候选起点 X 沿各关系矩阵的行深度优先搜索（Python 循环），只保留能以两两不同的实体到达的 Y
+
+headSize, bodySize, support 分别是头部矩阵、身体矩阵、两者逐元素乘积的非零元个数。
+
+用法：
+    engine = SparseRuleEngine(kg)
+    result = engine.calculate_rule_support(rule_info)
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class SparseRuleEngine:
+    """基于稀疏矩阵乘法的规则支持度计算引擎"""
+
+    def __init__(self, kg):
+        self.kg = kg
+        # 实体ID化：按字典序分配，保证结果可复现
+        self.entities = sorted(kg.entities)
+        self.entity_ids = {entity: i for i, entity in enumerate(self.entities)}
+        self.num_entities = len(self.entities)
+        # 关系矩阵缓存: relation -> csr_matrix
+        self.relation_cache: Dict[str, sp.csr_matrix] = {}
+        # 路径矩阵缓存: tuple(relations) -> csr_matrix
+        self.path_cache: Dict[Tuple[str, ...], sp.csr_matrix] = {}
+
+    def _empty(self) -> sp.csr_matrix:
+        return sp.csr_matrix((self.num_entities, self.num_entities), dtype=np.int32)
+
+    @staticmethod
+    def _binarize(matrix: sp.csr_matrix) -> sp.csr_matrix:
+        """去掉零元，非零元统一置为1"""
+        matrix.eliminate_zeros()
+        matrix.data[:] = 1
+        return matrix
+
+    @staticmethod
+    def _drop_diagonal(matrix: sp.csr_matrix) -> sp.csr_matrix:
+        """去掉对角线元素，即 X == Y 的实例"""
+        coo = matrix.tocoo()
+        keep = coo.row != coo.col
+        return sp.csr_matrix((coo.data[keep], (coo.row[keep], coo.col[keep])),
+                             shape=matrix.shape, dtype=matrix.dtype)
+
+    def relation_matrix(self, relation: str) -> sp.csr_matrix:
+        """
+        获取单个关系的稀疏布尔矩阵（基于 kg.r2h2t，INVERSE_ 关系同样可用）
+        """
+        if relation in self.relation_cache:
+            return self.relation_cache[relation]
+
+        rows, cols = [], []
+        h2t = self.kg.r2h2t.get(relation, {})
+        for head, tails in h2t.items():
+            head_id = self.entity_ids[head]
+            for tail in tails:
+                rows.append(head_id)
+                cols.append(self.entity_ids[tail])
+
+        if rows:
+            data = np.ones(len(rows), dtype=np.int32)
+            matrix = sp.csr_matrix((data, (np.array(rows), np.array(cols))),
+                                   shape=(self.num_entities, self.num_entities), dtype=np.int32)
+            matrix = self._binarize(matrix)
+        else:
+            matrix = self._empty()
+
+        self.relation_cache[relation] = matrix
+        return matrix
+
+    def _join_two_relations(self, r1: str, r2: str) -> sp.csr_matrix:
+        """连接两个关系，确保 X != A != Y 且 X != Y"""
+        m1 = self.relation_matrix(r1)
+        m2 = self.relation_matrix(r2)
+        if m1.nnz == 0 or m2.nnz == 0:
+            return self._empty()
+
+        # counts[X, Y] = 满足 r1(X, A), r2(A, Y) 的 A 的个数
+        counts = m1 @ m2
+        # 减去 A == X（r1 自环）和 A == Y（r2 自环）的路径；
+        # 两者同时成立时 X == Y，会在去掉对角线时一并处理
+        d1 = sp.diags(m1.diagonal(), dtype=np.int32)
+        d2 = sp.diags(m2.diagonal(), dtype=np.int32)
+        if d1.nnz:
+            counts = counts - d1 @ m2
+        if d2.nnz:
+            counts = counts - m1 @ d2
+        counts = sp.csr_matrix(counts, dtype=np.int32)
+
+        return self._binarize(self._drop_diagonal(counts))
+
+    @staticmethod
+    def _distinct_tails(x: int, matrices: List[sp.csr_matrix]) -> set:
+        """从 x 出发依次沿 matrices 的行走完路径、路径上实体两两不同时能到达的所有 Y"""
+        tails = set()
+        last = len(matrices) - 1
+        stack = [(x, 0, (x,))]
+        while stack:
+            node, depth, visited = stack.pop()
+            matrix = matrices[depth]
+            for nxt in matrix.indices[matrix.indptr[node]:matrix.indptr[node + 1]].tolist():
+                if nxt in visited:
+                    continue
+                if depth == last:
+                    tails.add(nxt)
+                else:
+                    stack.append((nxt, depth + 1, visited + (nxt,)))
+        return tails
+
+    def _filter_distinct(self, candidates: sp.csr_matrix, relation_path: List[str]) -> sp.csr_matrix:
+        """只保留候选中存在一条实体两两不同的路径的 (X, Y)"""
+        matrices = [self.relation_matrix(relation) for relation in relation_path]
+        rows, cols = [], []
+        for x in np.flatnonzero(np.diff(candidates.indptr)).tolist():
+            tails = self._distinct_tails(x, matrices)
+            for y in candidates.indices[candidates.indptr[x]:candidates.indptr[x + 1]].tolist():
+                if y in tails:
+                    rows.append(x)
+                    cols.append(y)
+        if not rows:
+            return self._empty()
+        return sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (np.array(rows), np.array(cols))),
+                             shape=candidates.shape, dtype=np.int32)
+
+    def _join_three_relations(self, r1: str, r2: str, r3: str) -> sp.csr_matrix:
+        """
+        连接三个关系，确保 X, A, B, Y 两两不同
+
+        在 {X, A, B, Y} 上 X 与 Y 不同块的划分上做 Möbius 反演（容斥），
+        counts[X, Y] 为两两不同的 (A, B) 个数；计数用 int64，避免大度数实体上溢出
+        """
+        m1, m2, m3 = (self.relation_matrix(r).astype(np.int64) for r in (r1, r2, r3))
+        if m1.nnz == 0 or m2.nnz == 0 or m3.nnz == 0:
+            return self._empty()
+
+        def diag(values) -> sp.dia_matrix:
+            return sp.diags(np.asarray(values).ravel(), dtype=np.int64)
+
+        d1, d2, d3 = diag(m1.diagonal()), diag(m2.diagonal()), diag(m3.diagonal())
+        # d12[X] = 回到 X 的 r1·r2 路径数（B == X），d23[Y] = 回到 Y 的 r2·r3 路径数（A == Y）
+        d12 = diag(m1.multiply(m2.T).sum(axis=1))
+        d23 = diag(m2.multiply(m3.T).sum(axis=1))
+        counts = (m1 @ m2 @ m3
+                  - d1 @ m2 @ m3 - d12 @ m3 - m1 @ d2 @ m3 - m1 @ d23 - m1 @ m2 @ d3
+                  + 2 * (d1 @ d2 @ m3) + 2 * (m1 @ d2 @ d3)
+                  + d1 @ m2 @ d3 + m1.multiply(m2.T).multiply(m3))
+        counts = sp.csr_matrix(counts, dtype=np.int64)
+        return self._binarize(self._drop_diagonal(counts)).astype(np.int32)
+
+    def _join_two_paths(self, left: sp.csr_matrix, right: sp.csr_matrix) -> sp.csr_matrix:
+        """连接两个路径实例矩阵，确保 X != Z"""
+        product = sp.csr_matrix(left @ right, dtype=np.int32)
+        return self._binarize(self._drop_diagonal(product))
+
+    def path_matrix(self, relation_path: List[str]) -> sp.csr_matrix:
+        """
+        计算关系路径的实例矩阵，语义与 RuleSupportCalculator.compute_supp 相同
+
+        长度为3时用矩阵项容斥（_join_three_relations）；长度 >= 4 时拆分求交
+        （compute_supp_by_splits 的语义）只用来缩小候选，再由 _filter_distinct 逐行检查路径上实体两两不同
+        """
+        key = tuple(relation_path)
+        if key in self.path_cache:
+            return self.path_cache[key]
+
+        n = len(relation_path)
+        if n == 0:
+            result = self._empty()
+        elif n == 1:
+            result = self.relation_matrix(relation_path[0])
+        elif n == 2:
+            result = self._join_two_relations(relation_path[0], relation_path[1])
+        elif n == 3:
+            result = self._join_three_relations(*relation_path)
+        else:
+            # 长度 >= 4：所有 N-1 种拆分结果逐元素相交，得到候选
+            result = None
+            for split_pos in range(1, n):
+                left = self.path_matrix(relation_path[:split_pos])
+                right = self.path_matrix(relation_path[split_pos:]) if left.nnz else None
+                if right is None or right.nnz == 0:
+                    result = self._empty()
+                    break
+                split_result = self._join_two_paths(left, right)
+                result = split_result if result is None else self._binarize(result.multiply(split_result).tocsr())
+                if result.nnz == 0:
+                    break
+            if result.nnz:
+                result = self._filter_distinct(result, relation_path)
+
+        self.path_cache[key] = result
+        return result
+
+    def _column(self, matrix: sp.csr_matrix, constant: Optional[str]) -> sp.csr_matrix:
+        """矩阵中指向常量的那一列（n x 1），常量不存在时返回空列"""
+        if constant not in self.entity_ids:
+            return sp.csr_matrix((self.num_entities, 1), dtype=np.int32)
+        return matrix[:, self.entity_ids[constant]]
+
+    def get_head_matrix(self, rule_info: Dict) -> sp.csr_matrix:
+        """
+        头部实例矩阵
+        - 一元规则 relation(constant) 表示 relation(X, constant)，
+          INVERSE_relation 的矩阵即 relation 的转置，因此两种情况都是取常量所在的列
+        - 二元规则：关系矩阵本身
+        """
+        head_relation = rule_info.get('head_relation')
+        if rule_info.get('variable_count', 0) == 1:
+            return self._column(self.relation_matrix(head_relation), rule_info.get('head_constant'))
+        return self.relation_matrix(head_relation)
+
+    def get_body_matrix(self, rule_info: Dict) -> sp.csr_matrix:
+        """
+        身体实例矩阵
+        - 一元规则有常量：路径矩阵中常量所在的列，即 path(X, constant) 的所有 X
+        - 一元规则无常量：路径矩阵中有出边的所有行
+        - 二元规则：路径矩阵本身
+        身体不是关系路径的完整格式规则（带 body_atoms）不能表示为路径矩阵，抛出 ValueError
+        """
+        if rule_info.get('body_atoms'):
+            raise ValueError(f"身体不是关系路径: {rule_info.get('original_rule')}")
+        body_relations = rule_info.get('body_relations', [])
+        if not body_relations:
+            return self._empty()
+
+        path = self.path_matrix(body_relations)
+        if rule_info.get('variable_count', 0) != 1:
+            return path
+
+        body_constant = rule_info.get('body_constant')
+        if body_constant is not None:
+            return self._column(path, body_constant)
+        has_instance = (np.diff(path.indptr) > 0).astype(np.int32)
+        return sp.csr_matrix(has_instance.reshape(-1, 1))
+
+    def calculate_rule_support(self, rule_info: Dict) -> Dict:
+        """
+        计算规则支持度
+
+        Returns:
+            包含 headSize, bodySize, support, confidence 的字典
+        """
+        head = self.get_head_matrix(rule_info)
+        body = self.get_body_matrix(rule_info)
+
+        head_size = head.nnz
+        body_size = body.nnz
+        support = head.multiply(body).count_nonzero() if head_size and body_size else 0
+        confidence = support / body_size if body_size > 0 else 0
+
+        return {
+            'headSize': head_size,
+            'bodySize': body_size,
+            'support': support,
+            'confidence': confidence
+        }
+
+    def get_instances(self, matrix: sp.csr_matrix) -> set:
+        """把实例矩阵还原为实体字符串集合（n x 1 列返回实体集合，否则返回 (X, Y) 对集合）"""
+        coo = matrix.tocoo()
+        if matrix.shape[1] == 1:
+            return {self.entities[i] for i in coo.row.tolist()}
+        return {(self.entities[h], self.entities[t]) for h, t in zip(coo.row.tolist(), coo.col.tolist())}
+
+    def clear_cache(self):
+        """清除路径缓存（保留关系矩阵）"""
+        self.path_cache.clear()
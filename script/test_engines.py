@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+测试各规则评分引擎在随机知识图谱上的结果一致
+
+连接算法、计数模式、BatchRuleScorer、暴力验证、稀疏矩阵引擎和 CSR 多进程验证
+使用相同的路径语义（长度 >= 2 时路径上实体两两不同，包括常量），
+headSize、bodySize、support 应该完全相同。缺少 numpy / scipy 时跳过对应的引擎
+"""
+
+import os
+import sys
+import random
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from analysis_rule import BatchRuleScorer, KnowledgeGraph, RuleParser, RuleSupportCalculator
+
+METRICS = ('headSize', 'bodySize', 'support')
+
+
+def random_kg(seed: int, num_entities: int = 25, num_triples: int = 220) -> KnowledgeGraph:
+    """随机知识图谱，另外加入几个自环，覆盖 A == X 之类的边界情况"""
+    rnd = random.Random(seed)
+    kg = KnowledgeGraph()
+    entities = [f"/m/e{i}" for i in range(num_entities)]
+    for _ in range(num_triples):
+        kg.add_triple(rnd.choice(entities), rnd.choice(['r1', 'r2', 'r3']), rnd.choice(entities))
+    kg.add_triple('/m/e1', 'r1', '/m/e1')
+    kg.add_triple('/m/e3', 'r2', '/m/e3')
+    kg.add_triple('/m/e4', 'r3', '/m/e4')
+    return kg
+
+
+TEST_RULES = [
+    # 二元规则，长度 1 ~ 4
+    "r2(X,Y) <= r1(X,Y)",
+    "r1(X,Y) <= r2(X,A), r3(A,Y)",
+    "r1(X,Y) <= r2(X,A), r2(A,Y)",
+    "r1(X,Y) <= r2(X,A), r3(A,B), r1(B,Y)",
+    "r1(X,Y) <= r2(Y,A), r3(A,B), r2(B,X)",
+    "r3(X,Y) <= r1(X,A), r2(A,B), r3(B,C), r1(C,Y)",
+    # 一元规则，身体有常量
+    "r1(X,/m/e1) <= r2(X,/m/e2)",
+    "r1(X,/m/e1) <= r2(X,A), r3(A,/m/e2)",
+    "r1(X,/m/e3) <= r2(X,A), r1(A,B), r3(B,/m/e4)",
+    "r2(X,/m/e3) <= r3(X,A), r1(A,B), r2(B,/m/e3)",
+    "r1(X,/m/e3) <= r2(X,A), r1(A,B), r3(B,C), r2(C,/m/e5)",
+    # 一元规则，身体没有常量
+    "r1(/m/e1) <= r2(·)",
+    "r1(/m/e1) <= r2·r3(·)",
+    "r2(/m/e3) <= r3·r1·r2(·)",
+]
+
+# 身体不是从 X 到 Y 的链（分叉、成环、自环变量），按完整格式解析后由哈希连接求解
+NON_PATH_RULES = [
+    "r1(X,Y) <= r2(X,Y), r3(X,A)",
+    "r1(X,Y) <= r2(Y,X), r3(X,Y)",
+    "r1(X,Y) <= r2(X,A), r3(A,Y), r1(A,B)",
+    "r3(X,Y) <= r1(X,A), r2(Y,A), r3(A,B), r2(B,X)",
+    "r2(X,Y) <= r1(X,A), r3(Y,A), r2(A,/m/e3)",
+    "r1(X,Y) <= r2(X,A), r3(A,A), r1(A,Y)",
+]
+
+
+def engine_results(kg: KnowledgeGraph, rule_strs):
+    """engine -> [指标字典]，与 rule_strs 顺序一致"""
+    rule_infos = [RuleParser.parse_rule(rule)[3] for rule in rule_strs]
+    results = {
+        'join': [RuleSupportCalculator(kg).calculate_rule_support_join(info) for info in rule_infos],
+        'count': [RuleSupportCalculator(kg).calculate_rule_support_count(info) for info in rule_infos],
+        'bruteforce': [RuleSupportCalculator(kg).calculate_rule_support_bruteforce(info) for info in rule_infos],
+        'batch': BatchRuleScorer(kg).score(rule_strs),
+    }
+
+    try:
+        from sparse_engine import SparseRuleEngine
+        engine = SparseRuleEngine(kg)
+        results['sparse'] = [engine.calculate_rule_support(info) for info in rule_infos]
+    except ImportError:
+        print("未安装 scipy，跳过稀疏矩阵引擎")
+
+    try:
+        from verify_rules import CSRAdjacency, build_graph_arrays
+        with tempfile.TemporaryDirectory() as tmp:
+            dataset_path = os.path.join(tmp, 'train.txt')
+            with open(dataset_path, 'w', encoding='utf-8') as f:
+                for head, relation, tail in sorted(kg.triples):
+                    f.write(f"{head}\t{relation}\t{tail}\n")
+            build_graph_arrays(dataset_path, os.path.join(tmp, 'cache'))
+            results['csr'] = BatchRuleScorer(None, CSRAdjacency(os.path.join(tmp, 'cache'))).score(rule_strs)
+    except ImportError:
+        print("未安装 numpy，跳过 CSR 多进程验证")
+
+    return results
+
+
+def test_engines_agree():
+    """所有引擎在随机知识图谱上的 headSize、bodySize、support 相同"""
+    for seed in range(6):
+        kg = random_kg(seed)
+        results = engine_results(kg, TEST_RULES)
+        for i, rule in enumerate(TEST_RULES):
+            expected = tuple(results['count'][i][key] for key in METRICS)
+            for engine, rows in results.items():
+                got = tuple(rows[i][key] for key in METRICS)
+                assert got == expected, f"seed={seed} {engine} 与 count 不一致: {rule}\n  {got} != {expected}"
+        print(f"seed={seed}: {len(TEST_RULES)} 条规则, 引擎 {sorted(results)} 结果一致")
+
+
+def test_split_intersection_is_superset():
+    """拆分求交（compute_supp_by_splits）的结果包含两两不同路径的结果"""
+    for seed in range(6):
+        kg = random_kg(seed)
+        calculator = RuleSupportCalculator(kg)
+        for path in (['r2', 'r3', 'r1'], ['r1', 'r2', 'r3', 'r1'], ['r2', 'INVERSE_r3', 'r2']):
+            distinct = calculator.compute_supp(path)
+            splits = calculator.compute_supp_by_splits(path)
+            assert distinct <= splits, f"seed={seed} {path}: compute_supp 不是拆分求交的子集"
+
+
+def test_non_path_bodies():
+    """非链式身体：连接算法与暴力验证一致（变量两两不同），不要求不同时与回溯搜索一致"""
+    for rule in TEST_RULES:
+        assert 'body_atoms' not in RuleParser.parse_rule(rule)[3], f"链式规则不应按完整格式解析: {rule}"
+    for seed in range(6):
+        kg = random_kg(seed)
+        for rule in NON_PATH_RULES:
+            info = RuleParser.parse_rule(rule)[3]
+            assert info.get('body_atoms'), f"非链式规则应按完整格式解析: {rule}"
+            calculator = RuleSupportCalculator(kg)
+            expected = calculator.calculate_rule_support_bruteforce(info)
+            for engine in (calculator.calculate_rule_support_join, calculator.calculate_rule_support_count):
+                got = engine(info)
+                assert tuple(got[key] for key in METRICS) == tuple(expected[key] for key in METRICS), \
+                    f"seed={seed} {engine.__name__} 与暴力验证不一致: {rule}"
+            atoms = [(atom['relation'], atom['args']) for atom in info['body_atoms']]
+            assert calculator._hash_join_atoms(atoms, ['X', 'Y']) == \
+                calculator.get_binary_instances_bruteforce(info, distinct=False), f"seed={seed} {rule}"
+        assert all('error' in row for row in BatchRuleScorer(kg).score(NON_PATH_RULES))
+    print(f"{len(NON_PATH_RULES)} 条非链式规则, 连接算法与暴力验证一致")
+
+
+if __name__ == "__main__":
+    test_engines_agree()
+    test_split_intersection_is_superset()
+    test_non_path_bodies()
+    print("所有引擎结果一致")
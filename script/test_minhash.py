@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+测试 minhash.py 与 TLearn.kt 的哈希函数一致
+
+固定值的来源：
+- global_hash_seeds()[:4]：java.util.Random(42) 的前四个 nextInt() 为
+  -1170105035, 234785527, -1360544799, 205897768，nextInt(Int.MAX_VALUE) 取其高31位
+- mix32(0)：SplitMix64 以 0 为状态的第一个输出 0xE220A8397B1DCDAF 的高32位
+- pairHash32：按 Kotlin Int 运算手算（h * 0x9E3779B9 xor rotateLeft(t * 0x85ebca6b, 16)）
+- computeMinHashDOPH：逐行照抄 Kotlin 的标量实现（kotlin_doph），与向量化实现对照，并固定小集合上的签名
+任何一侧改动哈希函数或参数，这里的固定值都会失效，需要两侧一起更新
+"""
+
+import os
+import sys
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import numpy as np
+    from minhash import MH_DIM, compute_minhash_doph, global_hash_seeds, mix32, pair_hash32
+except ImportError:
+    np = None
+
+MASK64 = (1 << 64) - 1
+
+
+def to_int(value: int) -> int:
+    """按 Kotlin Int 溢出语义截断为有符号32位"""
+    value &= 0xFFFFFFFF
+    return value - (1 << 32) if value >= 1 << 31 else value
+
+
+def kotlin_mix32(z0: int) -> int:
+    """TLearn.mix32 / mix64 的标量照抄"""
+    z = (z0 & 0xFFFFFFFF) + 0x9E3779B97F4A7C15 & MASK64
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & MASK64
+    return to_int((z ^ (z >> 31)) >> 32)
+
+
+def kotlin_abs(x: int) -> int:
+    """kotlin.math.abs(Int)：abs(Int.MIN_VALUE) 仍是 Int.MIN_VALUE"""
+    return x if x == -(1 << 31) else abs(x)
+
+
+def kotlin_doph(instances, k: int = 256):
+    """TLearn.computeMinHashDOPH 的标量照抄（不含 isBinary 取负）"""
+    seed_bin, seed_rank, salt = to_int(0x9e3779b9), to_int(0x85ebca6b), 0x165667b1
+    int_max = 0x7FFFFFFF
+    sig = [int_max] * k
+    for e in instances:
+        bin_id = (kotlin_abs(kotlin_mix32(e ^ seed_bin)) & int_max) & (k - 1)
+        h_rank = kotlin_abs(kotlin_mix32(e ^ seed_rank)) ^ to_int(bin_id * salt)
+        rank = kotlin_mix32(h_rank) & int_max
+        if rank < sig[bin_id]:
+            sig[bin_id] = rank
+    for i in range(k):
+        if sig[i] != int_max:
+            continue
+        j = 1
+        while j < k and sig[(i + j) % k] == int_max:
+            j += 1
+        if j == k:
+            sig[i] = kotlin_mix32(to_int(i * salt + 1)) & int_max
+        else:
+            sig[i] = sig[(i + j) % k] ^ (kotlin_mix32(to_int(i * salt + j)) & int_max)
+    return sig
+
+
+def test_pinned_values():
+    """种子、mix32、pairHash32 与 Kotlin 的值相同"""
+    if np is None:
+        print("未安装 numpy，跳过")
+        return
+    assert global_hash_seeds()[:4].tolist() == [1562431130, 117392763, 1467211248, 102948884]
+    assert mix32(np.array([0, 1, -1, 123456789], dtype=np.int32)).tolist() == \
+        [-501176263, -1861603860, 1940994978, 574387417]
+    assert [kotlin_mix32(v) for v in (0, 1, -1, 123456789)] == [-501176263, -1861603860, 1940994978, 574387417]
+    assert pair_hash32(np.array([1, 0, 7]), np.array([0, 1, 11])).tolist() == [-1640531527, -898923029, -518154962]
+    print("种子、mix32、pairHash32 一致")
+
+
+def test_doph_matches_kotlin():
+    """DOPH 签名与 Kotlin 标量实现相同，小集合（大量空桶需要致密化）的签名固定"""
+    if np is None:
+        print("未安装 numpy，跳过")
+        return
+    signature = compute_minhash_doph(np.array([1, 2, 3]))
+    assert signature[:8].tolist() == [367055919, 1158932708, 964989776, 1832876503,
+                                      1365610409, 1074905460, 468526439, 807854164]
+    assert signature.tolist() == kotlin_doph([1, 2, 3], MH_DIM)
+    assert compute_minhash_doph(np.array([1, 2, 3]), is_binary=True).tolist() == [-v for v in signature.tolist()]
+
+    rnd = random.Random(0)
+    for size in (1, 10, 200, 5000):
+        instances = [rnd.randrange(-(1 << 31), 1 << 31) for _ in range(size)]
+        assert compute_minhash_doph(np.array(instances, dtype=np.int64)).tolist() == kotlin_doph(instances, MH_DIM), size
+    print("DOPH 签名一致")
+
+
+if __name__ == "__main__":
+    test_pinned_values()
+    test_doph_matches_kotlin()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+多进程规则验证
+
+把训练集ID化为CSR数组（int32实体ID，关系和 INVERSE_ 关系各占一个关系ID）保存到缓存目录，
+各个工作进程以内存映射方式打开同一份数组，共享操作系统的页缓存，不各自复制一份图。
+
+规则按头部关系分组后切块分发给进程池，同一关系的规则落在同一块里，
+工作进程的关系索引和前缀树保持热；每块用 BatchRuleScorer 评分，结果按完成顺序流式写出。
+
+缓存目录布局：
+    meta.json                 数据集路径、大小、修改时间和数组长度（最后写入，标志缓存完整）
+    entities.json             实体名，下标即实体ID（按字典序，与 IntegerAdjacency 一致）
+    relations.json            关系名，下标即关系ID（r 为 2i，INVERSE_r 为 2i+1）
+    rel_start.npy             关系 r 的 head 在 heads 中的范围 rel_start[r]:rel_start[r+1]
+    heads.npy                 每个关系内按ID排序的 head
+    head_start.npy            heads[i] 的 tail 在 tails 中的范围 head_start[i]:head_start[i+1]
+    tails.npy                 按ID排序的 tail
+
+用法：
+    python script/verify_rules.py --dataset data/FB15k-237/train.txt --rules out/FB15k-237/rule.txt \
+        --output out/FB15k-237/rule_verified.tsv --workers 8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from analysis_rule import (BatchRuleScorer, METRICS_TABLE_HEADER, format_metrics_row,
+                           load_rule_strings)
+
+
+CACHE_VERSION = 1
+ARRAY_NAMES = ('rel_start', 'heads', 'head_start', 'tails')
+
+
+def dataset_signature(dataset_path: str) -> Dict:
+    stat = os.stat(dataset_path)
+    return {'dataset': os.path.abspath(dataset_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def is_cache_valid(cache_dir: str, dataset_path: str) -> bool:
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    signature = dataset_signature(dataset_path)
+    return (meta.get('version') == CACHE_VERSION and meta.get('size') == signature['size']
+            and meta.get('mtime') == signature['mtime'])
+
+
+def build_graph_arrays(dataset_path: str, cache_dir: str):
+    """读取 train.txt，把图ID化并写成CSR数组"""
+    start = time.time()
+    heads, relations, tails = [], [], []
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.strip().split('\t')
+            if len(parts) != 3:
+                continue
+            heads.append(parts[0])
+            relations.append(parts[1])
+            tails.append(parts[2])
+
+    entities = sorted(set(heads) | set(tails))
+    entity_ids = {entity: i for i, entity in enumerate(entities)}
+    base_relations = sorted(set(relations))
+    relation_names = []
+    for relation in base_relations:
+        relation_names.extend([relation, f"INVERSE_{relation}"])
+    base_ids = {relation: 2 * i for i, relation in enumerate(base_relations)}
+
+    h = np.fromiter((entity_ids[x] for x in heads), dtype=np.int32, count=len(heads))
+    t = np.fromiter((entity_ids[x] for x in tails), dtype=np.int32, count=len(tails))
+    r = np.fromiter((base_ids[x] for x in relations), dtype=np.int32, count=len(relations))
+
+    # 正向和逆向各一份，去重后按 (relation, head, tail) 排序
+    rel = np.concatenate([r, r + 1]).astype(np.int64)
+    src = np.concatenate([h, t]).astype(np.int64)
+    dst = np.concatenate([t, h]).astype(np.int64)
+    num_entities = len(entities)
+    keys = np.unique((rel * num_entities + src) * num_entities + dst)
+    dst = (keys % num_entities).astype(np.int32)
+    rel_head = keys // num_entities
+    rel = (rel_head // num_entities).astype(np.int32)
+
+    # 每个 (relation, head) 一段 tails
+    boundaries = np.flatnonzero(np.diff(rel_head)) + 1
+    segment_starts = np.concatenate([[0], boundaries]).astype(np.int64)
+    head_start = np.concatenate([segment_starts, [len(keys)]]).astype(np.int64)
+    head_array = (rel_head[segment_starts] % num_entities).astype(np.int32)
+    head_rel = rel[segment_starts]
+    rel_start = np.searchsorted(head_rel, np.arange(len(relation_names) + 1), side='left').astype(np.int64)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    with open(os.path.join(cache_dir, 'entities.json'), 'w', encoding='utf-8') as f:
+        json.dump(entities, f, ensure_ascii=False)
+    with open(os.path.join(cache_dir, 'relations.json'), 'w', encoding='utf-8') as f:
+        json.dump(relation_names, f, ensure_ascii=False)
+    arrays = {'rel_start': rel_start, 'heads': head_array, 'head_start': head_start, 'tails': dst}
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(cache_dir, f'{name}.npy'), arrays[name])
+
+    meta = dataset_signature(dataset_path)
+    meta.update({
+        'version': CACHE_VERSION,
+        'num_entities': num_entities,
+        'num_relations': len(relation_names),
+        'num_instances': int(len(keys)),
+    })
+    # meta.json 最后写入，标志缓存完整
+    tmp_meta = meta_path + '.tmp'
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, meta_path)
+    print(f"已写入CSR缓存: {cache_dir} ({num_entities:,} 个实体, {len(keys):,} 个关系实例, "
+          f"{time.time() - start:.1f}s)")
+
+
+class CSRRelationView:
+    """单个关系的只读邻接视图，接口与 IntegerAdjacency.get() 返回的字典相同（get / 迭代 / len）"""
+
+    def __init__(self, graph: 'CSRAdjacency', relation_id: Optional[int]):
+        self.graph = graph
+        if relation_id is None:
+            self.begin = self.end = 0
+        else:
+            self.begin = int(graph.rel_start[relation_id])
+            self.end = int(graph.rel_start[relation_id + 1])
+        self._slots = None
+
+    def _index(self) -> Dict[int, int]:
+        # 第一次查询时建立 head -> 下标 的字典，之后在工作进程内复用
+        if self._slots is None:
+            heads = self.graph.heads[self.begin:self.end].tolist()
+            self._slots = {head: self.begin + i for i, head in enumerate(heads)}
+        return self._slots
+
+    def __len__(self) -> int:
+        return self.end - self.begin
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.graph.heads[self.begin:self.end].tolist())
+
+    def get(self, head: int, default=None):
+        slot = self._index().get(head)
+        if slot is None:
+            return default
+        start, stop = self.graph.head_start[slot], self.graph.head_start[slot + 1]
+        return self.graph.tails[start:stop].tolist()
+
+    def count(self) -> int:
+        return int(self.graph.head_start[self.end] - self.graph.head_start[self.begin])
+
+
+class CSRAdjacency:
+    """内存映射的整数邻接表，可以直接交给 BatchRuleScorer 使用"""
+
+    def __init__(self, cache_dir: str):
+        with open(os.path.join(cache_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(os.path.join(cache_dir, 'entities.json'), 'r', encoding='utf-8') as f:
+            self.entities = json.load(f)
+        with open(os.path.join(cache_dir, 'relations.json'), 'r', encoding='utf-8') as f:
+            self.relation_ids = {relation: i for i, relation in enumerate(json.load(f))}
+        self.entity_ids = {entity: i for i, entity in enumerate(self.entities)}
+        for name in ARRAY_NAMES:
+            setattr(self, name, np.load(os.path.join(cache_dir, f'{name}.npy'), mmap_mode='r'))
+        self._views = {}
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def get(self, relation: str) -> CSRRelationView:
+        if relation not in self._views:
+            self._views[relation] = CSRRelationView(self, self.relation_ids.get(relation))
+        return self._views[relation]
+
+    def count(self, relation: str) -> int:
+        return self.get(relation).count()
+
+
+def head_relation_of(rule: str) -> str:
+    """规则头部的关系名，只用于分组"""
+    return rule.split('<=', 1)[0].strip().split('(', 1)[0].strip()
+
+
+def group_rules(rule_strs: List[str], chunk_size: int) -> List[List[str]]:
+    """按头部关系分组并切块，大组在前，便于进程池负载均衡"""
+    groups = defaultdict(list)
+    for rule in rule_strs:
+        groups[head_relation_of(rule)].append(rule)
+    chunks = []
+    for relation in sorted(groups, key=lambda r: len(groups[r]), reverse=True):
+        rules = groups[relation]
+        for i in range(0, len(rules), chunk_size):
+            chunks.append(rules[i:i + chunk_size])
+    return chunks
+
+
+_scorer = None
+
+
+def _init_worker(cache_dir: str):
+    global _scorer
+    _scorer = BatchRuleScorer(None, CSRAdjacency(cache_dir))
+
+
+def _score_chunk(rules: List[str]) -> List[Dict]:
+    return _scorer.score(rules)
+
+
+def verify_rules(rule_strs: List[str], cache_dir: str, workers: int = 1,
+                 chunk_size: int = 2000) -> Iterator[List[Dict]]:
+    """按块产出评分结果（完成顺序，不是输入顺序）"""
+    chunks = group_rules(rule_strs, chunk_size)
+    if workers <= 1:
+        _init_worker(cache_dir)
+        for chunk in chunks:
+            yield _score_chunk(chunk)
+        return
+    with Pool(workers, initializer=_init_worker, initargs=(cache_dir,)) as pool:
+        for rows in pool.imap_unordered(_score_chunk, chunks):
+            yield rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程规则验证')
+    parser.add_argument('--dataset', type=str, default='data/FB15k-237/train.txt',
+                        help='数据集路径 (默认: data/FB15k-237/train.txt)')
+    parser.add_argument('--rules', type=str, required=True,
+                        help='规则文件（rule.txt 格式，或每行一条规则）')
+    parser.add_argument('--output', type=str, required=True,
+                        help='指标表输出路径（TSV）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='工作进程数 (默认: CPU核数)')
+    parser.add_argument('--chunk-size', type=int, default=2000,
+                        help='每个任务块的规则数 (默认: 2000)')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='CSR缓存目录 (默认: 数据集所在目录下的 csr_cache)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='忽略已有缓存，重新构建CSR数组')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.dataset):
+        print(f"错误: 数据集文件不存在: {args.dataset}")
+        sys.exit(1)
+    cache_dir = args.cache_dir or os.path.join(os.path.dirname(args.dataset), 'csr_cache')
+    if args.rebuild or not is_cache_valid(cache_dir, args.dataset):
+        build_graph_arrays(args.dataset, cache_dir)
+    else:
+        print(f"使用已有CSR缓存: {cache_dir}")
+
+    rule_strs = load_rule_strings(args.rules)
+    print(f"共 {len(rule_strs):,} 条规则, {args.workers} 个进程")
+
+    start = time.time()
+    done = 0
+    failed = 0
+    tmp_output = args.output + '.tmp'
+    with open(tmp_output, 'w', encoding='utf-8') as f:
+        f.write(METRICS_TABLE_HEADER)
+        for rows in verify_rules(rule_strs, cache_dir, args.workers, args.chunk_size):
+            for row in rows:
+                if 'error' in row:
+                    failed += 1
+                else:
+                    f.write(format_metrics_row(row))
+            done += len(rows)
+            elapsed = time.time() - start
+            print(f"  已验证 {done:,}/{len(rule_strs):,} 条规则 ({done / max(elapsed, 1e-9):.0f} 条/秒)")
+    os.replace(tmp_output, args.output)
+
+    print(f"完成: {done - failed:,} 条规则已写入 {args.output}，解析失败 {failed:,} 条，"
+          f"耗时 {time.time() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
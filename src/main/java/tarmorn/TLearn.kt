@@ -5,9 +5,15 @@ import tarmorn.data.RelationPath
 import tarmorn.data.TripleSet
 import java.io.BufferedWriter
 import java.io.File
+import java.io.FileOutputStream
 import java.io.FileWriter
+import java.io.PrintStream
+import java.nio.file.AtomicMoveNotSupportedException
+import java.nio.file.Files
+import java.nio.file.StandardCopyOption
 import java.util.concurrent.LinkedBlockingQueue
 import java.util.concurrent.TimeUnit
+import java.util.concurrent.ExecutorService
 import java.util.concurrent.Executors
 import java.util.concurrent.ConcurrentHashMap
 import java.util.concurrent.atomic.AtomicInteger
@@ -58,7 +64,7 @@ object TLearn {
 
     // Core data structures
     val config = Settings.load()    // 加载配置
-    val ts: TripleSet = TripleSet(Settings.PATH_TRAINING, true)
+    lateinit var ts: TripleSet
     // lateinit var r2tripleSet: MutableMap<Long, MutableSet<MyTriple>>
     lateinit var R2supp: ConcurrentHashMap<Long, Int>
     lateinit var R2EntitySupp: ConcurrentHashMap<Long, Int>
@@ -74,6 +80,7 @@ object TLearn {
     val relationQueue = LinkedBlockingQueue<Long>()
     val activeThreadCount = AtomicInteger(0) // 线程安全的活动线程计数
     val threadMonitorLock = Object() // 用于线程监控的锁
+    private var connectPool: ExecutorService? = null // 上一次connectRelations的线程池，批处理模式下需等待其结束
 
     // Backup of L1 relations for connection attempts
     lateinit var relationL1: List<Long>
@@ -107,15 +114,35 @@ object TLearn {
 
     /**
      * Main entry point - can be run directly
+     * Without arguments a single partition is learned from Settings.PATH_TRAINING (set via config.yaml or environment).
+     * With `--batch <manifest>` all partitions listed in the manifest are learned one after another in this JVM.
      */
     @JvmStatic
     fun main(args: Array<String>) {
         Settings.load()
         println("TLearn - Top-down relation path learning algorithm")
-        println("Loading triple set...")
         // Initialize global hash seeds first
         initializeGlobalHashSeeds()
 
+        if (args.isEmpty()) {
+            learnPartition()
+        } else if (args.size == 2 && args[0] == "--batch") {
+            val failed = runBatch(File(args[1]))
+            if (failed > 0) System.exit(1)
+        } else {
+            println("Usage: TLearn [--batch <manifest>]")
+            System.exit(2)
+        }
+    }
+
+    /**
+     * Learn all relation paths and rules of Settings.PATH_TRAINING and save them to
+     * Settings.PATH_RULES_JSON and Settings.PATH_RULES_TXT.
+     */
+    fun learnPartition() {
+        println("Loading triple set ${Settings.PATH_TRAINING}...")
+        ts = TripleSet(Settings.PATH_TRAINING, true)
+
         // Initialize data structures
         // r2tripleSet = ts.r2tripleSet
         r2loopSet = ts.r2loopSet
@@ -138,8 +165,10 @@ object TLearn {
         initializeL1Relations()
 
         // Step 2: Connect relations using multiple threads
+        var completed = false
         try {
            connectRelations()
+           completed = true
         } catch (e: Exception) {
             println("Error during relation connection: ${e.message}")
             e.printStackTrace()
@@ -153,11 +182,97 @@ object TLearn {
 //            checkSpecificRelationBuckets()
 
             // 保存atom2formula2metric到JSON文件
-            saveAtom2Formula2MetricToJson()
+            saveAtom2Formula2MetricToJson(completed)
             // return r2tripleSet.mapValues { it.value.toSet() }
         }
     }
 
+    /**
+     * Batch mode: learn several partitions in one warm JVM.
+     * Each manifest line is `training<TAB>rules_json<TAB>rules_txt[<TAB>log]`; if a log path is given,
+     * the output of that partition is redirected to it. Progress lines `[batch] OK|FAILED <training>`
+     * are written to the original stdout so that a caller can track every partition.
+     *
+     * @return the number of failed partitions
+     */
+    fun runBatch(manifest: File): Int {
+        val entries = manifest.readLines()
+            .map { it.trim() }
+            .filter { it.isNotEmpty() && !it.startsWith("#") }
+            .map { it.split("\t") }
+        val console = System.out
+        val consoleErr = System.err
+        var failed = 0
+
+        console.println("[batch] ${entries.size} partitions from ${manifest.path}")
+        entries.forEachIndexed { index, columns ->
+            if (columns.size < 3) {
+                console.println("[batch] FAILED ${columns[0]} (malformed manifest line)")
+                failed++
+                return@forEachIndexed
+            }
+            Settings.PATH_TRAINING = columns[0]
+            Settings.PATH_RULES_JSON = columns[1]
+            Settings.PATH_RULES_TXT = columns[2]
+            val log = columns.getOrNull(3)?.let { PrintStream(FileOutputStream(it), true, "UTF-8") }
+
+            val start = System.currentTimeMillis()
+            var ok = true
+            try {
+                resetState()
+                if (log != null) {
+                    System.setOut(log)
+                    System.setErr(log)
+                }
+                learnPartition()
+            } catch (e: Throwable) {
+                ok = false
+                println("Error while learning ${Settings.PATH_TRAINING}: ${e.message}")
+                e.printStackTrace()
+            } finally {
+                System.setOut(console)
+                System.setErr(consoleErr)
+                log?.close()
+            }
+
+            val seconds = (System.currentTimeMillis() - start) / 1000.0
+            if (ok) {
+                console.println("[batch] OK ${columns[0]} ${seconds}s (${index + 1}/${entries.size})")
+            } else {
+                failed++
+                console.println("[batch] FAILED ${columns[0]} ${seconds}s (${index + 1}/${entries.size})")
+            }
+        }
+        resetState()
+        return failed
+    }
+
+    /**
+     * Reset all global state learned from the previous partition.
+     * Entity and relation IDs depend on the training file, therefore IdManager is cleared as well.
+     */
+    fun resetState() {
+        // After a forced shutdown the workers only notice the interrupt once their current task is finished
+        connectPool?.let { pool ->
+            if (!pool.awaitTermination(10, TimeUnit.MINUTES)) {
+                println("Warning: worker threads of the previous partition are still running")
+            }
+        }
+        connectPool = null
+
+        IdManager.clear()
+        relationQueue.clear()
+        activeThreadCount.set(0)
+        processedCount.set(0)
+        addedCount.set(0)
+        bucketCountMap.clear()
+        formula2supp.clear()
+        minHashRegistry.clear()
+        key2headAtom.clear()
+        atom2formula2metric.clear()
+        System.gc()
+    }
+
     /**
      * Step 1: Initialize level 1 relations (single relations with sufficient supp)
      */
@@ -210,6 +325,7 @@ object TLearn {
         println("Starting relation connection with ${Settings.WORKER_THREADS} threads...")
 
         val threadPool = Executors.newFixedThreadPool(Settings.WORKER_THREADS)
+        connectPool = threadPool
 
 
         // Create worker threads
@@ -1182,21 +1298,28 @@ object TLearn {
 
     /**
      * 保存atom2formula2metric为JSON文件 - 流式输出避免内存溢出
+     * 先写入临时文件再原子重命名，中断时不会留下被截断的 part_k.json；
+     * 仅当学习完整结束(completed)时才写入完成标记 <json>.done，供 run_partitions.py 断点续跑
      */
-    private fun saveAtom2Formula2MetricToJson() {
+    private fun saveAtom2Formula2MetricToJson(completed: Boolean = true) {
         // val outDir = File("out/" + Settings.DATASET)
         // outDir.mkdirs() // 确保out目录存在
         val outputFile = File(Settings.PATH_RULES_JSON)
         val outputRule = File(Settings.PATH_RULES_TXT)
+        val markerFile = File(outputFile.path + ".done")
+        val tmpFile = File(outputFile.path + ".tmp")
+        val tmpRule = File(outputRule.path + ".tmp")
+        // 重写之前先删除旧标记，避免新旧输出混杂时被误判为已完成
+        markerFile.delete()
         
         // 统计变量
         var totalRules = 0
         val unaryStats = IntArray(MAX_PATH_LENGTH + 1) // L0, L1, L2, L3
         val binaryStats = IntArray(MAX_PATH_LENGTH + 1) // L0, L1, L2, L3
         
-        BufferedWriter(FileWriter(outputFile)).use { writer ->
+        BufferedWriter(FileWriter(tmpFile)).use { writer ->
             // Write rules in parallel while streaming JSON
-            BufferedWriter(FileWriter(outputRule)).use { ruleWriter ->
+            BufferedWriter(FileWriter(tmpRule)).use { ruleWriter ->
             writer.write("{\n")
             val atomEntries = atom2formula2metric.entries.toList()
 
@@ -1259,6 +1382,13 @@ object TLearn {
             writer.write("}\n")
             }
         }
+        moveAtomically(tmpFile, outputFile)
+        moveAtomically(tmpRule, outputRule)
+        if (completed) {
+            writeCompletionMarker(markerFile, outputFile, outputRule, totalRules)
+        } else {
+            println("Learning did not complete, no completion marker written for ${outputFile.path}")
+        }
 
         println("Successfully saved atom2formula2metric to ${outputFile.absolutePath}")
         println("Successfully saved rules to ${outputRule.absolutePath}")
@@ -1272,4 +1402,28 @@ object TLearn {
         println("Unary    ${unaryStats[0].toString().padStart(8)}  ${unaryStats[1].toString().padStart(8)}  ${unaryStats[2].toString().padStart(8)}  ${unaryStats[3].toString().padStart(8)}")
         println("Binary   ${binaryStats[0].toString().padStart(8)}  ${binaryStats[1].toString().padStart(8)}  ${binaryStats[2].toString().padStart(8)}  ${binaryStats[3].toString().padStart(8)}")
     }
-}
\ No newline at end of file
+
+    private fun moveAtomically(source: File, target: File) {
+        try {
+            Files.move(source.toPath(), target.toPath(), StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE)
+        } catch (e: AtomicMoveNotSupportedException) {
+            Files.move(source.toPath(), target.toPath(), StandardCopyOption.REPLACE_EXISTING)
+        }
+    }
+
+    /**
+     * 完成标记：记录输出文件字节数和规则数，续跑时据此判断 JSON 是否完整
+     */
+    private fun writeCompletionMarker(markerFile: File, outputFile: File, outputRule: File, totalRules: Int) {
+        val tmpMarker = File(markerFile.path + ".tmp")
+        tmpMarker.writeText(
+            "{\"training\": \"${Settings.PATH_TRAINING.replace("\\", "/")}\", " +
+            "\"json_bytes\": ${outputFile.length()}, " +
+            "\"txt_bytes\": ${outputRule.length()}, " +
+            "\"atoms\": ${atom2formula2metric.size}, " +
+            "\"rules\": $totalRules, " +
+            "\"finished\": ${System.currentTimeMillis() / 1000}}\n"
+        )
+        moveAtomically(tmpMarker, markerFile)
+    }
+}
\ No newline at end of file
@@ -174,7 +174,7 @@ object IdManager {
         return parts.joinToString(", ")
     }
 
-    // Clear all mappings except KG variables (useful for testing).
+    // Clear all mappings except KG variables (used for testing and between partitions in batch mode).
     fun clear() {
         // Preserve KG variables A-Z
         val kgVariables = ('A'..'Z').associate { letter ->
@@ -191,6 +191,8 @@ object IdManager {
             entity2id[letter] = id
             id2entity[id] = letter
         }
+        entity2id["·"] = 0
+        id2entity[0] = "·"
         
         nextEntityId = 1
         nextRelationId = 1L